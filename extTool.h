@@ -50,6 +50,16 @@ bool match_equal(std::regex e, std::string target) {
   return false;
 }
 
+// Write a record of the code generator batch file, see code_gen.read_batch()
+void write_batch_record(std::ofstream& batch, std::string const& sent,
+                        std::string const& sent_id, std::string const& ir,
+                        std::string const& env_str) {
+  batch << "{\"sentence\": " << json_quote(sent)
+        << ", \"sentence_id\": " << json_quote(sent_id)
+        << ", \"lf\": " << json_quote(ir) << ", \"env\": " << json_quote(env_str)
+        << "}\n";
+}
+
 std::vector<std::string> execTool(std::string protocol, std::string topic,
                                   std::string field, std::string text,
                                   std::string path_name, bool lf_only,
@@ -99,7 +109,6 @@ std::vector<std::string> execTool(std::string protocol, std::string topic,
   text_copy = text_copy.substr(found);
 
   std::string cut_text;
-  std::string cmd;
 
   const std::string env_str = "{\"protocol\":\"" + protocol +
                               "\",\"message\":\"" + topic + "\",\"field\":\"" +
@@ -125,7 +134,6 @@ std::vector<std::string> execTool(std::string protocol, std::string topic,
     register_meta_sentence(protocol, topic, field, sent_to_db, 0);
     register_mapping_lf(topic, field, sent_to_db, std::to_string(0),
                         assign_value, env_str);
-    // std::cout<<cmd<<std::endl;
     SENT.push_back(sent_to_db);
     SENT_ID.push_back("0");
     IR.push_back(assign_value);
@@ -234,9 +242,8 @@ std::vector<std::string> execTool(std::string protocol, std::string topic,
       // Register sentence to metadata system
       register_meta_sentence(protocol, topic, field, text, idx);
 
-      cmd = "cd utils/phraser; python3 corenlp.py -s \"" + text + "\" " +
-            "-i " + std::to_string(idx) + " >nul 2>nul";
-      exec_command(cmd);
+      run_python_tool("phrase", {"-s", text, "-i", std::to_string(idx)},
+                      false);
 
       // Read in annotation from AutoPhrase
       std::string output_filepath =
@@ -288,13 +295,17 @@ std::vector<std::string> execTool(std::string protocol, std::string topic,
       std::string ir_result;
 
       // call CCG
-      cmd = "python3 utils/ccg_tool/parse_rfc.py -c -s \"" + domain_result +
-            "\" -m \"" + topic + "\" -n \"" + field + "\" --env \'" + env_str +
-            "\'";
+      std::vector<std::string> parse_args = {
+          "-c", "-s", domain_result, "-m", topic, "-n", field, "--env", env_str};
       if (!lf_checks.empty()) {
-        cmd += " -C " + lf_checks;
+        parse_args.push_back("-C");
+        std::istringstream checks(lf_checks);
+        std::string check;
+        while (checks >> check) {
+          parse_args.push_back(check);
+        }
       }
-      exec_command(cmd);
+      run_python_tool("parse", parse_args);
 
       fp_read.open(ccg_result_path);
 
@@ -325,6 +336,8 @@ std::vector<std::string> execTool(std::string protocol, std::string topic,
   std::cout << "Logic Form Code Generator Output: " << std::endl;
   const std::string codegen_dir = "utils/code_generator";
   const std::string codegen_outfile = codegen_dir + "/code_out.txt";
+  const std::string codegen_batch_path = codegen_dir + "/code_batch.jsonl";
+  std::ofstream codegen_batch(codegen_batch_path);
 
   std::vector<std::string>::iterator ir_it =
       std::find_if(IR.begin(), IR.end(), [](const std::string& sub_str) {
@@ -345,44 +358,38 @@ std::vector<std::string> execTool(std::string protocol, std::string topic,
         ir = "\'@Comment\'(\'" + sent_copy + "\','')";
         register_mapping_lf(topic, field, sent, sent_id, ir, env_str);
       }
-      const std::string command_codegen =
-          "python3 " + codegen_dir + "/code_gen.py" +
-          " --use_metadata_system " + " --outfile \"" + codegen_outfile +
-          "\" --sentence \"" + sent + "\" --sentence_id " + sent_id +
-          " --env \'" + env_str + "\' \"" + ir + "\";";
-      exec_command(command_codegen);
+      write_batch_record(codegen_batch, sent, sent_id, ir, env_str);
     }
 
   } else {
     for (size_t i = 0; i < IR.size(); i++) {
-      ir = IR[i];
-      sent = SENT[i];
-      sent_id = SENT_ID[i];
-      const std::string command_codegen =
-          "python3 " + codegen_dir + "/code_gen.py" +
-          " --use_metadata_system " + " --outfile \"" + codegen_outfile +
-          "\" --sentence \"" + sent + "\" --sentence_id " + sent_id +
-          " --env \'" + env_str + "\' \"" + ir + "\";";
-      exec_command(command_codegen);
+      write_batch_record(codegen_batch, SENT[i], SENT_ID[i], IR[i], env_str);
     }
   }
+  codegen_batch.close();
+
+  // Generate code of all logic forms in one run
+  if (!IR.empty()) {
+    run_python_tool("codegen", {"--use_metadata_system", "--outfile",
+                                codegen_outfile, "--batch",
+                                codegen_batch_path});
+  }
+  std::remove(codegen_batch_path.c_str());
 
   return IR;
 }
 
 void generate_code(const std::string message, const std::set<std::string> roles,
                    const std::string outfile, bool sp_output) {
-  const std::string codegen_dir = "utils/code_generator";
   for (const auto& role : roles) {
-    std::string app_str = "";
+    std::vector<std::string> funcgen_args;
     if (sp_output) {
-      app_str = " --special_purpose";
+      funcgen_args.push_back("--special_purpose");
     }
-    const std::string command_funcgen =
-        "python3 " + codegen_dir + "/func_gen.py" + app_str +
-        " --comments --message \"" + message + "\" --role \"" + role + "\"" +
-        " --outfile \"" + outfile + "\" --outfile_mode \"a\";";
-    exec_command(command_funcgen);
+    funcgen_args.insert(funcgen_args.end(),
+                        {"--comments", "--message", message, "--role", role,
+                         "--outfile", outfile, "--outfile_mode", "a"});
+    run_python_tool("funcgen", funcgen_args);
 
     std::ofstream fp(outfile, std::ofstream::app);
     fp << '\n';
@@ -59,6 +59,7 @@ int main(int argc, char* argv[]) {
   bool graph_only = false;
   bool lf_only = false;
   bool sp_output = false;
+  bool use_worker = false;
   std::string path_name = get_current_dir();
   std::string file_name("");
   std::string section_name("Echo");
@@ -78,10 +79,11 @@ int main(int argc, char* argv[]) {
                                          {"graph", no_argument, 0, 'g'},
                                          {"lfonly", no_argument, 0, 'l'},
                                          {"spoutput", no_argument, 0, 'o'},
+                                         {"worker", no_argument, 0, 'k'},
                                          {0, 0, 0, 0}};
   int opt = 0;
   int long_index = 0;
-  while ((opt = getopt_long(argc, argv, "d:i:p:s:w:v:c:eglo", long_options,
+  while ((opt = getopt_long(argc, argv, "d:i:p:s:w:v:c:eglok", long_options,
                             &long_index)) != -1) {
     switch (opt) {
       case 'i':
@@ -115,6 +117,9 @@ int main(int argc, char* argv[]) {
       case 'c':
         lf_checks.assign(optarg);
         break;
+      case 'k':
+        use_worker = true;
+        break;
       default:
         print_usage(argv[0]);
         exit(EXIT_FAILURE);
@@ -125,6 +130,9 @@ int main(int argc, char* argv[]) {
     print_usage(argv[0]);
     exit(EXIT_FAILURE);
   }
+  if (use_worker) {
+    start_worker(path_name);
+  }
 
   std::ifstream f_ptr(file_name);
 
@@ -19,12 +19,9 @@ void register_meta_fields(std::string protocol, std::string message_name,
     return;
   }
   for (const auto &field : fields) {
-    const std::string command =
-        "cd utils/metadata_system; python3 run_sqlite.py -c -m \"" +
-        message_name + "\" -p \"" + protocol + "\" -n \"" +
-        convert_to_lower(field.field_name) + "\" -b " +
-        std::to_string(field.field_bit);
-    exec_command(command);
+    run_python_tool("metadata", {"-c", "-m", message_name, "-p", protocol,
+                                 "-n", convert_to_lower(field.field_name),
+                                 "-b", std::to_string(field.field_bit)});
   }
 }
 
@@ -33,56 +30,42 @@ void register_meta_sentence(std::string protocol, std::string topic,
                             int sentence_id) {
   std::string sent(sentence);
   sent.erase(0, sent.find_first_not_of(' '));
-  std::string command =
-      "cd utils/metadata_system; python3 run_sqlite.py -p \"" + protocol +
-      "\" -m \"" + topic + "\" -n \"" + field_name + "\" -s \"" + sent +
-      "\" -i " + std::to_string(sentence_id);
-  exec_command(command);
+  run_python_tool("metadata", {"-p", protocol, "-m", topic, "-n", field_name,
+                               "-s", sent, "-i", std::to_string(sentence_id)});
 }
 
 void update_meta(std::string message_type,
                  std::vector<Paragraph> field_descriptions) {
   for (auto &field_desc : field_descriptions) {
-    const std::string command =
-        "cd utils/metadata_system; python3 run_sqlite.py -ud -desc \"" +
-        field_desc.get_content() + "\" -m \"" + message_type + "\" -n \"" +
-        field_desc.get_topic() + "\"";
-    exec_command(command);
+    run_python_tool("metadata",
+                    {"-ud", "-desc", field_desc.get_content(), "-m",
+                     message_type, "-n", field_desc.get_topic()});
   }
 }
 
 void update_mapping_label(std::string msg_type, std::string field,
                           std::string sentence, std::string sentence_id,
                           std::string label) {
-  const std::string command =
-      "cd utils/metadata_system; python3 run_sqlite.py -ul -m \"" + msg_type +
-      "\" -n \"" + field + "\" -s \"" + sentence + "\" -i " + sentence_id +
-      " -l \"" + label + "\";";
-  exec_command(command);
+  run_python_tool("metadata", {"-ul", "-m", msg_type, "-n", field, "-s",
+                               sentence, "-i", sentence_id, "-l", label});
 }
 
 void register_mapping_lf(std::string msg_type, std::string field,
                          std::string sentence, std::string sentence_id,
                          std::string lf, std::string env) {
-  const std::string command =
-      "cd utils/metadata_system; python3 run_sqlite.py -ulf -m \"" + msg_type +
-      "\" -n \"" + field + "\" -s \"" + sentence + "\" -i " + sentence_id +
-      " -lf \"" + lf + "\" -env \'" + env + "\';";
-  exec_command(command);
+  run_python_tool("metadata",
+                  {"-ulf", "-m", msg_type, "-n", field, "-s", sentence, "-i",
+                   sentence_id, "-lf", lf, "-env", env});
 }
 
 void clean_invalid_sentence_entry(std::string msg_type, std::string sentence,
                                   std::string sentence_id) {
-  const std::string command =
-      "cd utils/metadata_system; python3 run_sqlite.py -ci -m \"" + msg_type +
-      "\" -s \"" + sentence + "\" -i " + sentence_id + ";";
-  exec_command(command);
+  run_python_tool("metadata", {"-ci", "-m", msg_type, "-s", sentence, "-i",
+                               sentence_id});
 }
 
 void clean_mds() {
-  const std::string command =
-      "cd utils/metadata_system; python3 run_sqlite.py -r ;";
-  exec_command(command);
+  run_python_tool("metadata", {"-r"});
 }
 
 std::set<std::string> get_msg_types(std::string protocol) {
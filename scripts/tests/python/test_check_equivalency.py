@@ -0,0 +1,127 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the equivalence check of logical forms. """
+
+import itertools
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import unittest
+
+import networkx
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+LFC_DIR = CUR_DIR / '..' / '..' / '..' / 'utils' / 'logic_form_checker'
+sys.path.insert(0, str(LFC_DIR))
+import check_equivalency as ce
+import logic_form_graph as lfg
+
+LOGIC_FORMS = [
+    "'@Is'('checksum','0')",
+    "'@Is'('type','8')",
+    "'@Is'('@Of'('checksum','icmp'),'0')",
+    "'@Action'('compute','checksum')",
+    "'@Is'('checksum','0')",
+    "'@Is'('@Of'('type','icmp_message'),'8')",
+    "'@AdvBefore'('@Is'('checksum','0'),'@Action'('compute','checksum'))",
+    "'@AdvBefore'('@Action'('compute','checksum'),'@Is'('checksum','0'))",
+    "'@And'('identifier','sequence_number')",
+]
+
+
+def isomorphic_groups(lf_graphs, node_match=None):
+    """ Group logic forms like the pairwise networkx check did. """
+    groups = []
+    for logic_form in lf_graphs:
+        for group in groups:
+            if networkx.is_isomorphic(group[0]['graph'].graph,
+                                      logic_form['graph'].graph,
+                                      node_match=node_match):
+                group.append(logic_form)
+                break
+        else:
+            groups.append([logic_form])
+    return [[logic_form['id'] for logic_form in group] for group in groups]
+
+
+class CheckEquivalencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lf_graphs = lfg.create_logic_form_graphs_from_logic_forms(LOGIC_FORMS)
+
+    def test_structure_only(self):
+        groups = ce.group_logic_forms(self.lf_graphs)
+        self.assertEqual(groups, [[0, 1, 3, 4, 8], [2, 5], [6, 7]])
+        self.assertEqual(groups, isomorphic_groups(self.lf_graphs))
+
+    def test_labels(self):
+        groups = ce.group_logic_forms(self.lf_graphs, labels=True)
+        self.assertEqual(groups, [[0, 4], [1], [2], [3], [5], [6, 7], [8]])
+        self.assertEqual(groups, isomorphic_groups(
+            self.lf_graphs,
+            lambda node1, node2: node1['predicate'] == node2['predicate']))
+
+    def test_pairs(self):
+        for labels in (False, True):
+            pairs = [pair for group in ce.group_logic_forms(self.lf_graphs, labels)
+                     for pair in itertools.combinations(group, 2)]
+            self.assertEqual(sorted(ce.check_logic_forms_eq_pair(self.lf_graphs, labels)),
+                             sorted(pairs))
+
+
+class RenderGraphsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_no_graphs(self):
+        self.assertEqual(ce.render_graphs({}, self.tmp_dir.name), [])
+        ce.export_all([], out_dir=self.tmp_dir.name)
+        ce.export_all([], out_dir=self.tmp_dir.name, out_format='html')
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['lfg.html'])
+
+    @unittest.skipUnless(shutil.which('dot'), 'dot is not installed')
+    def test_render(self):
+        lf_graphs = lfg.create_logic_form_graphs_from_logic_forms(LOGIC_FORMS[:3])
+        dot_graphs = {f'lfg-{logic_form["id"]}': logic_form['graph'].to_dot()
+                      for logic_form in lf_graphs}
+        out_files = ce.render_graphs(dot_graphs, self.tmp_dir.name, 'svg', jobs=2)
+        self.assertEqual([path.name for path in out_files],
+                         ['lfg-0.svg', 'lfg-1.svg', 'lfg-2.svg'])
+        self.assertTrue(all(path.exists() for path in out_files))
+
+
+if __name__ == '__main__':
+    unittest.main()
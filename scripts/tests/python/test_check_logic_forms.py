@@ -0,0 +1,336 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import io
+import itertools
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+LFC_DIR = CUR_DIR / '..' / '..' / '..' / 'utils' / 'logic_form_checker'
+sys.path.insert(0, str(LFC_DIR))
+with contextlib.redirect_stdout(io.StringIO()):
+    import check_logic_forms as clf
+    import check_predicates as cp
+    import logic_form_graph as lfg
+
+# result of each check mode on sample logical forms, and check_all on the
+# logical forms of sample sentences, from the checks before they were fused
+# (with the '@Length' rule fixed to a tuple, so '@Length'(x,y) passes)
+EXPECTED = json.loads((CUR_DIR / 'check_logic_forms_expected.json').read_text())
+
+
+def check_result(check_func, *args):
+    """ Result of a check, or the name of the exception it raised. """
+    try:
+        return check_func(*args)
+    except Exception as error:
+        return type(error).__name__
+
+
+# node predicates of each argument type
+SAMPLE_ARGS = ['@And', 'Sum', '0', 'checksum', '16_bit', '_x']
+
+# predicate rule checks on predicate strings, as before the rules were
+# compiled
+IS_RULE = {
+    'variable': lambda data: data[0].isupper(),
+    'const_num': lambda data: data.isnumeric(),
+    'const_str': lambda data: ((data[0].islower() or
+                                (data[0].isnumeric() and not data.isnumeric()))
+                               and '@' not in data),
+}
+
+
+def raw_rules(predicate: str, args: tuple) -> bool:
+    """ Check the arguments of a predicate against predicate_rules. """
+    rules = cp.predicate_rules[predicate]
+    for rule in rules:
+        results = [True if '@' in arg else IS_RULE[rule_type](arg)
+                   for rule_type, arg in zip(rule, args)]
+        if results and all(results):
+            return True
+    return not rules
+
+
+def first_failed(results: dict, modes: list) -> tuple:
+    """ Index of the first mode check_pred_all would have dropped the
+    logical form in, and the exception that mode raised. """
+    for index, mode in enumerate(modes):
+        if results[mode] is not True:
+            return index, None if results[mode] is False else results[mode]
+    return len(modes), None
+
+
+class CheckPredicatesTest(unittest.TestCase):
+
+    def test_modes(self):
+        for logic_form, expected in EXPECTED['predicates'].items():
+            lf_graph = {'id': 0, 'graph': lfg.LogicFormGraph(logic_form)}
+            for mode in clf.CHECKS:
+                self.assertEqual(
+                    check_result(getattr(cp, f'check_pred_{mode}'), lf_graph),
+                    expected[mode], (logic_form, mode))
+
+    def test_fused(self):
+        for modes in (list(clf.CHECKS), ['order', 'duplicates'],
+                      ['duplicates', 'rules'], ['sequence']):
+            for logic_form, expected in EXPECTED['predicates'].items():
+                lf_graph = {'id': 0, 'graph': lfg.LogicFormGraph(logic_form)}
+                failed, error = cp.check_pred_fused(lf_graph, modes)
+                self.assertEqual(
+                    (failed, error and type(error).__name__),
+                    first_failed(expected, modes), (logic_form, modes))
+
+    def test_check_pred_all(self):
+        lf_graphs = [{'id': index, 'graph': lfg.LogicFormGraph(logic_form)}
+                     for index, logic_form in enumerate(EXPECTED['predicates'])
+                     if 'KeyError' not in EXPECTED['predicates'][logic_form].values()]
+        for mode in ('order', 'sequence', 'duplicates'):
+            fused = cp.check_pred_all_fused(lf_graphs, [mode])
+            self.assertEqual([lf['id'] for lf in cp.check_pred_all(lf_graphs, mode)],
+                             [lf['id'] for lf, (failed, _) in zip(lf_graphs, fused)
+                              if failed == 1])
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            cp.check_pred_all_fused([], ['rules', 'spelling'])
+
+
+class CompiledRulesTest(unittest.TestCase):
+
+    def test_rules(self):
+        for predicate in cp.predicate_rules:
+            for length in range(4):
+                for args in itertools.product(SAMPLE_ARGS, repeat=length):
+                    arg_types = [lfg.classify_argument(arg) for arg in args]
+                    self.assertEqual(cp.lookup('rules', predicate, arg_types),
+                                     raw_rules(predicate, args), (predicate, args))
+        self.assertEqual(cp.lookup('rules', '@Nonce', []), 'KeyError')
+
+    def test_order(self):
+        predicates = sorted(set(cp.predicate_rules) | set(cp.predicate_order_denylist))
+        for predicate, parents in cp.predicate_order_denylist.items():
+            for parent in predicates:
+                self.assertEqual(cp.lookup('order', predicate, parent),
+                                 parent in parents, (predicate, parent))
+        self.assertIs(cp.lookup('order', '@Nonce', '@And'), False)
+
+    def test_sequence(self):
+        sequences = {sequence for denied in cp.predicate_sequence_denylist.values()
+                     for sequence in denied}
+        for length in range(3):
+            sequences.update(itertools.product(['', '@Is', '@Action'], repeat=length))
+        for predicate, denied in cp.predicate_sequence_denylist.items():
+            for sequence in sequences:
+                self.assertEqual(cp.lookup('sequence', predicate, sequence),
+                                 sequence in denied, (predicate, sequence))
+        self.assertEqual(cp.lookup('sequence', '@Nonce', ()), 'KeyError')
+
+    def test_malformed(self):
+        for rules in ({'@Length': [('const_str')]},
+                      {'@Length': [('string',)]}):
+            with self.assertRaises(ValueError):
+                cp.compile_rules(rules)
+        for denylist in ({'@And': '@Zeros'}, {'@And': ['']}, {'And': []},
+                         {'@And': ['Zeros']}):
+            with self.assertRaises(ValueError):
+                cp.compile_order_denylist(denylist)
+        for denylist in ({'@And': ['@LogicNot']}, {'@And': [('', 'logic_not')]}):
+            with self.assertRaises(ValueError):
+                cp.compile_sequence_denylist(denylist)
+
+
+class SpanFilterTest(unittest.TestCase):
+
+    def test_check_term(self):
+        span_filter = clf.SpanFilter()
+        self.assertEqual(span_filter.checks, ['rules', 'order', 'sequence'])
+        for logic_form, expected in EXPECTED['predicates'].items():
+            failed, error = first_failed(expected, span_filter.checks)
+            self.assertEqual(span_filter.check_term(logic_form),
+                             failed == len(span_filter.checks) or error is not None,
+                             logic_form)
+        self.assertEqual(len(span_filter.results), len(EXPECTED['predicates']))
+
+    def test_call(self):
+        span_filter = clf.SpanFilter(['order'])
+        self.assertTrue(span_filter([]))
+        self.assertTrue(span_filter(["'@Is'('checksum','0')", "'@Is'(x"]))
+        self.assertFalse(span_filter(["'@Is'('checksum','0')",
+                                      "'@Zeros'('@And'('a','b'))"]))
+
+
+class CheckAllTest(unittest.TestCase):
+
+    def test_expected(self):
+        for expected in EXPECTED['checks']:
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                kept = check_result(
+                    lambda: [lf['id'] for lf in clf.check_all(expected['logic_forms'],
+                                                              verbose=True)])
+            self.assertEqual(kept, expected['kept'])
+            if isinstance(kept, list):
+                self.assertEqual(out.getvalue(), expected['output'])
+
+    def test_rejected(self):
+        expected = EXPECTED['checks'][4]
+        rejected, summary = {}, {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            kept = clf.check_all(expected['logic_forms'], rejected=rejected,
+                                 summary=summary)
+        self.assertEqual(sorted([lf['id'] for lf in kept] + list(rejected)),
+                         list(range(len(expected['logic_forms']))))
+        self.assertEqual(set(rejected.values()), {'duplicates'})
+        self.assertEqual(summary['unique'], 4)
+
+
+class CheckBatchTest(unittest.TestCase):
+    """ check_logic_forms.py --batch with its files in a temporary
+    directory. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = pathlib.Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_batch(self, records):
+        path = self.tmp_path / 'batch.jsonl'
+        with open(path, 'w') as batch_file:
+            for record in records:
+                batch_file.write(json.dumps(record) + '\n' if record else '\n')
+        return str(path)
+
+    def run_main(self, argv, out_name='LFcheck.jsonl'):
+        """ Run check_logic_forms.py, get its output and results. """
+        out_path = self.tmp_path / out_name
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            clf.main(argv + ['--batch_output', str(out_path)])
+        with open(out_path) as out_file:
+            return output.getvalue(), [json.loads(line) for line in out_file]
+
+    def expected_batch(self):
+        return [{'name': index, 'lfs': expected['logic_forms']}
+                for index, expected in enumerate(EXPECTED['checks'])]
+
+    def test_batch(self):
+        batch = self.expected_batch()
+        output, results = self.run_main(['--batch', self.write_batch(batch)])
+        self.assertEqual(len(results), len(EXPECTED['checks']))
+        for result, expected in zip(results, EXPECTED['checks']):
+            self.assertEqual(result['lfs'], expected['logic_forms'])
+            if isinstance(expected['kept'], str):
+                self.assertTrue(result['error'].startswith(expected['kept']))
+                continue
+            self.assertIsNone(result['error'])
+            self.assertEqual(result['kept'], [expected['logic_forms'][lf_id]
+                                              for lf_id in expected['kept']])
+            self.assertEqual(len(result['kept']) + len(result['rejected']),
+                             len(expected['logic_forms']))
+            self.assertIn(f"LF check summary: {result['summary']}", expected['output'])
+        self.assertEqual(output, 'Checked 7 of 7 sentences: 10 logical forms kept, '
+                                 '9 rejected, 2 sentences failed\n')
+
+    def test_single_lf(self):
+        _, results = self.run_main(['--batch', self.write_batch(
+            [None, {'lf': "'@Is'('checksum','0')", 'sentence': 'a\t"b"\n'}, None])])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['sentence'], 'a\t"b"\n')
+        self.assertEqual(results[0]['kept'], ["'@Is'('checksum','0')"])
+
+    def test_empty(self):
+        output, results = self.run_main(['--batch', self.write_batch([])])
+        self.assertEqual(results, [])
+        self.assertEqual(output, 'Checked 0 of 0 sentences: 0 logical forms kept, '
+                                 '0 rejected, 0 sentences failed\n')
+
+    def test_jobs(self):
+        batch_path = self.write_batch(self.expected_batch())
+        self.assertEqual(self.run_main(['--batch', batch_path, '--jobs', '2'], 'jobs2.jsonl'),
+                         self.run_main(['--batch', batch_path]))
+
+
+class RecheckTest(CheckBatchTest):
+
+    def setUp(self):
+        super().setUp()
+        self.batch_path = self.write_batch(self.expected_batch())
+        _, self.results = self.run_main(['--batch', self.batch_path])
+        self.results_path = str(self.tmp_path / 'LFcheck.jsonl')
+
+    def deny_order(self, predicate, parent):
+        """ Patch predicate_order_denylist to deny a parent of a predicate. """
+        predicate_id = lfg.intern_predicate(predicate)
+        mask = cp.COMPILED_ORDER_DENYLIST.get(predicate_id, 0)
+        return mock.patch.dict(cp.COMPILED_ORDER_DENYLIST, {
+            predicate_id: mask | 1 << lfg.intern_predicate(parent)})
+
+    def test_unchanged(self):
+        lookups = {}
+        self.assertFalse(any(clf.is_stale(result, lookups=lookups)
+                             for result in self.results))
+        output, results = self.run_main(['--recheck', self.results_path],
+                                        'recheck.jsonl')
+        self.assertEqual(results, self.results)
+        self.assertTrue(output.startswith('Checked 0 of 7 sentences: '))
+
+    def test_changed_rule(self):
+        with self.deny_order('@Is', '@AdvBefore'):
+            output, results = self.run_main(['--recheck', self.results_path],
+                                            'recheck.jsonl')
+            _, batch_results = self.run_main(['--batch', self.batch_path],
+                                             'batch.jsonl')
+        self.assertTrue(output.startswith('Checked 2 of 7 sentences: '))
+        self.assertEqual(results, batch_results)
+        self.assertEqual(results[:1] + results[3:], self.results[:1] + self.results[3:])
+        self.assertEqual(results[2]['kept'], [])
+        self.assertEqual(results[2]['rejected'], [
+            {'lf': EXPECTED['checks'][2]['logic_forms'][0], 'check': 'order'}])
+
+    def test_changed_checks(self):
+        self.assertTrue(clf.is_stale(self.results[0], ['rules', 'order']))
+        output, results = self.run_main(['--recheck', self.results_path,
+                                         '--checks', 'rules', 'order'],
+                                        'recheck.jsonl')
+        self.assertTrue(output.startswith('Checked 7 of 7 sentences: '))
+        self.assertEqual([result['checks'] for result in results],
+                         [['rules', 'order']] * 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
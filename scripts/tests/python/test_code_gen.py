@@ -0,0 +1,346 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the code generator. """
+
+import contextlib
+import io
+import json
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+UTILS_DIR = CUR_DIR / '..' / '..' / '..' / 'utils'
+sys.path.insert(0, str(UTILS_DIR / 'code_generator'))
+sys.path.insert(0, str(UTILS_DIR / 'logic_form_checker'))
+with contextlib.redirect_stdout(io.StringIO()):
+    import code_gen
+    import logic_form_graph as lfg
+import connect_metadata_system as mds
+import settings
+
+# logical forms of ICMP sentences, with the env execTool passes
+BATCH_FILE = str(CUR_DIR / 'code_gen_batch.jsonl')
+# code generated for BATCH_FILE by the recursive evaluator code_gen.py had
+# before evaluation plans, null for records that failed
+EXPECTED_FILE = CUR_DIR / 'code_gen_expected.json'
+# tokenized logical forms of code_gen.parse_logic_form() before it used
+# logic_form_parser, or the exception it raised; raw and LF_CONVERSIONS
+# preprocessed parser outputs and the LF_CONVERSIONS table
+PARSE_EXPECTED = json.loads((CUR_DIR / 'parse_logic_form_expected.json').read_text())
+# a line of code_batch.jsonl as written by write_batch_record() of extTool.h
+ESCAPED_RECORD = ('{"sentence": "a\\t\\"b\\"\\nc\\\\d\\u0001", "sentence_id": "7", '
+                  '"lf": "\'@Is\'(\'checksum\',\'0\')", '
+                  '"env": "{\\"protocol\\":\\"ICMP\\"}"}\n')
+
+
+class ParseLogicFormTest(unittest.TestCase):
+
+    def test_expected(self):
+        for logic_form, expected in PARSE_EXPECTED.items():
+            try:
+                tokens = code_gen.parse_logic_form(logic_form)
+            except SyntaxError:
+                tokens = 'SyntaxError'
+            self.assertEqual(tokens, expected, logic_form)
+
+    def test_unbalanced(self):
+        for logic_form in ("'@Is'('checksum','0'", "'@Is'('checksum','0'))",
+                           "'@Is'('@Of'('type','icmp'),'0'", ")'@Is'('checksum','0'"):
+            with self.assertRaises(SyntaxError):
+                code_gen.parse_logic_form(logic_form)
+            with self.assertRaises(SyntaxError):
+                lfg.LogicFormGraph(logic_form)
+
+    def test_empty(self):
+        self.assertEqual(code_gen.parse_logic_form(''), [])
+
+
+def replace_in_order(content: str, conversions: dict) -> str:
+    """ Replace the entries of a conversion table one by one, as
+    code_gen did before it compiled the tables. """
+    for old, new in conversions.items():
+        content = content.replace(old, new)
+    return content
+
+
+def replace_env(element: str, env: dict) -> str:
+    """ Replace the env placeholders of a TERM_CONVERSIONS entry, as
+    get_conversions() did before it cached the tables. """
+    for key, value in env.items():
+        element = element.replace(f'{{ENV_{key}}}', value)
+        if key == 'message':
+            element = element.replace(' ', '_')
+    return element
+
+
+class ConversionsTest(unittest.TestCase):
+
+    def assert_replaced_in_order(self, texts, conversions):
+        for text in texts:
+            self.assertEqual(code_gen.prepreprocess_logic_form(text, conversions),
+                             replace_in_order(text, conversions), (text, conversions))
+
+    def test_settings(self):
+        records = code_gen.read_batch(BATCH_FILE)
+        codes = [code for code in json.loads(EXPECTED_FILE.read_text()) if code]
+        for conversions, texts in ((settings.LF_CONVERSIONS,
+                                    list(PARSE_EXPECTED) + [record['lf'] for record in records]),
+                                   (settings.CODE_CONVERSIONS, codes)):
+            texts.append(' '.join(conversions))
+            texts.append(''.join(conversions))
+            self.assert_replaced_in_order(texts, conversions)
+
+    def test_chained(self):
+        conversions = {'hdr.': 'hdr->', 'hdr->hdr': 'hdr', 'ab': '', 'xy': 'a'}
+        self.assert_replaced_in_order(['hdr.hdr.x', 'hdr->hdr.', 'xaaby', 'axyb',
+                                       'xyxy', '', 'hdr'], conversions)
+
+    def test_random(self):
+        rand = random.Random(0)
+        words = ['', 'a', 'b', 'ab', 'ba', 'aab', 'bb', 'abc', 'c.']
+        for _ in range(300):
+            conversions = {rand.choice(words[1:]) + rand.choice(words):
+                           rand.choice(words) for _ in range(rand.randint(1, 6))}
+            texts = [''.join(rand.choice('abc.') for _ in range(rand.randint(0, 12)))
+                     for _ in range(20)]
+            self.assert_replaced_in_order(texts, conversions)
+
+    def test_env_conversions(self):
+        env = {'protocol': 'ICMP', 'message': 'Echo or Echo Reply Message',
+               'field': 'checksum'}
+        conversions = code_gen.get_conversions(env)
+        self.assertIs(code_gen.get_conversions(dict(env)), conversions)
+        self.assertEqual(conversions, {key: replace_env(value, env)
+                                       for key, value in settings.TERM_CONVERSIONS.items()})
+        self.assertIsNot(code_gen.get_conversions(dict(env, field='type')), conversions)
+
+
+class CodeGenTest(unittest.TestCase):
+    """ Code generation with the MetaData System in a temporary directory. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        meta_path = os.path.join(self.tmp_dir.name, 'message.db')
+        sent_path = os.path.join(self.tmp_dir.name, 'sent_to_lf.db')
+        self.patches = [mock.patch.object(mds, 'METADATA', mds.MetadataCache(meta_path)),
+                        mock.patch.object(mds.MetaDB, 'DEFAULT_NAME', meta_path),
+                        mock.patch.object(mds.SentenceDB, 'DEFAULT_NAME', sent_path)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        mds.METADATA.reset()
+        mds.SESSION.reset()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmp_dir.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w') as batch_file:
+            batch_file.write(text)
+        return path
+
+
+class ReadBatchTest(CodeGenTest):
+
+    def test_empty(self):
+        for name in ('code_batch.jsonl', 'code_batch.tsv'):
+            self.assertEqual(code_gen.read_batch(self.write(name, '')), [])
+        self.assertEqual(code_gen.generate_batch([], use_mds=True), '')
+
+    def test_escaped(self):
+        records = code_gen.read_batch(self.write('code_batch.jsonl', ESCAPED_RECORD))
+        self.assertEqual(records, [{'sentence': 'a\t"b"\nc\\d\x01', 'sentence_id': 7,
+                                    'lf': "'@Is'('checksum','0')",
+                                    'env': {'protocol': 'ICMP'}}])
+
+    def test_tsv(self):
+        path = self.write('code_batch.tsv', 'The checksum is zero\t3\t'
+                          "'@Is'('checksum','0')\t{\"protocol\": \"ICMP\"}\n")
+        self.assertEqual(code_gen.read_batch(path),
+                         [{'sentence': 'The checksum is zero', 'sentence_id': 3,
+                           'lf': "'@Is'('checksum','0')", 'env': {'protocol': 'ICMP'}}])
+
+
+def generate_codes(records):
+    """ Generate code for each record like a code_gen.py run per logic form,
+    None for records that fail. """
+    codes = []
+    for record in records:
+        try:
+            codes.append(code_gen.generate_code(record['lf'], dict(record['env'])))
+        except Exception:
+            codes.append(None)
+    return codes
+
+
+class GenerateBatchTest(CodeGenTest):
+
+    def test_batch_matches_single(self):
+        records = code_gen.read_batch(BATCH_FILE)
+        with contextlib.redirect_stdout(io.StringIO()):
+            codes = generate_codes(records)
+            batch_code = code_gen.generate_batch(records, quiet=True)
+        self.assertEqual(batch_code, ''.join(code for code in codes if code is not None))
+
+    def test_batch_writes_back(self):
+        records = code_gen.read_batch(BATCH_FILE)[:12]
+        sent_db = mds.SESSION.get(mds.SentenceDB)
+        for record in records:
+            env = record['env']
+            sent_db.replace_value(mds.SentenceRecord(
+                record['sentence'], record['sentence_id'], env['message'],
+                env['field'], record['sentence'], record['lf'], '',
+                json.dumps(env), ''))
+        with contextlib.redirect_stdout(io.StringIO()):
+            codes = generate_codes(records)
+            code_gen.generate_batch(records, use_mds=True, quiet=True)
+        for record, code in zip(records, codes):
+            row = mds.get_sentence_row(record['env']['message'],
+                                       record['env']['field'], record['lf'],
+                                       record['sentence'], record['sentence_id'])
+            self.assertEqual(row.code, code or '')
+
+
+def eval_recursive(lf, env):
+    """ Evaluate a logic form like eval_logic_form() before evaluation
+    plans, as reference. """
+    if not isinstance(lf, list):
+        return lf
+    func, *params = lf
+    if not isinstance(func, str):
+        eval_recursive(func, env)
+    params = [eval_recursive(param, env) for param in params]
+    return code_gen.get_ops()[func](params, env)
+
+
+def preprocess(record):
+    """ Get the env and the preprocessed logic forms of a record, like
+    generate_code() does. """
+    env = dict(record['env'])
+    env['role'] = code_gen.get_role(record['lf'], settings.ROLE_KEYWORDS)
+    lfs = code_gen.parse_logic_form(
+        code_gen.prepreprocess_logic_form(record['lf'], settings.LF_CONVERSIONS))
+    lfs = code_gen.filter_logic_forms(lfs, settings.DENYLIST)
+    return env, code_gen.preprocess_logic_forms(lfs, code_gen.get_conversions(env))
+
+
+class EvalPlanTest(CodeGenTest):
+
+    def test_expected_code(self):
+        records = code_gen.read_batch(BATCH_FILE)
+        expected = json.loads(EXPECTED_FILE.read_text())
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(generate_codes(records), expected)
+            self.assertEqual(code_gen.generate_batch(records, quiet=True),
+                             ''.join(code for code in expected if code is not None))
+
+    def test_plan_matches_recursive(self):
+        cache = {}
+        for record in code_gen.read_batch(BATCH_FILE):
+            results = []
+            for evaluate in (lambda lf, env: code_gen.eval_logic_form(lf, env, cache),
+                             eval_recursive):
+                env, lfs = preprocess(record)
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    try:
+                        result = [evaluate(lf, env) for lf in lfs]
+                    except Exception as error:
+                        result = repr(error)
+                # operators skipped on a cache hit must not have side effects
+                results.append((result, env, output.getvalue()))
+            self.assertEqual(results[0], results[1], record['lf'])
+
+
+class MetadataCacheTest(CodeGenTest):
+
+    def add_field(self, msg_type, protocol, field, bit):
+        mds.SESSION.get(mds.MetaDB).replace_value(
+            mds.MetaRecord(msg_type, protocol, field_name=field, bit_cnt=bit))
+
+    def test_refresh_on_commit(self):
+        self.assertEqual(mds.get_msg_fields('Echo'), [])
+        self.add_field('Echo', 'ICMP', 'type', 8)
+        self.add_field('Echo', 'ICMP', 'code', 8)
+        self.add_field('Raw', 'unknown', 'data', 0)
+        self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8), ('code', 8)])
+        self.assertEqual(mds.get_proto_field_names('ICMP'), {'type', 'code'})
+        self.assertEqual(mds.get_proto_messages('unknown'), {'Raw'})
+        self.assertEqual(mds.get_msg_fields('Raw'), [])
+        with mds.SESSION.transaction():
+            self.add_field('Echo Reply', 'ICMP', 'checksum', 16)
+            # not committed yet
+            self.assertEqual(mds.get_proto_messages('ICMP'), {'Echo'})
+        self.assertEqual(mds.get_proto_messages('ICMP'), {'Echo', 'Echo Reply'})
+        self.assertEqual(mds.get_proto_fields()['ICMP'],
+                         {('type', 8), ('code', 8), ('checksum', 16)})
+
+    def test_cached(self):
+        self.add_field('Echo', 'ICMP', 'type', 8)
+        self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8)])
+        with mock.patch.object(mds.METADATA.db, 'get_all_fields',
+                               side_effect=AssertionError('read again')):
+            self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8)])
+            self.assertEqual(mds.get_proto_field_names('ICMP'), {'type'})
+        # callers get copies of the cached fields
+        mds.get_msg_fields('Echo').append(('code', 8))
+        mds.get_proto_fields()['ICMP'].add(('code', 8))
+        self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8)])
+        self.assertEqual(mds.get_proto_fields()['ICMP'], {('type', 8)})
+
+    def test_replaced_db(self):
+        self.add_field('Echo', 'ICMP', 'type', 8)
+        self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8)])
+        mds.SESSION.reset()
+        os.remove(mds.MetaDB.DEFAULT_NAME)
+        meta_db = mds.MetaDB(mds.MetaDB.DEFAULT_NAME)
+        meta_db.replace_value(mds.MetaRecord('Echo', 'ICMP', field_name='code',
+                                             bit_cnt=8))
+        meta_db.close_conn()
+        self.assertEqual(mds.get_msg_fields('Echo'), [('code', 8)])
+
+    def test_reset(self):
+        self.add_field('Echo', 'ICMP', 'type', 8)
+        self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8)])
+        mds.METADATA.reset()
+        self.assertIsNone(mds.METADATA.db)
+        self.assertEqual(mds.METADATA.msg_fields, {})
+        self.assertEqual(mds.get_msg_fields('Echo'), [('type', 8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the tree of logical form graphs. """
+
+import contextlib
+import io
+import json
+import pathlib
+import pickle
+import sys
+import unittest
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+LFC_DIR = CUR_DIR / '..' / '..' / '..' / 'utils' / 'logic_form_checker'
+sys.path.insert(0, str(LFC_DIR))
+with contextlib.redirect_stdout(io.StringIO()):
+    import logic_form_graph as lfg
+
+# networkx graphs, traversals and reprs of sample logical forms, from
+# LogicFormGraph before it was backed by LogicFormTree
+EXPECTED = json.loads((CUR_DIR / 'logic_form_graph_expected.json').read_text())
+
+
+class LogicFormGraphTest(unittest.TestCase):
+
+    def test_expected_graphs(self):
+        for expected in EXPECTED:
+            graph = lfg.LogicFormGraph(expected['lf'])
+            self.assertEqual([[name, data['predicate']]
+                              for name, data in graph.graph.nodes(data=True)],
+                             expected['nodes'])
+            self.assertEqual([list(edge) for edge in graph.graph.edges()],
+                             expected['edges'])
+            self.assertEqual(graph.list_preorder_nodes(), expected['preorder'])
+            self.assertEqual(graph.list_postorder_nodes(), expected['postorder'])
+            self.assertEqual(graph.is_binary_tree(), expected['binary'])
+            self.assertEqual(repr(graph), expected['repr'])
+
+    def test_tree(self):
+        tree = lfg.LogicFormGraph("'@Is'('@Of'('checksum','icmp'),'0')").tree
+        self.assertEqual([tree.predicate(node) for node in tree.preorder()],
+                         ['@Is', '@Of', 'checksum', 'icmp', '0'])
+        root, = tree.roots()
+        self.assertEqual([tree.predicate(child) for child in tree.children(root)],
+                         ['@Of', '0'])
+        self.assertTrue(tree.is_tree())
+
+    def test_pickle(self):
+        graph = lfg.LogicFormGraph(EXPECTED[0]['lf'])
+        state = pickle.dumps(graph)
+        # interned ids differ between processes, pickles keep the names
+        lfg.intern_predicate("'@NotInterned'")
+        copy = pickle.loads(state)
+        self.assertEqual(repr(copy), repr(graph))
+        self.assertEqual(list(copy.tree.predicate_ids), list(graph.tree.predicate_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
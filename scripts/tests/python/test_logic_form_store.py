@@ -0,0 +1,122 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the hash-consed logical form store. """
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+UTILS_DIR = CUR_DIR / '..' / '..' / '..' / 'utils'
+sys.path.insert(0, str(UTILS_DIR / 'logic_form_checker'))
+sys.path.insert(0, str(UTILS_DIR / 'metadata_system'))
+from logic_form_store import LogicFormStore, Node
+from sentence_record import SentenceDB
+
+LF_1 = "'@Is'('@Of'('checksum','icmp'),'0')"
+LF_2 = "'@AdvBefore'('@Is'('@Of'('checksum','icmp'),'0'),'@Action'('compute','checksum'))"
+
+
+class LogicFormStoreTest(unittest.TestCase):
+
+    def test_shared_subtrees(self):
+        store = LogicFormStore()
+        root_1, = store.add(LF_1)
+        root_2, = store.add(LF_2)
+        self.assertEqual(store.nodes[root_2].args[0], root_1)
+        self.assertEqual(store.add(LF_1), (root_1,))
+        # 'checksum' is a single node in both logical forms
+        self.assertEqual(len(store), len(set(store.nodes)))
+        self.assertEqual(store.nodes.count(Node("'checksum'", ())), 1)
+
+    def test_several_roots(self):
+        store = LogicFormStore()
+        roots = store.add("'@Is'('type','0'),'@Is'('code','0')")
+        self.assertEqual(len(roots), 2)
+
+    def test_fold(self):
+        store = LogicFormStore()
+        calls = []
+
+        def size(label, args):
+            calls.append(label)
+            return 1 + sum(args)
+
+        cache = {}
+        root_1, = store.add(LF_1)
+        root_2, = store.add(LF_2)
+        self.assertEqual(store.fold(root_1, size, cache), 5)
+        calls.clear()
+        self.assertEqual(store.fold(root_2, size, cache), 9)
+        # the subtree of LF_1 and 'checksum' are not computed again
+        self.assertEqual(sorted(calls), sorted(["'@AdvBefore'", "'@Action'",
+                                                "'compute'"]))
+
+
+class LogicFormNodesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'sent_to_lf.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def node_count(self, db):
+        db.cursor.execute("SELECT COUNT(*) FROM lf_node")
+        return db.cursor.fetchone()[0]
+
+    def test_update_lf_nodes(self):
+        db = SentenceDB(self.path)
+        root_1, = db.update_lf_nodes(LF_1)
+        self.assertEqual(self.node_count(db), 5)
+        root_2, = db.update_lf_nodes(LF_2)
+        self.assertEqual(self.node_count(db), 8)
+        db.cursor.execute("SELECT args FROM lf_node WHERE id=?", (root_2,))
+        self.assertEqual(db.cursor.fetchone()[0].split(',')[0], str(root_1))
+        db.cursor.execute("SELECT roots FROM lf_root WHERE lf=?", (LF_2,))
+        self.assertEqual(db.cursor.fetchone()[0], str(root_2))
+
+    def test_store_per_db(self):
+        db = SentenceDB(self.path)
+        root, = db.update_lf_nodes(LF_1)
+        other_db = SentenceDB(self.path)
+        self.assertIsNot(other_db.lf_store, db.lf_store)
+        # another connection finds the nodes written by the first one
+        db.update_lf_nodes(LF_2)
+        self.assertEqual(other_db.update_lf_nodes(LF_1), (root,))
+        self.assertEqual(other_db.update_lf_nodes(LF_2), db.update_lf_nodes(LF_2))
+        self.assertEqual(self.node_count(db), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the MetaData System DBs and their shared session. """
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+UTILS_DIR = CUR_DIR / '..' / '..' / '..' / 'utils'
+sys.path.insert(0, str(UTILS_DIR / 'metadata_system'))
+sys.path.insert(0, str(UTILS_DIR / 'phraser'))
+from db_session import DBSession
+from metarecord import MetaDB, MetaRecord
+from sentence_record import SentenceDB, SentenceRecord
+from term import TermDB
+
+
+class TransactionTest(unittest.TestCase):
+    """ transaction() of MetaDB, SentenceDB and TermDB. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'test.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_transaction(self, db_class, write, read):
+        """ Check that the write is committed at the end of a transaction
+        and rolled back on errors. """
+        db = db_class(self.path)
+        with self.assertRaises(KeyError):
+            with db.transaction():
+                write(db)
+                raise KeyError
+        self.assertFalse(db.in_transaction)
+        self.assertFalse(read(db))
+        with db.transaction():
+            write(db)
+            self.assertFalse(read(db_class(self.path)))
+        self.assertTrue(read(db_class(self.path)))
+        # a write outside of a transaction is committed right away
+        db.reset_db()
+        db = db_class(self.path)
+        write(db)
+        self.assertTrue(read(db_class(self.path)))
+
+    def test_meta_db(self):
+        self.check_transaction(
+            MetaDB,
+            lambda db: db.replace_value(MetaRecord('Echo', 'ICMP', field_name='type')),
+            lambda db: db.get_meta_by_msg_type('Echo'))
+
+    def test_sentence_db(self):
+        self.check_transaction(
+            SentenceDB,
+            lambda db: db.replace_value(SentenceRecord('The checksum is zero', 1,
+                                                       label='label')),
+            lambda db: db.get_mapping_by_label('label'))
+
+    def test_term_db(self):
+        self.assertTrue(TermDB(self.path).get_term_by_first_word('bfd.sessionstate'))
+        os.remove(self.path)
+        self.check_transaction(
+            TermDB,
+            lambda db: db.insert_value('uscnsl', 'uscnsl is awesome'),
+            lambda db: db.get_term_by_first_word('uscnsl'))
+
+    def test_rollback_resets_node_ids(self):
+        db = SentenceDB(self.path)
+        with self.assertRaises(KeyError):
+            with db.transaction():
+                db.update_lf_nodes("'@Is'('checksum','0')")
+                raise KeyError
+        self.assertIsNone(db.lf_node_ids)
+        self.assertEqual(db.update_lf_nodes("'@Is'('checksum','0')"), (3,))
+
+
+class DBSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_path = os.path.join(self.tmp_dir.name, 'message.db')
+        self.sent_path = os.path.join(self.tmp_dir.name, 'sent_to_lf.db')
+        self.session = DBSession()
+
+    def tearDown(self):
+        self.session.reset()
+        self.tmp_dir.cleanup()
+
+    def test_get_shares_db(self):
+        db = self.session.get(MetaDB, self.meta_path)
+        self.assertIs(self.session.get(MetaDB, self.meta_path), db)
+        prev_dir = os.getcwd()
+        try:
+            os.chdir(self.tmp_dir.name)
+            self.assertIs(self.session.get(MetaDB, 'message.db'), db)
+        finally:
+            os.chdir(prev_dir)
+        self.assertIsNot(self.session.get(SentenceDB, self.meta_path), db)
+
+    def test_transaction(self):
+        meta_db = self.session.get(MetaDB, self.meta_path)
+        with self.assertRaises(KeyError):
+            with self.session.transaction():
+                meta_db.replace_value(MetaRecord('Echo', 'ICMP', field_name='type'))
+                # opened within the transaction, still part of it
+                self.session.get(SentenceDB, self.sent_path).replace_value(
+                    SentenceRecord('The checksum is zero', 1))
+                raise KeyError
+        self.assertFalse(MetaDB(self.meta_path).get_meta_by_msg_type('Echo'))
+        self.assertFalse(SentenceDB(self.sent_path).get_all_mapping())
+
+        with self.session.transaction():
+            with self.session.transaction():
+                meta_db.replace_value(MetaRecord('Echo', 'ICMP', field_name='type'))
+            # the nested block joined the outer transaction
+            self.assertFalse(MetaDB(self.meta_path).get_meta_by_msg_type('Echo'))
+        self.assertTrue(MetaDB(self.meta_path).get_meta_by_msg_type('Echo'))
+
+    def test_reset_db(self):
+        meta_db = self.session.get(MetaDB, self.meta_path)
+        meta_db.replace_value(MetaRecord('Echo', 'ICMP', field_name='type'))
+        self.session.reset_db(MetaDB, self.meta_path)
+        self.assertFalse(os.path.exists(self.meta_path))
+        new_db = self.session.get(MetaDB, self.meta_path)
+        self.assertIsNot(new_db, meta_db)
+        self.assertFalse(new_db.get_meta_by_msg_type('Echo'))
+
+    def test_reset(self):
+        meta_db = self.session.get(MetaDB, self.meta_path)
+        with self.session.transaction():
+            with self.assertRaises(RuntimeError):
+                self.session.reset()
+        self.session.reset()
+        self.assertFalse(self.session.dbs)
+        # a DB replaced by another process is seen after the reset
+        os.remove(self.meta_path)
+        MetaDB(self.meta_path).replace_value(
+            MetaRecord('Echo', 'ICMP', field_name='type'))
+        new_db = self.session.get(MetaDB, self.meta_path)
+        self.assertIsNot(new_db, meta_db)
+        self.assertTrue(new_db.get_meta_by_msg_type('Echo'))
+
+    def test_fork_forgets_dbs(self):
+        self.session.get(MetaDB, self.meta_path)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write_fd, str(len(self.session.dbs)).encode())
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read_fd, 16), b'0')
+        os.close(read_fd)
+        os.close(write_fd)
+        self.assertEqual(len(self.session.dbs), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
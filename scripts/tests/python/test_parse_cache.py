@@ -0,0 +1,124 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the on-disk parse cache. """
+
+import functools
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+CCG_DIR = CUR_DIR / '..' / '..' / '..' / 'utils' / 'ccg_tool'
+sys.path.insert(0, str(CCG_DIR))
+import parse_cache
+from parse_cache import ParseCache, cache_entries, source_key
+from Parser import Parser, lexical_prior_score, preprocess_sent, score_key, tokenize
+
+SENTENCE = "The 'checksum' is zero"
+
+
+def tokens():
+    return tokenize(preprocess_sent(SENTENCE))[0]
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = pathlib.Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        parse_cache.grammar_key.cache_clear()
+        parse_cache.CACHE_SIZES.pop(self.cache_dir, None)
+        self.tmp_dir.cleanup()
+
+    def test_source_key(self):
+        source = self.cache_dir / 'Parser.py'
+        source.write_text('BEAM = 1\n')
+        key = source_key(self.cache_dir)
+        self.assertEqual(source_key(self.cache_dir), key)
+        source.write_text('BEAM = 2\n')
+        self.assertNotEqual(source_key(self.cache_dir), key)
+
+    def test_sources_invalidate_parses(self):
+        parser = Parser(cache=ParseCache('parse', self.cache_dir))
+        parses = parser.parse(tokens())[0]
+        self.assertTrue(parses)
+        self.assertEqual(len(cache_entries(self.cache_dir)), 1)
+        # the cached parses are used while the sources are unchanged
+        with mock.patch.object(Parser, '_parse', side_effect=AssertionError):
+            self.assertEqual(parser.parse(tokens())[0], parses)
+        # a change of the parser sources gives a new key
+        parse_cache.grammar_key.cache_clear()
+        with mock.patch.object(parse_cache, 'source_key', return_value='changed'):
+            parser = Parser(cache=ParseCache('parse', self.cache_dir))
+        self.assertEqual(parser.parse(tokens())[0], parses)
+        self.assertEqual(len(cache_entries(self.cache_dir)), 2)
+
+    def test_score_key(self):
+        self.assertEqual(score_key(lexical_prior_score), 'Parser.lexical_prior_score')
+        self.assertIsNone(score_key(lambda parse, category, semantics: 0))
+        self.assertIsNone(score_key(functools.partial(lexical_prior_score)))
+
+    def test_unnamed_scores_not_cached(self):
+        for score in (lambda parse, category, semantics: 0,
+                      lambda parse, category, semantics: 1):
+            parser = Parser(beam_width=1, score=score,
+                            cache=ParseCache('parse', self.cache_dir))
+            parser.parse(tokens())
+        self.assertFalse(cache_entries(self.cache_dir))
+
+    def test_evict(self):
+        cache = ParseCache('parse', self.cache_dir, max_size=1000)
+        cache.put('old', b'x' * 300)
+        entry_size = cache_entries(self.cache_dir)[0][1]
+        os.utime(self.cache_dir / 'parse' / 'old.pickle', (0, 0))
+        with mock.patch.object(parse_cache, 'cache_entries',
+                               wraps=cache_entries) as scans:
+            # the size is counted in memory, the cache is only scanned to evict
+            for index in range(2):
+                cache.put(f'new{index}', b'x' * 300)
+            self.assertEqual(scans.call_count, 0)
+            self.assertEqual(parse_cache.CACHE_SIZES[self.cache_dir], 3 * entry_size)
+            cache.put('new2', b'x' * 300)
+            self.assertEqual(scans.call_count, 1)
+        # the least recently used entries are evicted down to EVICT_TO
+        self.assertEqual(sorted(path.name for _, _, path in cache_entries(self.cache_dir)),
+                         ['new1.pickle', 'new2.pickle'])
+        self.assertEqual(parse_cache.CACHE_SIZES[self.cache_dir], 2 * entry_size)
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual(cache.get('new2'), b'x' * 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
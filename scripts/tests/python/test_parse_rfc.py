@@ -0,0 +1,214 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of parse_rfc.py. """
+
+import ast
+import contextlib
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+UTILS_DIR = CUR_DIR / '..' / '..' / '..' / 'utils'
+sys.path.insert(0, str(UTILS_DIR / 'ccg_tool'))
+with contextlib.redirect_stdout(io.StringIO()):
+    import parse_rfc
+from Parser import reset_variable_names
+from db_session import SESSION
+from sentence_record import SentenceDB, SentenceRecord
+
+# output and first logical form of parse_rfc.py -c -nr for sample ICMP
+# sentences, before the parser and checker optimizations
+EXPECTED = json.loads((CUR_DIR / 'parse_rfc_expected.json').read_text())
+
+MSG_TYPE = 'Echo or Echo Reply Message'
+FIELD = 'checksum'
+ENV = json.dumps({'protocol': 'ICMP', 'message': MSG_TYPE, 'field': FIELD})
+
+
+def final_logic_forms(output: str) -> list:
+    """ Get the final logical forms of parse_rfc.py output, without ids,
+    sorted: their order follows a set and changes with the hash seed. """
+    _, _, final = output.partition('Final logical forms:\n')
+    return sorted(line.split(': ', 1)[1] for line in final.splitlines()
+                  if line.split(':', 1)[0].isdigit())
+
+
+def output_lines(output: str) -> list:
+    """ Get the lines of parse_rfc.py output in an order that does not
+    depend on the hash seed. Logical form ids are dropped, the ids of
+    equivalent logical forms are replaced by the logical forms. """
+    logic_forms = {}
+    lines = []
+    for line in output.splitlines():
+        lf_id, sep, logic_form = line.partition(': ')
+        if sep and lf_id.isdigit():
+            logic_forms.setdefault(int(lf_id), logic_form)
+            line = logic_form
+        elif line.startswith('Equivalent logical forms: '):
+            groups = ast.literal_eval(logic_form)
+            line = str(sorted(sorted(logic_forms[lf_id] for lf_id in group)
+                              for group in groups))
+        lines.append(line)
+    return sorted(lines)
+
+
+class ParseRfcTest(unittest.TestCase):
+    """ parse_rfc.py with its results and metadata DBs in a temporary
+    directory. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = pathlib.Path(self.tmp_dir.name)
+        self.patches = [mock.patch.object(parse_rfc, 'CUR_DIR', self.tmp_path),
+                        mock.patch.object(SentenceDB, 'DEFAULT_NAME',
+                                          str(self.tmp_path / 'sent_to_lf.db'))]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        SESSION.reset()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmp_dir.cleanup()
+
+    def run_main(self, argv):
+        """ Run parse_rfc.py, get its output. """
+        reset_variable_names()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), \
+             contextlib.redirect_stderr(io.StringIO()):
+            parse_rfc.main(argv + ['--no_cache'])
+        return output.getvalue()
+
+    def register_sentences(self, db_name):
+        """ Add the sentences of EXPECTED to a new sentence DB, like
+        run_sqlite.py does before parsing. """
+        SESSION.reset()
+        SentenceDB.DEFAULT_NAME = str(self.tmp_path / db_name)
+        sentence_db = SESSION.get(SentenceDB)
+        for sentence_id, expected in enumerate(EXPECTED):
+            sentence_db.replace_value(SentenceRecord(
+                expected['sentence'], sentence_id, MSG_TYPE, FIELD,
+                expected['sentence']))
+        return sentence_db
+
+    def write_batch(self):
+        path = self.tmp_path / 'sentences.jsonl'
+        with open(path, 'w') as batch_file:
+            for expected in EXPECTED:
+                batch_file.write(json.dumps({'sentence': expected['sentence'],
+                                             'msg_type': MSG_TYPE, 'field': FIELD,
+                                             'env': ENV}) + '\n')
+        return str(path)
+
+    def run_batch(self, argv, db_name='batch.db'):
+        """ Run --batch on the sentences of EXPECTED, get the results and
+        the rows of the sentence DB. """
+        sentence_db = self.register_sentences(db_name)
+        out_path = self.tmp_path / 'CCGresult.jsonl'
+        self.run_main(['--batch', self.write_batch(), '--batch_output', str(out_path),
+                       '-c'] + argv)
+        with open(out_path) as out_file:
+            results = [json.loads(line) for line in out_file]
+        return results, sentence_db.get_all_mapping()
+
+
+class BatchTest(ParseRfcTest):
+
+    def test_batch_matches_single(self):
+        sentence_db = self.register_sentences('single.db')
+        results = []
+        for expected in EXPECTED:
+            result_path = self.tmp_path / 'CCGresult.txt'
+            if result_path.exists():
+                result_path.unlink()
+            self.run_main(['-s', expected['sentence'], '-c', '-m', MSG_TYPE,
+                           '-n', FIELD, '-e', ENV])
+            lf, sentence, sentence_id = '', '', None
+            if result_path.exists():
+                lf, sentence, sentence_id, _ = result_path.read_text().split('~')
+                sentence_id = int(sentence_id)
+            results.append((expected['sentence'], lf, sentence, sentence_id))
+        rows = sentence_db.get_all_mapping()
+
+        batch_results, batch_rows = self.run_batch([])
+        self.assertEqual([(result['label'], result['lf'], result['sentence'],
+                           result['sentence_id']) for result in batch_results],
+                         results)
+        self.assertFalse(any(result['error'] for result in batch_results))
+        self.assertEqual(batch_rows, rows)
+
+
+class CheckerTest(ParseRfcTest):
+
+    def test_expected_output(self):
+        for expected in EXPECTED:
+            self.assertEqual(
+                output_lines(self.run_main(['-s', expected['sentence'], '-c', '-nr'])),
+                output_lines(expected['output']))
+
+    def test_span_filter(self):
+        dropped = False
+        for expected in EXPECTED:
+            output = self.run_main(['-s', expected['sentence'], '-c', '-nr',
+                                    '--span_filter'])
+            self.assertEqual(final_logic_forms(output),
+                             final_logic_forms(expected['output']))
+            dropped = dropped or 'Span filter dropped' in output
+        self.assertTrue(dropped)
+
+
+class ParallelBatchTest(ParseRfcTest):
+
+    def test_jobs(self):
+        results, rows = self.run_batch([], 'batch1.db')
+        self.assertEqual(self.run_batch(['--jobs', '2'], 'batch2.db'), (results, rows))
+
+    def test_timeout(self):
+        def parse_slowly(cli_args, parser=None):
+            time.sleep(5)
+
+        with mock.patch.object(parse_rfc, 'lex_parse_logical_forms', parse_slowly):
+            results, rows = self.run_batch(['--timeout', '0.05'])
+        self.assertEqual([result['error'] for result in results],
+                         ['SentenceTimeout: no result after 0.05s'] * len(EXPECTED))
+        self.assertEqual([result['lf'] for result in results], [''] * len(EXPECTED))
+        self.assertFalse(any(row[5] for row in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,261 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests of the CCG parser. """
+
+import copy
+import itertools
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+CCG_DIR = CUR_DIR / '..' / '..' / '..' / 'utils' / 'ccg_tool'
+sys.path.insert(0, str(CCG_DIR))
+from Parser import BudgetExhausted, Parser, ParseBudget
+from Parser import iter_tokenize, preprocess_sent, reset_variable_names, string_to_predicate
+from Parser import tokenize
+from constant import BEAM_WIDTH, MAX_PHRASE_LEN
+from dictionary import RAW_LEXICON
+import lexicon_cache
+
+SENTENCES = [
+    "The 'checksum' is zero",
+    "For computing the 'checksum' , the 'checksum field' should be zero",
+    "The 'data' received in the 'echo message' must be returned in the "
+    "'echo reply message'",
+    "The 'address' of the 'source' in an 'echo message' will be the "
+    "'destination' of the 'echo reply message'",
+]
+
+# tokenizations and parses of sample sentences by the parser before it
+# extended one lexicon per sentence and kept back-pointers
+EXPECTED = json.loads((CUR_DIR / 'parser_expected.json').read_text())
+
+
+def parse_result(parser, tokens):
+    """ Parse tokens, get the parses with their names, lexicon and children
+    as in parser_expected.json. """
+    reset_variable_names()
+    parses, names, lexicon_used, children, error = parser.parse(tokens)
+    if error is not None:
+        raise error
+    return {'tokens': tokens, 'parses': parses, 'names': names,
+            'lexicon_used': {name: str(lexicon_used[name])
+                             for name in names if name in lexicon_used},
+            'children': {name: str(children[name])
+                         for name in names if name in children}}
+
+
+def parse_all(parser, sentence):
+    """ Parse all tokenizations of a sentence, get the parses of each. """
+    reset_variable_names()
+    return [parser.parse(tokens)[0]
+            for tokens in tokenize(preprocess_sent(sentence))]
+
+
+def tokenize_reference(sentence):
+    """ tokenize() as it was before the predicate lattice. """
+    log = {i: [] for i in range(len(sentence) + 1)}
+    log[0] = [[]]
+    for i, token in enumerate(sentence):
+        if not log[i] and i > 0:
+            log[i] = copy.copy(log[i-1])
+        for _range in range(1, MAX_PHRASE_LEN + 1):
+            if i + _range > len(sentence):
+                break
+            phrase = ' '.join(sentence[i:i + _range])
+            predicates = string_to_predicate(phrase)
+            for temp_result in log[i]:
+                for predicate in predicates:
+                    log[i + _range].append(temp_result + [predicate])
+            if token.startswith("\"") or token.startswith("\'"):
+                break
+    return log[len(sentence)]
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_expected_tokenizations(self):
+        for expected in EXPECTED:
+            self.assertEqual(tokenize(preprocess_sent(expected['sentence'])),
+                             [result['tokens'] for result in expected['tokenizations']])
+
+    def test_same_as_reference(self):
+        for sentence in SENTENCES + [
+                "The 'checksum' is zero unless frobnicated",
+                "Zzz the 'checksum' is zero",
+                "If code = 0, an 'identifier' to aid in matching echos and replies, "
+                "may be zero"]:
+            tokens = preprocess_sent(sentence)
+            self.assertEqual(tokenize(tokens), tokenize_reference(tokens), sentence)
+
+    def test_lazy(self):
+        tokens = preprocess_sent(EXPECTED[2]['sentence'])
+        tokenizations = iter_tokenize(tokens)
+        self.assertEqual(list(itertools.islice(tokenizations, 2)), tokenize(tokens)[:2])
+
+    def test_cached_predicates(self):
+        self.assertIs(string_to_predicate('is'), string_to_predicate('is'))
+        self.assertEqual(string_to_predicate("'checksum'"), ["'checksum'"])
+
+
+class BeamTest(unittest.TestCase):
+
+    def test_wide_beam_is_exhaustive(self):
+        for sentence in SENTENCES:
+            self.assertEqual(parse_all(Parser(beam_width=BEAM_WIDTH), sentence),
+                             parse_all(Parser(), sentence))
+
+    def test_narrow_beam_bounds_spans(self):
+        parser = Parser(beam_width=2)
+        parse_all(parser, SENTENCES[2])
+        self.assertTrue(parser.beam_report)
+        self.assertTrue(all(span['kept'] <= 2 for span in parser.beam_report))
+        self.assertTrue(any(span['dropped'] for span in parser.beam_report))
+
+    def test_no_beam_drops_nothing(self):
+        parser = Parser()
+        parse_all(parser, SENTENCES[2])
+        self.assertFalse(any(span['dropped'] for span in parser.beam_report))
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def test_same_as_rebuilt_lexicon(self):
+        # sentences with few tokenizations, rebuilding the lexicon is slow
+        for expected in EXPECTED:
+            if len(expected['tokenizations']) > 2:
+                continue
+            for result in expected['tokenizations']:
+                self.assertEqual(parse_result(Parser(incremental=False), result['tokens']),
+                                 result)
+                self.assertEqual(parse_result(Parser(), result['tokens']), result)
+
+
+class ChartTest(unittest.TestCase):
+
+    def test_expected_parses(self):
+        for expected in EXPECTED:
+            for result in expected['tokenizations']:
+                self.assertEqual(parse_result(Parser(), result['tokens']), result)
+
+    def test_back_pointers(self):
+        tokens = EXPECTED[0]['tokenizations'][0]['tokens']
+        _, names, lexicon_used, children, _ = Parser().parse(tokens)
+        self.assertEqual(set(lexicon_used), set(children))
+        self.assertTrue(set(names) <= set(lexicon_used))
+        # every span uses the lexical entries of its tokens
+        self.assertEqual(len(lexicon_used[names[0]]), len(tokens))
+        with self.assertRaises(KeyError):
+            lexicon_used['$Layer9_St0_1']
+
+
+class BudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        # the tokenization of a sentence with most parses
+        self.expected = max((result for expected in EXPECTED
+                             for result in expected['tokenizations']),
+                            key=lambda result: len(result['parses']))
+        self.tokens = self.expected['tokens']
+
+    def parse(self, budget, parser_budget=None):
+        reset_variable_names()
+        return Parser(budget=parser_budget).parse(self.tokens, budget)
+
+    def assert_exhausted(self, result, limit):
+        parses, names, _, _, error = result
+        self.assertIsInstance(error, BudgetExhausted)
+        self.assertEqual(error.limit, limit)
+        # partial results are complete parses of the sentence
+        self.assertTrue(set(parses) <= set(self.expected['parses']))
+        self.assertEqual(len(names), len(parses))
+
+    def test_no_limits(self):
+        self.assertEqual(parse_result(Parser(budget=ParseBudget()), self.tokens),
+                         self.expected)
+
+    def test_cells(self):
+        self.assert_exhausted(self.parse(ParseBudget(cells=1)), 'cells')
+
+    def test_derivations(self):
+        self.assert_exhausted(self.parse(ParseBudget(derivations=1)), 'derivations')
+
+    def test_seconds(self):
+        self.assert_exhausted(self.parse(ParseBudget(seconds=1e-9)), 'seconds')
+
+    def test_budget_of_parse(self):
+        result = self.parse(ParseBudget(), parser_budget=ParseBudget(cells=1))
+        self.assertEqual(result[:2], (self.expected['parses'], self.expected['names']))
+        self.assertIsNone(result[4])
+
+
+class LexiconCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patch = mock.patch.object(lexicon_cache, 'CACHE_DIR',
+                                       pathlib.Path(self.tmp_dir.name))
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.tmp_dir.cleanup()
+
+    def load(self, lex_str):
+        # bypass the lexicons cached in this process
+        return lexicon_cache.load_lexicon.__wrapped__(lex_str)
+
+    def cache_files(self):
+        return sorted(path.name for path in pathlib.Path(self.tmp_dir.name).iterdir())
+
+    def test_cached_lexicon(self):
+        lex = self.load(RAW_LEXICON)
+        self.assertEqual(len(self.cache_files()), 1)
+        with mock.patch.object(lexicon_cache.lexicon, 'fromstring',
+                               side_effect=AssertionError):
+            cached = self.load(RAW_LEXICON)
+        self.assertEqual(str(cached), str(lex))
+
+    def test_changed_lexicon(self):
+        self.load(RAW_LEXICON)
+        files = self.cache_files()
+        lex = self.load(RAW_LEXICON + "\n    $Nonce => NP {'nonce'}")
+        self.assertIn("$Nonce => NP {'nonce'}", str(lex))
+        # the cache of the previous lexicon is removed
+        self.assertEqual(len(self.cache_files()), 1)
+        self.assertNotEqual(self.cache_files(), files)
+
+
+if __name__ == '__main__':
+    unittest.main()
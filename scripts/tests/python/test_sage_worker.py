@@ -0,0 +1,143 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests that requests to sage_worker.py behave like new processes. """
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+UTILS_DIR = CUR_DIR / '..' / '..' / '..' / 'utils'
+SAGE_DIR = UTILS_DIR / '..'
+
+# files parse_rfc.py writes next to the tools
+TOOL_FILES = [UTILS_DIR / 'ccg_tool' / 'CCGresult.txt',
+              UTILS_DIR / 'metadata_system' / 'sent_to_lf.db']
+
+# the same hash seed for the worker and the processes it is compared
+# with, parse_rfc.py -d prints the logical forms in the order of a set
+ENV = dict(os.environ, PYTHONHASHSEED='0')
+
+SENTENCE = "For computing the 'checksum' , the 'checksum field' should be zero"
+
+
+class Worker:
+    """ sage_worker.py serving requests on its stdin/stdout. """
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, str(UTILS_DIR / 'sage_worker.py'), '--stdio'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, env=ENV)
+
+    def request(self, tool, argv):
+        data = f'{tool} {len(argv)}\n'.encode()
+        for arg in argv:
+            arg = arg.encode()
+            data += f'{len(arg)}\n'.encode() + arg
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+        status, length = self.proc.stdout.readline().split()
+        return int(status), self.proc.stdout.read(int(length)).decode()
+
+    def close(self):
+        self.request('shutdown', [])
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+
+
+def run_process(script, argv, cwd):
+    """ Run a tool in a new process like the shell scripts do, without the
+    output of its imports the worker printed when it loaded the tool. """
+    proc = subprocess.run([sys.executable, str(script)] + argv, cwd=cwd,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          env=ENV, check=False)
+    imports = subprocess.run(
+        [sys.executable, '-c',
+         f'import sys; sys.path.insert(0, {str(script.parent)!r}); '
+         f'import {script.stem}'],
+        cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        env=ENV, check=False)
+    output = proc.stdout.decode()
+    prefix = imports.stdout.decode()
+    if output.startswith(prefix):
+        output = output[len(prefix):]
+    return proc.returncode, output
+
+
+class SageWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.new_files = [path for path in TOOL_FILES if not path.exists()]
+        self.worker = Worker()
+
+    def tearDown(self):
+        self.worker.close()
+        for path in self.new_files:
+            if path.exists():
+                path.unlink()
+
+    def test_parse_twice(self):
+        argv = ['-s', SENTENCE, '-nr', '-nc', '-d']
+        expected = run_process(UTILS_DIR / 'ccg_tool' / 'parse_rfc.py',
+                               argv, SAGE_DIR)
+        self.assertEqual(expected[0], 0)
+        # the second parse must not see the variables nltk numbered in the
+        # first one
+        self.assertEqual(self.worker.request('parse', argv), expected)
+        self.assertEqual(self.worker.request('parse', argv), expected)
+
+    def test_metadata_db_replaced(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            names = ['-s1', os.path.join(tmp_dir, 'message.db'),
+                     '-s2', os.path.join(tmp_dir, 'sent_to_lf.db')]
+            create = ['-c', '-p', 'icmp', '-m', 'echo', '-n', 'checksum',
+                      '-b', '16'] + names
+            self.assertEqual(self.worker.request('metadata', create)[0], 0)
+            # another process replaces the DB the worker has connected to
+            os.remove(names[1])
+            run_process(UTILS_DIR / 'metadata_system' / 'run_sqlite.py',
+                        ['-c', '-p', 'icmp', '-m', 'echo', '-n', 'identifier',
+                         '-b', '16'] + names, UTILS_DIR / 'metadata_system')
+            dump = ['-dm'] + names
+            expected = run_process(
+                UTILS_DIR / 'metadata_system' / 'run_sqlite.py', dump,
+                UTILS_DIR / 'metadata_system')
+            self.assertIn('identifier', expected[1])
+            self.assertNotIn('checksum', expected[1])
+            self.assertEqual(self.worker.request('metadata', dump), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -45,7 +45,6 @@ std::vector<std::string> state_process(std::string text,
   size_t cnt, pos;
   std::vector<std::string> sentences;
   std::vector<std::string> pre_sentences;
-  std::string cmd;
 
   for (cnt = 0; cnt < text.size(); cnt++) {
     if (text[cnt] == '\n' || text[cnt] == '\r') {
@@ -92,9 +91,7 @@ std::vector<std::string> state_process(std::string text,
   for (cnt = 0; cnt < sentences.size(); cnt++) {
     // Display the parsed sentences
     // std::cout<<"\t"<<sentences[cnt]<<std::endl;
-    cmd = "cd utils/phraser; python3 corenlp.py -s \"" + sentences[cnt] +
-          "\" >nul 2>nul";
-    exec_command(cmd);
+    run_python_tool("phrase", {"-s", sentences[cnt]}, false);
 
     std::string output_filepath =
         path_name + "/utils/phraser/models/DBLP/output.txt";
@@ -108,9 +105,7 @@ std::vector<std::string> state_process(std::string text,
     std::string ir_result;
     std::ifstream fp_read;
 
-    cmd = "python3 utils/ccg_tool/parse_rfc.py -c -s \"" + line +
-          "\"; >nul 2>nul";
-    exec_command(cmd);
+    run_python_tool("parse", {"-c", "-s", line});
 
     fp_read.open(ccg_result_path);
     while (std::getline(fp_read, ir_result)) {
@@ -146,14 +141,11 @@ void add_func_close(std::string filename) {
 
 void gen_state_management_code(std::vector<std::string> IR,
                                std::string outfile) {
-  std::string cmd;
   size_t cnt;
   std::cout << "IR aggregate results:" << std::endl;
   for (cnt = 0; cnt < IR.size(); cnt++) {
     std::cout << IR[cnt] << std::endl;
-    cmd = "python3 utils/code_generator/sim_code_gen.py \"" + IR[cnt] +
-          "\" -o \"" + outfile + "\";";
-    exec_command(cmd);
+    run_python_tool("simcodegen", {IR[cnt], "-o", outfile});
   }
 }
 
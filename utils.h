@@ -31,10 +31,14 @@
 #define UTILS_H_
 
 #include <bits/stdc++.h>
+#include <sys/socket.h>
+#include <sys/un.h>
 #include <unistd.h>
 
 #include <algorithm>
+#include <map>
 #include <string>
+#include <vector>
 
 bool BothAreSpaces(char lhs, char rhs) { return (lhs == rhs) && (lhs == ' '); }
 bool BothAreReturns(char lhs, char rhs) {
@@ -84,4 +88,202 @@ void exec_command(std::string const& cmd) {
   }
 }
 
+// Python tools of SAGE: working directory and script relative to the SAGE
+// root. The names match the request types of utils/sage_worker.py.
+struct PythonTool {
+  std::string dir;
+  std::string script;
+};
+
+const std::map<std::string, PythonTool> PYTHON_TOOLS = {
+    {"phrase", {"utils/phraser", "corenlp.py"}},
+    {"parse", {".", "utils/ccg_tool/parse_rfc.py"}},
+    {"check", {".", "utils/logic_form_checker/check_logic_forms.py"}},
+    {"codegen", {".", "utils/code_generator/code_gen.py"}},
+    {"funcgen", {".", "utils/code_generator/func_gen.py"}},
+    {"simcodegen", {".", "utils/code_generator/sim_code_gen.py"}},
+    {"metadata", {"utils/metadata_system", "run_sqlite.py"}},
+};
+
+// Connection to the SAGE worker, -1 if every tool runs in a new interpreter
+int worker_fd = -1;
+std::string worker_socket;
+
+std::string shell_quote(std::string const& arg) {
+  std::string quoted = "'";
+  for (const char ch : arg) {
+    if (ch == '\'') {
+      quoted += "'\\''";
+    } else {
+      quoted += ch;
+    }
+  }
+  return quoted + "'";
+}
+
+// JSON string literal of arg, for the .jsonl files read by the python tools
+std::string json_quote(std::string const& arg) {
+  std::string quoted = "\"";
+  for (const char ch : arg) {
+    switch (ch) {
+      case '"':
+        quoted += "\\\"";
+        break;
+      case '\\':
+        quoted += "\\\\";
+        break;
+      case '\n':
+        quoted += "\\n";
+        break;
+      case '\r':
+        quoted += "\\r";
+        break;
+      case '\t':
+        quoted += "\\t";
+        break;
+      default:
+        if (static_cast<unsigned char>(ch) < 0x20) {
+          char escaped[8];
+          snprintf(escaped, sizeof(escaped), "\\u%04x", ch);
+          quoted += escaped;
+        } else {
+          quoted += ch;
+        }
+    }
+  }
+  return quoted + "\"";
+}
+
+bool worker_write(std::string const& data) {
+  size_t sent = 0;
+  while (sent < data.size()) {
+    ssize_t ret = write(worker_fd, data.data() + sent, data.size() - sent);
+    if (ret <= 0) {
+      return false;
+    }
+    sent += ret;
+  }
+  return true;
+}
+
+bool worker_read_line(std::string* line) {
+  line->clear();
+  char ch;
+  while (read(worker_fd, &ch, 1) == 1) {
+    if (ch == '\n') {
+      return true;
+    }
+    line->push_back(ch);
+  }
+  return false;
+}
+
+bool worker_read(size_t len, std::string* data) {
+  data->assign(len, '\0');
+  size_t received = 0;
+  while (received < len) {
+    ssize_t ret = read(worker_fd, &(*data)[received], len - received);
+    if (ret <= 0) {
+      return false;
+    }
+    received += ret;
+  }
+  return true;
+}
+
+// Send one request to the worker. Returns false if the connection broke.
+bool worker_request(std::string const& tool,
+                    std::vector<std::string> const& args, int* status,
+                    std::string* output) {
+  std::string request = tool + " " + std::to_string(args.size()) + "\n";
+  for (const auto& arg : args) {
+    request += std::to_string(arg.size()) + "\n" + arg;
+  }
+  std::string header;
+  if (!worker_write(request) || !worker_read_line(&header)) {
+    return false;
+  }
+  size_t len = 0;
+  if (std::sscanf(header.c_str(), "%d %zu", status, &len) != 2) {
+    return false;
+  }
+  return worker_read(len, output);
+}
+
+void stop_worker() {
+  if (worker_fd < 0) {
+    return;
+  }
+  int status;
+  std::string output;
+  worker_request("shutdown", {}, &status, &output);
+  close(worker_fd);
+  worker_fd = -1;
+}
+
+// Start utils/sage_worker.py and connect to it. The worker imports all
+// Python tools once, later tool calls skip the interpreter start up.
+bool start_worker(std::string const& path_name, int timeout_sec = 300) {
+  worker_socket = "/tmp/sage_worker_" + std::to_string(getpid()) + ".sock";
+  const std::string cmd = "python3 " + path_name + "/utils/sage_worker.py" +
+                          " --socket " + shell_quote(worker_socket) + " &";
+  if (system(cmd.c_str()) != 0) {
+    std::printf("Failed to start SAGE worker\n");
+    return false;
+  }
+  struct sockaddr_un addr;
+  std::memset(&addr, 0, sizeof(addr));
+  addr.sun_family = AF_UNIX;
+  std::strncpy(addr.sun_path, worker_socket.c_str(),
+               sizeof(addr.sun_path) - 1);
+  for (int retry = 0; retry < timeout_sec * 10; retry++) {
+    int fd = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (connect(fd, (struct sockaddr*) &addr, sizeof(addr)) == 0) {
+      worker_fd = fd;
+      std::atexit(stop_worker);
+      return true;
+    }
+    close(fd);
+    usleep(100000);
+  }
+  std::printf("Failed to connect to SAGE worker at %s\n",
+              worker_socket.c_str());
+  return false;
+}
+
+// Run a Python tool of SAGE with the given CLI args, either in the worker or
+// in a new interpreter if no worker is running.
+void run_python_tool(std::string const& tool,
+                     std::vector<std::string> const& args,
+                     bool show_output = true) {
+  if (worker_fd >= 0) {
+    int status = 0;
+    std::string output;
+    if (worker_request(tool, args, &status, &output)) {
+      if (show_output) {
+        std::cout << output << std::flush;
+      }
+      if (status != 0) {
+        std::printf("Failed to execute %s in worker! Exit code: %d\n",
+                    tool.c_str(), status);
+      }
+      return;
+    }
+    std::printf("Lost connection to SAGE worker, running tools directly\n");
+    close(worker_fd);
+    worker_fd = -1;
+  }
+  const PythonTool& python_tool = PYTHON_TOOLS.at(tool);
+  std::string cmd =
+      "cd " + python_tool.dir + "; python3 " + python_tool.script;
+  for (const auto& arg : args) {
+    cmd += " " + shell_quote(arg);
+  }
+  if (!show_output) {
+    cmd += " >/dev/null 2>&1";
+  }
+  std::cout << std::flush;
+  exec_command(cmd);
+}
+
 #endif  // UTILS_H_
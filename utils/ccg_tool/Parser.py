@@ -27,8 +27,12 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-import copy
+import collections
+import collections.abc
+import functools
+import itertools
 import logging
+import time
 
 from spacy.lang.en import English
 from spacy.tokenizer import Tokenizer
@@ -37,7 +41,8 @@ from nltk.ccg import chart, lexicon
 import nltk
 
 from dictionary import STRING2PREDICATE, WORD2NUMBER, RAW_LEXICON, LEXICON_HEAD
-from constant import MAX_PHRASE_LEN, BEAM_WIDTH, SPECIAL_CHARS, REVERSE_SPECIAL_CHARS
+from constant import MAX_PHRASE_LEN, SPECIAL_CHARS, REVERSE_SPECIAL_CHARS
+from lexicon_cache import load_lexicon
 #from ccg_rule_set import CustomRuleSet
 
 
@@ -90,9 +95,16 @@ def preprocess_sent(sentence):
     return new_tokens
 
 
+def reset_variable_names():
+    """restart the numbering of the variables nltk introduces in semantics,
+    e.g. z1, so that parses do not depend on earlier parses of the process."""
+    nltk.sem.logic._counter = nltk.internals.Counter()
+
+
+@functools.lru_cache(maxsize=None)
 def string_to_predicate(s):
     """input: one string (can contain multiple tokens with ;
-    output: a list of predicates."""
+    output: a list of predicates, cached per string (do not modify it)."""
     if s != ',' and s not in REVERSE_SPECIAL_CHARS:
         s = s.lower().strip(',')
     if s.startswith("$"):
@@ -113,28 +125,62 @@ def string_to_predicate(s):
     return []
 
 
-def tokenize(sentence):
+def predicate_lattice(sentence):
     """input: a list of tokens;
-    output: a list of possible tokenization of the sentence;
-    each token can be mapped to multiple predicates"""
-    # log[j] is a list containing temporary results using 0..(j-1) tokens
-    log = {i: [] for i in range(len(sentence) + 1)}
-    log[0] = [[]]
+    output: the DAG of all segmentations of the sentence into predicates.
+    Nodes are token positions 0..len(sentence); incoming[j] lists the edges
+    (i, predicates of tokens i..j-1) by ascending i, from nodes reachable
+    from 0 only. skip[j] is set if no edge reaches j, so that a word not in
+    the dictionary is skipped by continuing the segmentations of j-1."""
+    n = len(sentence)
+    incoming = {j: [] for j in range(n + 1)}
+    skip = [False] * (n + 1)
+    reachable = [True] + [False] * n
     for i, token in enumerate(sentence):
-        if not log[i] and i > 0: # fix to skip words not in the dictionary.
-            log[i] = copy.copy(log[i-1])
+        if not reachable[i] and i > 0:  # fix to skip words not in the dictionary.
+            skip[i] = True
+            reachable[i] = reachable[i - 1]
         for _range in range(1, MAX_PHRASE_LEN + 1):
-            if i + _range > len(sentence):
+            if i + _range > n:
                 break
-            phrase = ' '.join(sentence[i:i + _range])
-            predicates = string_to_predicate(phrase)
-            for temp_result in log[i]:
-                for predicate in predicates:
-                    log[i + _range].append(temp_result + [predicate])
+            predicates = string_to_predicate(' '.join(sentence[i:i + _range]))
+            if reachable[i] and predicates:
+                incoming[i + _range].append((i, predicates))
+                reachable[i + _range] = True
             if token.startswith("\"") or token.startswith("\'"):
                 # avoid --"A" and "B"-- treated as one predicate
                 break
-    return log[len(sentence)]
+    return incoming, skip
+
+
+def iter_tokenize(sentence):
+    """input: a list of tokens;
+    output: a generator of the possible tokenizations of the sentence,
+    in the order of tokenize. Segmentations share the lattice and each
+    one is only expanded into its predicate combinations when reached."""
+    incoming, skip = predicate_lattice(sentence)
+
+    def segmentations(j):
+        # lists of predicate lists covering tokens 0..j-1
+        if j == 0:
+            yield []
+        elif skip[j]:
+            yield from segmentations(j - 1)
+        else:
+            for i, predicates in incoming[j]:
+                for segmentation in segmentations(i):
+                    yield segmentation + [predicates]
+
+    for segmentation in segmentations(len(sentence)):
+        for tokenization in itertools.product(*segmentation):
+            yield list(tokenization)
+
+
+def tokenize(sentence):
+    """input: a list of tokens;
+    output: a list of possible tokenization of the sentence;
+    each token can be mapped to multiple predicates"""
+    return list(iter_tokenize(sentence))
 
 
 def get_word_name(layer, st, idx):
@@ -145,6 +191,19 @@ def get_entry(word_name, category, semantics):
     return "\n\t\t{0} => {1} {{{2}}}".format(word_name, str(category), str(semantics))
 
 
+def copy_lexicon(lex):
+    """copy lex such that entries can be added without changing lex."""
+    entries = collections.defaultdict(list, {word: list(tokens)
+                                             for word, tokens in lex._entries.items()})
+    return lexicon.CCGLexicon(str(lex.start()), lex._primitives, lex._families, entries)
+
+
+def extend_lexicon(lex, other):
+    """add the entries of lexicon other to lexicon lex."""
+    for word, tokens in other._entries.items():
+        lex._entries[word].extend(tokens)
+
+
 def quote_word_lexicon(sentence):
     ret = ""
     for token in sentence:
@@ -154,20 +213,246 @@ def quote_word_lexicon(sentence):
     return ret
 
 
-class Parser(nn.Module):
+def lexical_prior_score(parse, category, semantics):
+    """input: a candidate parse of a span with its category and semantics;
+    output: a score, higher is better.
+    Prefer candidates that can still end in a complete logical form:
+    no 'None' semantics and categories with few arguments left."""
+    sem = str(semantics)
+    categ = str(category)
+    score = -(categ.count('/') + categ.count('\\'))
+    if 'None' in sem:
+        score -= 10
+    if sem.startswith("'@"):
+        score += 1
+    return score
+
+
+def score_key(score):
+    """input: a score function of Parser;
+    output: its name to key cached parses by, None if the name does not
+    identify it, e.g. for lambdas, closures and functools.partial."""
+    name = getattr(score, '__qualname__', None)
+    if name is None or '<' in name:
+        return None
+    return f'{score.__module__}.{name}'
+
+
+def beam_report_summary(report):
+    """input: Parser.beam_report of one parse;
+    output: a one-line summary listing the pruned spans."""
+    kept = sum(span['kept'] for span in report)
+    dropped = sum(span['dropped'] for span in report)
+    pruned = ['({start},{end}): {kept}/{total}'.format(total=span['kept'] + span['dropped'], **span)
+              for span in report if span['dropped']]
+    return 'beam: {} spans, {} kept, {} dropped; pruned spans: {}'.format(
+        len(report), kept, dropped, ', '.join(pruned) if pruned else 'none')
+
+
+def closed_predicate_terms(semantics):
+    """input: the semantics of a candidate parse (nltk Expression);
+    output: the largest predicate applications in it without free variables,
+    e.g. "'@Of'('a',Source)" of "\\x.'@Is'(x,'@Of'('a',Source))", as str.
+    Combining the candidate with others does not change these terms."""
+    terms = []
+    stack = [semantics]
+    while stack:
+        expression = stack.pop()
+        if isinstance(expression, nltk.sem.logic.ApplicationExpression):
+            function, args = expression.uncurry()
+            if isinstance(function, nltk.sem.logic.ConstantExpression) \
+               and '@' in function.variable.name and not expression.free():
+                terms.append(str(expression))
+            else:
+                stack.append(function)
+                stack.extend(args)
+        elif not isinstance(expression, nltk.sem.logic.AbstractVariableExpression):
+            expression.visit(stack.append, lambda _: None)
+    return terms
+
+
+def constituent(token):
+    """input: the lexical token of a constituent of a derivation;
+    output: (name, lexical entry); the entry is None for a span of the chart
+    and 'token|category|{semantics}' for a word of the sentence."""
+    if '$Layer' in token._token:  # a compositional name
+        return token._token, None
+    return token._token, str(token._token) + '|' + str(token._categ) + '|{' + str(token._semantics) + '}'
+
+
+class BackPointers:
+    """Back-pointers from each span of the chart to the two constituents it
+    was first derived from. The lexical entries and the children of a span
+    are resolved from them on demand, instead of copying the token lists of
+    both constituents into every new span."""
+
     def __init__(self):
+        self.pointers = {}
+        self.lexicon_used = _Resolved(self.pointers, self._lexicon_used)
+        self.children = _Resolved(self.pointers, self._children)
+
+    def add(self, word_name, parse):
+        """record the constituents of a derivation of word_name."""
+        self.pointers[word_name] = (constituent(parse[0].label()[0]),
+                                    constituent(parse[1].label()[0]))
+
+    def _lexicon_used(self, word_name):
+        tokens_used = []
+        for name, entry in self.pointers[word_name]:
+            tokens_used += [entry] if entry else self.lexicon_used[name]
+        return tokens_used
+
+    def _children(self, word_name):
+        constituents = self.pointers[word_name]
+        children = [(word_name, tuple(name for name, _ in constituents))]
+        for name, entry in constituents:
+            if entry is None:
+                children += self.children[name]
+        return children
+
+
+class _Resolved(collections.abc.Mapping):
+    """read-only dict view of BackPointers, resolving each key once."""
+
+    def __init__(self, pointers, resolve):
+        self._pointers = pointers
+        self._resolve = resolve
+        self._cache = {}
+
+    def __getitem__(self, word_name):
+        if word_name not in self._cache:
+            if word_name not in self._pointers:
+                raise KeyError(word_name)
+            self._cache[word_name] = self._resolve(word_name)
+        return self._cache[word_name]
+
+    def __iter__(self):
+        return iter(self._pointers)
+
+    def __len__(self):
+        return len(self._pointers)
+
+
+class BudgetExhausted(Exception):
+    """A parse ran out of its ParseBudget.
+    limit: 'seconds', 'cells' or 'derivations'; used: amount spent;
+    span: (start, end) of the span being parsed."""
+
+    def __init__(self, limit, used, span):
+        super().__init__('{} budget exhausted ({}) at span {}'.format(limit, used, span))
+        self.limit = limit
+        self.used = used
+        self.span = span
+
+
+class ParseBudget:
+    """Limits of a single Parser.parse call, None for no limit.
+    seconds: wall time;
+    cells: candidates kept in the chart over all spans;
+    derivations: distinct derivations of a single span."""
+
+    def __init__(self, seconds=None, cells=None, derivations=None):
+        self.seconds = seconds
+        self.cells = cells
+        self.derivations = derivations
+        self.deadline = None
+        self.cells_used = 0
+
+    def start(self):
+        """reset the budget at the start of a parse."""
+        self.deadline = time.monotonic() + self.seconds if self.seconds else None
+        self.cells_used = 0
+
+    def check_time(self, span):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExhausted('seconds', self.seconds, span)
+
+    def check_derivations(self, count, span):
+        if self.derivations is not None and count > self.derivations:
+            raise BudgetExhausted('derivations', count, span)
+
+    def add_cells(self, count, span):
+        self.cells_used += count
+        if self.cells is not None and self.cells_used > self.cells:
+            raise BudgetExhausted('cells', self.cells_used, span)
+
+
+class Parser(nn.Module):
+    def __init__(self, incremental=True, beam_width=None, score=None, budget=None,
+                 cache=None, span_filter=None):
+        """
+        :param incremental: keep one lexicon per sentence and add the entries
+                of each layer to it, instead of re-parsing the whole lexicon
+                string every layer. Both modes give the same parses.
+        :param beam_width: max. number of candidates kept per span, e.g.
+                constant.BEAM_WIDTH. None or 0 keeps all candidates (exhaustive parsing).
+        :param score: function (parse, category, semantics) -> float ranking
+                the candidates of a span, defaults to lexical_prior_score.
+        :param budget: ParseBudget of every parse, None for no limits.
+        :param cache: ParseCache of complete parses, None to always parse.
+                Cached results only keep the lexicon and children of the
+                final parses. Parses are not cached if score has no
+                stable name, see score_key.
+        :param span_filter: function (terms) -> bool called with the
+                closed_predicate_terms of each new candidate of a span;
+                candidates it rejects are dropped before they combine into
+                larger spans, e.g. check_logic_forms.SpanFilter. Its repr is
+                part of the cache key.
+        """
         super(Parser, self).__init__()
         self.raw_lexicon = RAW_LEXICON
-        self.beam_width = BEAM_WIDTH
-
-    def parse(self, sentence):
+        self.beam_width = beam_width
+        self.score = score if score is not None else lexical_prior_score
+        self.incremental = incremental
+        self.budget = budget
+        self.cache = cache
+        self.span_filter = span_filter
+        # kept and dropped candidates per span of the last parse
+        self.beam_report = []
+        # candidates of the last parse dropped by span_filter
+        self.filtered = 0
+
+    def parse(self, sentence, budget=None):
         """
         :param sentence: a list of tokens in one sentence.
                 e.g. ['"may_be"', '$Is', '$Between', '$ArgX', '$And', '$ArgY']
-        :return: a list of successful parses.
+        :param budget: ParseBudget of this parse, defaults to self.budget.
+        :return: a list of successful parses. If the budget runs out, the
+                complete parses found so far and the BudgetExhausted error.
         """
-        beam_lexicon = copy.deepcopy(self.raw_lexicon) + quote_word_lexicon(sentence)
-        lexicon_used, children = {}, {}
+        budget = budget if budget is not None else self.budget
+        if budget is None:
+            budget = ParseBudget()
+        self.beam_report = []
+        self.filtered = 0
+        score = score_key(self.score)
+        if self.cache is None or score is None:
+            return self._parse(sentence, budget)
+
+        key = self.cache.key(sentence, self.raw_lexicon, self.beam_width,
+                             score, budget.cells, budget.derivations,
+                             repr(self.span_filter))
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        result = self._parse(sentence, budget)
+        ret, names, lexicon_used, children, exception = result
+        # a parse cut short by its budget or an error is not final
+        if exception is None:
+            self.cache.put(key, (ret, names,
+                                 {name: lexicon_used[name] for name in names
+                                  if name in lexicon_used},
+                                 {name: children[name] for name in names
+                                  if name in children}, None))
+        return result
+
+    def _parse(self, sentence, budget):
+        budget.start()
+        quote_lexicon = quote_word_lexicon(sentence)
+        beam_lexicon = self.raw_lexicon + quote_lexicon
+        back_pointers = BackPointers()
+        # intern equal categories of all spans to one object
+        categories = {}
 
         # the first index of forms is layer
         # the second index of forms is starting index
@@ -177,19 +462,24 @@ class Parser(nn.Module):
         ret = []
 
         try:
+            if self.incremental:
+                # the base lexicon is parsed once per process
+                lex = copy_lexicon(load_lexicon(self.raw_lexicon))
+                extend_lexicon(lex, lexicon.fromstring(LEXICON_HEAD + quote_lexicon, True))
             # Width of tokens to be parsed. Start with width 1 and stack to len(sentence)
             for layer in range(1, len(sentence)):
                 layer_form = []
 
                 # update the lexicon from previous layers
-                lex = lexicon.fromstring(beam_lexicon, True)
+                if not self.incremental:
+                    lex = lexicon.fromstring(beam_lexicon, True)
                 #parser = chart.CCGChartParser(lex, CustomRuleSet)
                 parser = chart.CCGChartParser(lex, chart.DefaultRuleSet)
 
                 # parse the span (st, st+layer)
                 for st in range(0, len(sentence) - layer):
                     form = []
-                    memory = []  # keep a memory and remove redundant parses
+                    memory = set()  # keep a memory and remove redundant parses
                     word_index = 0
                     ed = st + layer
                     # try to combine (st, split), (split+1, ed) into (st, ed)
@@ -199,29 +489,43 @@ class Parser(nn.Module):
                         words_R = all_forms[ed-split-1][split+1]
                         for word_L in words_L:
                             for word_R in words_R:
+                                budget.check_time((st, ed))
                                 # try to combine word_L and word_R
                                 try:
                                     for parse in parser.parse([word_L, word_R]):
                                         token, _ = parse.label()
-                                        category, semantics = token.categ(), token.semantics()
-                                        memory_key = str(category) + '_' + str(semantics)
+                                        category = categories.setdefault(token.categ(), token.categ())
+                                        semantics = token.semantics()
+                                        memory_key = (category, str(semantics))
                                         if memory_key not in memory:
-                                            memory.append(memory_key)
+                                            memory.add(memory_key)
+                                            if not self.keep_candidate(semantics):
+                                                self.filtered += 1
+                                                continue
                                             word_index += 1
                                             form.append((parse, category, semantics, word_index))
                                             word_name = get_word_name(layer, st, word_index)
-                                            self.update_logs(parse, word_name, lexicon_used, children)
+                                            back_pointers.add(word_name, parse)
+                                            budget.check_derivations(len(form), (st, ed))
                                 except (AssertionError, SyntaxError) as e:
                                     logger.info('Error when parsing %s and %s', word_L, word_R)
                                     logger.info('Error information: %s', e.args)
+                    form = self.prune(form, st, ed)
+                    budget.add_cells(len(form), (st, ed))
                     to_add = []
                     for item in form:
                         parse, category, semantics, word_index = item
                         word_name = get_word_name(layer, st, word_index)
                         to_add.append(word_name)
                         entry = get_entry(word_name, category, semantics)
-                        if self.valid_entry(LEXICON_HEAD + entry):
-                            beam_lexicon += entry
+                        entry_lex = self.parse_entry(LEXICON_HEAD + entry)
+                        if entry_lex is not None:
+                            if self.incremental:
+                                # spans of this layer are only combined in
+                                # later layers, adding them right away is safe
+                                extend_lexicon(lex, entry_lex)
+                            else:
+                                beam_lexicon += entry
                         # if this is the last layer (covering the whole sentence)
                         # add this to output
                         if layer == len(sentence) - 1:
@@ -230,36 +534,47 @@ class Parser(nn.Module):
                 all_forms.append(layer_form)
             # filter incomplete parses
             ret = list(filter(lambda x: x.startswith("'@"), ret))
+        except BudgetExhausted as e:
+            # derivations of the whole sentence found so far are complete parses
+            partial = []
+            if layer == len(sentence) - 1:
+                partial = [(str(semantics), get_word_name(layer, st, word_index))
+                           for _, _, semantics, word_index in form]
+                partial = [(parse, name) for parse, name in partial if parse.startswith("'@")]
+            ret = [parse for parse, _ in partial]
+            names = [name for _, name in partial]
+            return ret, names, back_pointers.lexicon_used, back_pointers.children, e
         except Exception as e:
             return [], [], {}, {}, e
         # ret = sorted(ret, key=lambda x: self.forward_single(x), reverse=True)
-        return ret, all_forms[-1][0], lexicon_used, children, None
-
-    def update_logs(self, parse, word_name, lexicon_dict, children_dict):
-        word_0_lex = parse[0].label()[0]
-        word_1_lex = parse[1].label()[0]
-        tokens_used = []
-        children0 = [(word_name, (word_0_lex._token, word_1_lex._token))]
-        if '$Layer' in word_0_lex._token:  # a compositional name
-            tokens_used += lexicon_dict[word_0_lex._token]
-            children0 += children_dict[word_0_lex._token]
-        else:
-            new_token = str(word_0_lex._token) + '|' + str(word_0_lex._categ) + '|{' + str(word_0_lex._semantics) + '}'
-            tokens_used += [new_token]
-        if '$Layer' in word_1_lex._token:  # a compositional name
-            tokens_used += lexicon_dict[word_1_lex._token]
-            children0 += children_dict[word_1_lex._token]
-        else:
-            new_token = str(word_1_lex._token) + '|' + str(word_1_lex._categ) + '|{' + str(word_1_lex._semantics) + '}'
-            tokens_used += [new_token]
-        lexicon_dict[word_name] = tokens_used
-        children_dict[word_name] = children0
+        return ret, all_forms[-1][0], back_pointers.lexicon_used, back_pointers.children, None
+
+    def prune(self, form, st, ed):
+        """keep the beam_width best candidates of the span (st, ed)
+        in their original order and log the span in beam_report."""
+        kept = form
+        if self.beam_width and len(form) > self.beam_width:
+            ranked = sorted(form, key=lambda item: self.score(*item[:3]), reverse=True)
+            kept_indices = {item[3] for item in ranked[:self.beam_width]}
+            kept = [item for item in form if item[3] in kept_indices]
+        self.beam_report.append({'start': st, 'end': ed,
+                                 'kept': len(kept), 'dropped': len(form) - len(kept)})
+        return kept
+
+    def keep_candidate(self, semantics):
+        """check the closed predicate terms of a candidate with span_filter."""
+        if self.span_filter is None:
+            return True
+        terms = closed_predicate_terms(semantics)
+        return not terms or self.span_filter(terms)
+
+    def parse_entry(self, entry):
+        """parse entry to a lexicon; return None if entry is invalid."""
+        try:
+            return lexicon.fromstring(entry, True)
+        except (AttributeError, nltk.sem.logic.LogicalExpressionException):
+            return None
 
     def valid_entry(self, entry):
         """check if entry is valid."""
-        valid = True
-        try:
-            _temp_lex = lexicon.fromstring(entry, True)
-        except (AttributeError, nltk.sem.logic.LogicalExpressionException):
-            valid = False
-        return valid
+        return self.parse_entry(entry) is not None
@@ -29,6 +29,7 @@
 
 BEAM_WIDTH = 100
 MAX_PHRASE_LEN = 4
+PARSE_CACHE_SIZE = 256 * 2**20  # bytes
 
 COMMA_INDEX = {',': 0, '-LRB-': 1, '-RRB-': 2, '.': 3, '-': 4}
 SPECIAL_CHARS = {'-': '_', ' ': '_', '(': '[LEFT_BRACKET]', ')': '[RIGHT_BRACKET]', '.': '[DOT]', ',': '[COMMA]', '+':'and'}
@@ -0,0 +1,87 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Compile CCG lexicons once and cache them on disk """
+
+import functools
+import hashlib
+import os
+import pathlib
+import pickle
+import tempfile
+
+import nltk
+from nltk.ccg import lexicon
+
+
+CACHE_DIR = pathlib.Path(__file__).parent.absolute() / 'lexicon_cache'
+CACHE_PREFIX = 'lexicon-'
+
+
+def lexicon_key(lex_str):
+    """hash of the lexicon string and the NLTK version pickles depend on."""
+    content = f'{nltk.__version__}\n{lex_str}'.encode()
+    return hashlib.sha1(content).hexdigest()
+
+
+def read_cache(path):
+    try:
+        with open(path, 'rb') as cache_file:
+            return pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def write_cache(path, lex):
+    """write lex to path and remove caches of other lexicon versions."""
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        for stale in CACHE_DIR.glob(f'{CACHE_PREFIX}*.pickle'):
+            stale.unlink()
+        # write to a temporary file first so readers never see a partial cache
+        with tempfile.NamedTemporaryFile('wb', dir=CACHE_DIR, delete=False) as tmp:
+            pickle.dump(lex, tmp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp.name, path)
+    except OSError:
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def load_lexicon(lex_str):
+    """input: a lexicon string, e.g. RAW_LEXICON;
+    output: the parsed lexicon, shared by all callers of this process.
+    The lexicon is read from the on-disk cache if lex_str is unchanged,
+    otherwise it is parsed and the cache is rebuilt.
+    Callers must not modify the returned lexicon, see Parser.copy_lexicon."""
+    path = CACHE_DIR / f'{CACHE_PREFIX}{lexicon_key(lex_str)}.pickle'
+    lex = read_cache(path)
+    if lex is None:
+        lex = lexicon.fromstring(lex_str, True)
+        write_cache(path, lex)
+    return lex
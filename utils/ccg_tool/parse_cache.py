@@ -0,0 +1,191 @@
+#! /usr/bin/env python3
+
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Content-addressed on-disk cache of parse results """
+
+import argparse
+import functools
+import hashlib
+import os
+import pathlib
+import pickle
+import shutil
+import tempfile
+
+import nltk
+
+from constant import MAX_PHRASE_LEN, PARSE_CACHE_SIZE
+from dictionary import STRING2PREDICATE, WORD2NUMBER, RAW_LEXICON
+
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+CACHE_DIR = CUR_DIR / 'parse_cache'
+
+# bytes of each cache dir as counted by this process: one scan when it first
+# writes to the dir, then the sizes of the entries it writes
+CACHE_SIZES = {}
+# eviction shrinks the cache to this share of max_size, so that the cache is
+# scanned once per that many bytes written rather than on every put
+EVICT_TO = 0.75
+
+
+def source_key(source_dir):
+    """hash of the python sources of source_dir, results computed by them
+    are stale once any of them changes."""
+    sources = hashlib.sha1()
+    for path in sorted(pathlib.Path(source_dir).glob('*.py')):
+        sources.update(path.name.encode())
+        sources.update(path.read_bytes())
+    return sources.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def grammar_key():
+    """hash of everything a parse depends on besides the sentence:
+    lexicon, dictionaries, the parser sources and the NLTK version."""
+    content = repr((nltk.__version__, MAX_PHRASE_LEN, RAW_LEXICON,
+                    sorted(STRING2PREDICATE.items()), sorted(WORD2NUMBER.items()),
+                    source_key(CUR_DIR)))
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class ParseCache:
+    """Cache of results in CACHE_DIR/<namespace>, one pickle per key.
+    Least recently used entries of all namespaces are evicted once the
+    cache grows beyond max_size bytes. Entries other processes write are
+    only counted at the next eviction."""
+
+    def __init__(self, namespace, cache_dir=CACHE_DIR, max_size=PARSE_CACHE_SIZE):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.dir = self.cache_dir / namespace
+        self.max_size = max_size
+        self.grammar = grammar_key()
+
+    def key(self, *parts):
+        """input: the sentence and the settings a result depends on;
+        output: the key of the result, including the grammar."""
+        content = repr((self.grammar,) + parts)
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def get(self, key):
+        """output: the cached result, None if there is none."""
+        path = self.dir / f'{key}.pickle'
+        try:
+            with open(path, 'rb') as cache_file:
+                result = pickle.load(cache_file)
+            os.utime(path)  # mark as recently used
+            return result
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def put(self, key, result):
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first so readers never see a partial entry
+            with tempfile.NamedTemporaryFile('wb', dir=self.dir, delete=False) as tmp:
+                pickle.dump(result, tmp, pickle.HIGHEST_PROTOCOL)
+                entry_size = tmp.tell()
+            os.replace(tmp.name, self.dir / f'{key}.pickle')
+        except (OSError, pickle.PicklingError):
+            return
+        if self.cache_dir in CACHE_SIZES:
+            CACHE_SIZES[self.cache_dir] += entry_size
+        else:
+            CACHE_SIZES[self.cache_dir] = cache_size(self.cache_dir)
+        if CACHE_SIZES[self.cache_dir] > self.max_size:
+            CACHE_SIZES[self.cache_dir] = evict(self.cache_dir,
+                                                int(self.max_size * EVICT_TO))
+
+
+def cache_entries(cache_dir=CACHE_DIR):
+    """output: (mtime, size, path) of all entries, oldest first."""
+    entries = []
+    for path in pathlib.Path(cache_dir).glob('*/*.pickle'):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return sorted(entries)
+
+
+def cache_size(cache_dir=CACHE_DIR):
+    """output: bytes of all entries."""
+    return sum(entry_size for _, entry_size, _ in cache_entries(cache_dir))
+
+
+def evict(cache_dir=CACHE_DIR, max_size=PARSE_CACHE_SIZE):
+    """remove least recently used entries until the cache fits max_size bytes.
+    output: bytes of the remaining entries."""
+    entries = cache_entries(cache_dir)
+    size = sum(entry_size for _, entry_size, _ in entries)
+    for _, entry_size, path in entries:
+        if size <= max_size:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        size -= entry_size
+    return size
+
+
+def clear(cache_dir=CACHE_DIR):
+    """remove all cached results."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    """ Show, shrink or clear the parse cache. """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--clear', '-c',
+        help='Remove all cached parse results',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--max_size', '-s',
+        help=f'Evict entries until the cache fits this many bytes (default: {PARSE_CACHE_SIZE})',
+        type=int,
+    )
+    args = parser.parse_args(argv)
+
+    if args.clear:
+        clear()
+    elif args.max_size is not None:
+        evict(max_size=args.max_size)
+    entries = cache_entries()
+    size = sum(entry_size for _, entry_size, _ in entries)
+    print(f'{CACHE_DIR}: {len(entries)} entries, {size} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -30,14 +30,26 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
+import contextlib
+import csv
+import functools
+import io
+import json
+import multiprocessing
 import pathlib
+import signal
 import sys
+import traceback
 
 from tabulate import tabulate
 from termcolor import colored
 
-from Parser import Parser, preprocess_sent, tokenize, string_to_predicate, is_quote_word
+from Parser import Parser, preprocess_sent, iter_tokenize, string_to_predicate, is_quote_word
+from Parser import beam_report_summary, BudgetExhausted, ParseBudget
+from constant import BEAM_WIDTH
 from dictionary import RAW_LEXICON
+from lexicon_cache import load_lexicon
+from parse_cache import ParseCache, source_key
 
 
 CUR_DIR = pathlib.Path(__file__).parent.absolute()
@@ -49,32 +61,134 @@ import check_logic_forms as clf
 MDS_DIR = CUR_DIR / '..' / 'metadata_system'
 sys.path.insert(0, str(MDS_DIR))
 import sentence_record
+from db_session import SESSION
 
 
 
-def rfc_lex_parse(cli_args: argparse.Namespace):
+def make_parser(cli_args: argparse.Namespace) -> Parser:
+    """ Build a parser with the beam, budget and span filter of the CLI args """
+    budget = ParseBudget(seconds=cli_args.max_seconds, cells=cli_args.max_cells,
+                         derivations=cli_args.max_derivations)
+    cache = None if cli_args.no_cache else ParseCache('parse')
+    span_filter = clf.SpanFilter(cli_args.checks) if cli_args.span_filter else None
+    return Parser(beam_width=cli_args.beam_width, budget=budget, cache=cache,
+                  span_filter=span_filter)
+
+
+def rfc_lex_parse(cli_args: argparse.Namespace, parser: Parser = None,
+                  sentence_db: sentence_record.SentenceDB = None):
     """ All-in-one functon to parse and process a sentence
 
     Parameter:
     cli_args (argparse.Namespace): parsed CLI args
+    parser (Parser): parser reused across sentences, a new one if None
+    sentence_db (SentenceDB): open metadata DB reused across sentences
+    """
+    lf_graphs = lex_parse_logical_forms(cli_args, parser)
+    if lf_graphs is None:
+        return '', None
+    return store_logical_forms(cli_args, lf_graphs, sentence_db)
+
+
+@functools.lru_cache(maxsize=None)
+def checker_key() -> str:
+    """ Hash of the logic form checker sources the checked logical forms depend on """
+    return source_key(LFC_DIR)
+
+
+class TeeOutput:
+    """ Write to a stream and keep a copy of everything written """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.copy = io.StringIO()
+
+    def write(self, text):
+        self.copy.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return self.stream.isatty()
+
+
+def lex_parse_logical_forms(cli_args: argparse.Namespace, parser: Parser = None):
+    """ Parse a sentence and check its logical forms, without any file/db IO
+
+    Unless --no_cache is set, the logical forms and the output of a sentence
+    are cached on disk, keyed by the sentence, the grammar, the checker and
+    the CLI args affecting them; a cached sentence is not parsed again.
+
+    Parameter:
+    cli_args (argparse.Namespace): parsed CLI args
+    parser (Parser): parser reused across sentences, a new one if None
+
+    Returns:
+    list of dicts of id (int) and a graph (LogicalFormGraph), or None if
+    the sentence has no parse
+    """
+    if cli_args.no_cache:
+        return parse_logical_forms(cli_args, parser)[0]
+
+    cache = ParseCache('logical_forms')
+    key = cache.key(preprocess_sent(cli_args.str), checker_key(), cli_args.check,
+                    cli_args.checks, cli_args.debug, cli_args.beam_width,
+                    cli_args.beam_report, cli_args.max_cells, cli_args.max_derivations,
+                    cli_args.span_filter)
+    cached = cache.get(key)
+    if cached is not None:
+        output, lf_graphs = cached
+        print(output, end='')
+        return lf_graphs
+    output = TeeOutput(sys.stdout)
+    with contextlib.redirect_stdout(output):
+        lf_graphs, complete = parse_logical_forms(cli_args, parser)
+    if complete:
+        cache.put(key, (output.copy.getvalue(), lf_graphs))
+    return lf_graphs
+
+
+def parse_logical_forms(cli_args: argparse.Namespace, parser: Parser = None) -> tuple:
+    """ Parse a sentence and check its logical forms
+
+    Parameter:
+    cli_args (argparse.Namespace): parsed CLI args
+    parser (Parser): parser reused across sentences, a new one if None
+
+    Returns:
+    logical form graphs as lex_parse_logical_forms and whether all parses
+    of the sentence completed (bool)
     """
     sent = cli_args.str
     new_sent = preprocess_sent(sent)
-    sent_tokenized = tokenize(new_sent)
+    sent_tokenized = iter_tokenize(new_sent)
     if cli_args.debug:
+        sent_tokenized = list(sent_tokenized)
         print(sent)
         print(new_sent)
         print(sent_tokenized)
 
-    parser = Parser()
+    if parser is None:
+        parser = make_parser(cli_args)
     results = []
     denylist = ('\\', 'None')
+    complete = True
 
     for tokenized in sent_tokenized:
         parses, names, lex_dict, child_dict, bp_exception = parser.parse(tokenized)
+        complete = complete and bp_exception is None
         if cli_args.debug:
             print(parses)
-        if bp_exception:
+        if cli_args.beam_report:
+            print(beam_report_summary(parser.beam_report))
+        if parser.filtered:
+            print(f'Span filter dropped {parser.filtered} candidates')
+        if isinstance(bp_exception, BudgetExhausted):
+            print(colored(f'Parse budget exhausted, {len(parses)} partial parses: '
+                          f'{bp_exception}', 'red'))
+        elif bp_exception:
             print(f'beam_parse: {bp_exception.__class__}: {bp_exception}')
         for parse, name in zip(parses, names):
             if not any(s in parse for s in denylist):
@@ -88,7 +202,7 @@ def rfc_lex_parse(cli_args: argparse.Namespace):
 
     num_results = len(results)
     if num_results == 0:
-        return '', None
+        return None, complete
     ir_results = list(set(results))
     print(f"IR numbers: {len(ir_results)}")
     if cli_args.debug:
@@ -105,7 +219,19 @@ def rfc_lex_parse(cli_args: argparse.Namespace):
 
     print(colored('Final logical forms:', 'green'))
     clf.print_all(lf_graphs)
+    return lf_graphs, complete
+
+
+def store_logical_forms(cli_args: argparse.Namespace, lf_graphs: list,
+                        sentence_db: sentence_record.SentenceDB = None):
+    """ Export and record the logical forms of a parsed sentence
 
+    Parameter:
+    cli_args (argparse.Namespace): parsed CLI args
+    lf_graphs (list): dicts of id (int) and a graph (LogicalFormGraph)
+    sentence_db (SentenceDB): open metadata DB reused across sentences
+    """
+    sent = cli_args.str
     # file/db IO
     if cli_args.wrtdot:
         clf.export_all(lf_graphs, out_dir='/tmp', out_format='pdf')
@@ -113,21 +239,25 @@ def rfc_lex_parse(cli_args: argparse.Namespace):
         if cli_args.debug:
             print('Recording logical forms to metada system')
         record_logical_form_graphs(sent, lf_graphs, cli_args.env,
-                                   cli_args.msg_type, cli_args.field_name)
+                                   cli_args.msg_type, cli_args.field_name,
+                                   sentence_db)
 
     try:
         lf = lf_graphs[0]['graph'].logic_form
     except IndexError:
         lf = ''
-    return lf, retrieve_sentence_and_id(sent)
+    return lf, retrieve_sentence_and_id(sent, sentence_db)
 
 
-def retrieve_sentence_and_id(label_sent: str) -> tuple:
+def retrieve_sentence_and_id(label_sent: str,
+                             sentence_db: sentence_record.SentenceDB = None) -> tuple:
     """ Retrieve sentence and id by labelled sentence
     Parameter:
     label_sent (str): labelled sentence
+    sentence_db (SentenceDB): open metadata DB, the one of SESSION if None
     """
-    sentence_db = sentence_record.SentenceDB()
+    if sentence_db is None:
+        sentence_db = SESSION.get(sentence_record.SentenceDB)
     mapping = sentence_db.get_mapping_by_label(label_sent)
     try:
         sentence = mapping[0][0]
@@ -140,36 +270,208 @@ def retrieve_sentence_and_id(label_sent: str) -> tuple:
 
 
 def record_logical_form_graphs(label_sent: str, logical_form_graphs: list, env: str,
-                               msg_type: str, field: str):
+                               msg_type: str, field: str,
+                               sentence_db: sentence_record.SentenceDB = None):
     """ Write logical forms and logical form graphs to metadata system.
 
     Parameter:
     label_sent (str): labelled sentence
     logical_form_graphs (list): dicts of id (int) and a graph (LogicalFormGraph)
+    sentence_db (SentenceDB): open metadata DB, the one of SESSION if None
 
     """
     label_sent = label_sent.lstrip(' ')
-    sentence_db = sentence_record.SentenceDB()
-    for lf_graph in logical_form_graphs:
-        mapping = sentence_db.get_mapping_by_label(label_sent)
-        try:
-            sentence = mapping[0][0].lstrip(' ')
-            sentence_id = mapping[0][1]
-            msg = msg_type
-            lf = lf_graph['graph'].logic_form
-            sent_record = sentence_record.SentenceRecord(sentence=sentence,
-                                                         sent_id=sentence_id,
-                                                         msg_type=msg,
-                                                         field=field,
-                                                         label=label_sent,
-                                                         lf=lf,
-                                                         env=env)
-            sentence_db.replace_value(sent_record)
-            sentence_db.update_lf_graph(sent_record, lf_graph['graph'].graph)
-        except IndexError:
-            txt = (f'Error in recording logical form: '
-                   f'no entry for label "{label_sent}".')
-            print(txt)
+    if sentence_db is None:
+        sentence_db = SESSION.get(sentence_record.SentenceDB)
+    mapping = sentence_db.get_mapping_by_label(label_sent)
+    with SESSION.transaction():
+        for lf_graph in logical_form_graphs:
+            try:
+                sentence = mapping[0][0].lstrip(' ')
+                sentence_id = mapping[0][1]
+                msg = msg_type
+                lf = lf_graph['graph'].logic_form
+                sent_record = sentence_record.SentenceRecord(sentence=sentence,
+                                                             sent_id=sentence_id,
+                                                             msg_type=msg,
+                                                             field=field,
+                                                             label=label_sent,
+                                                             lf=lf,
+                                                             env=env)
+                sentence_db.replace_value(sent_record)
+                sentence_db.update_lf_nodes(lf)
+            except IndexError:
+                txt = (f'Error in recording logical form: '
+                       f'no entry for label "{label_sent}".')
+                print(txt)
+
+
+def read_batch(path: str, cli_args: argparse.Namespace) -> list:
+    """ Read labelled sentences of a batch file
+
+    A .jsonl file holds one object per line with the keys sentence and
+    optionally msg_type, field and env. Any other file is read as TSV with
+    the columns sentence, msg_type, field and env, trailing ones optional.
+    Missing values default to the CLI args.
+
+    Parameter:
+    path (str): batch file
+    cli_args (argparse.Namespace): parsed CLI args
+
+    Returns:
+    list of CLI args (argparse.Namespace), one per sentence
+    """
+    columns = ('sentence', 'msg_type', 'field', 'env')
+    with open(path) as batch_file:
+        if path.endswith('.jsonl'):
+            records = [json.loads(line) for line in batch_file if line.strip()]
+        else:
+            records = [dict(zip(columns, row))
+                       for row in csv.reader(batch_file, delimiter='\t') if row]
+    batch = []
+    for record in records:
+        args = argparse.Namespace(**vars(cli_args))
+        args.str = record['sentence']
+        args.msg_type = record.get('msg_type', cli_args.msg_type)
+        args.field_name = record.get('field', cli_args.field_name)
+        args.env = record.get('env', cli_args.env)
+        batch.append(args)
+    return batch
+
+
+class SentenceTimeout(BaseException):
+    """ Parsing a sentence took longer than --timeout.
+
+    Derived from BaseException so that the catch-all handler of
+    Parser.parse does not turn it into an empty parse.
+    """
+
+
+@contextlib.contextmanager
+def sentence_timeout(seconds: float):
+    """ Raise SentenceTimeout if the block runs longer than seconds
+
+    Parameter:
+    seconds (float): time limit, no limit if 0
+    """
+    if not seconds:
+        yield
+        return
+
+    def expire(signum, frame):
+        raise SentenceTimeout(f'no result after {seconds}s')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def parse_batch_sentence(args: argparse.Namespace, parser: Parser,
+                         timeout: float) -> tuple:
+    """ Parse a sentence of a batch, reporting instead of raising errors
+
+    Parameter:
+    args (argparse.Namespace): CLI args of the sentence
+    parser (Parser): parser reused across sentences
+    timeout (float): time limit in seconds, no limit if 0
+
+    Returns:
+    logical form graphs (list or None) and error (str or None)
+    """
+    try:
+        with sentence_timeout(timeout):
+            return lex_parse_logical_forms(args, parser), None
+    except (Exception, SentenceTimeout) as e:
+        traceback.print_exc()
+        return None, f'{e.__class__.__name__}: {e}'
+
+
+# parser of a pool worker, built once by init_batch_worker
+worker_parser = None
+
+
+def init_batch_worker(cli_args: argparse.Namespace):
+    """ Build the parser of a pool worker and load the lexicon once. """
+    global worker_parser
+    worker_parser = make_parser(cli_args)
+    load_lexicon(RAW_LEXICON)
+
+
+def parse_in_worker(args: argparse.Namespace, timeout: float) -> tuple:
+    """ parse_batch_sentence() in a pool worker, also returning its output. """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        lf_graphs, error = parse_batch_sentence(args, worker_parser, timeout)
+    return lf_graphs, error, output.getvalue()
+
+
+def parse_batch(batch: list, cli_args: argparse.Namespace):
+    """ Parse the sentences of a batch in this process or on a process pool
+
+    The pool gets the sentences longest first, since parse time grows
+    sharply with the number of tokens. Results and the output of each
+    sentence are still yielded in input order, as soon as they are ready.
+
+    Parameter:
+    batch (list): CLI args (argparse.Namespace), one per sentence
+    cli_args (argparse.Namespace): parsed CLI args
+
+    Yields:
+    CLI args of the sentence, logical form graphs (list or None) and
+    error (str or None)
+    """
+    if cli_args.jobs <= 1:
+        parser = make_parser(cli_args)
+        for args in batch:
+            yield (args, *parse_batch_sentence(args, parser, cli_args.timeout))
+        return
+
+    order = sorted(range(len(batch)), key=lambda i: len(batch[i].str.split()),
+                   reverse=True)
+    sys.stdout.flush()
+    with multiprocessing.Pool(cli_args.jobs, init_batch_worker,
+                              (cli_args,)) as pool:
+        pending = {i: pool.apply_async(parse_in_worker, (batch[i], cli_args.timeout))
+                   for i in order}
+        for i, args in enumerate(batch):
+            lf_graphs, error, output = pending.pop(i).get()
+            print(output, end='', flush=True)
+            yield args, lf_graphs, error
+
+
+def rfc_lex_parse_batch(cli_args: argparse.Namespace):
+    """ Parse all sentences of a batch file
+
+    Sentences are parsed by one shared parser, or by a pool of --jobs
+    processes. The metadata DB connection is shared by all sentences and
+    all metadata writes are committed in a single transaction. Each
+    result is written as a JSON line with the fields of CCGresult.txt and
+    the error of a sentence that failed or timed out, if any.
+
+    Parameter:
+    cli_args (argparse.Namespace): parsed CLI args
+    """
+    batch = read_batch(cli_args.batch, cli_args)
+    sentence_db = SESSION.get(sentence_record.SentenceDB)
+    with SESSION.transaction(), open(cli_args.batch_output, 'w') as out_file:
+        for args, lf_graphs, error in parse_batch(batch, cli_args):
+            parsed, recv = '', None
+            if lf_graphs is not None:
+                try:
+                    parsed, recv = store_logical_forms(args, lf_graphs, sentence_db)
+                except Exception as e:
+                    traceback.print_exc()
+                    error = f'{e.__class__.__name__}: {e}'
+            sentence, sentence_id = recv if recv is not None else ('', None)
+            result = {'label': args.str, 'lf': parsed,
+                      'sentence': sentence, 'sentence_id': sentence_id,
+                      'error': error}
+            out_file.write(json.dumps(result) + '\n')
+            out_file.flush()
 
 
 def display_debug_information(cli_args: argparse.Namespace):
@@ -213,7 +515,8 @@ def display_debug_information(cli_args: argparse.Namespace):
     print(tabulate(result, headers=["Token", "Predicate", "Lexicon"]))
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """ Parse CLI args and run the CCG parser on a labelled sentence. """
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
         '--str', '-s',
@@ -273,15 +576,79 @@ if __name__ == "__main__":
         help='field to aid register to MDS',
         default=''
     )
+    argparser.add_argument(
+        '--beam_width', '-bw',
+        help=('Keep at most this many candidates per span '
+              f'(default if set without value: {BEAM_WIDTH}). '
+              'All candidates are kept if not set'),
+        type=int, nargs='?', const=BEAM_WIDTH, default=None,
+    )
+    argparser.add_argument(
+        '--beam_report', '-br',
+        help='Print kept and dropped candidates of the beam per parse',
+        action="store_true",
+    )
+    argparser.add_argument(
+        '--span_filter', '-sf',
+        help=('Drop partial parses with a complete predicate term failing '
+              'the rules, order or sequence check of --checks'),
+        action="store_true",
+    )
+    argparser.add_argument(
+        '--max_seconds', '-ms',
+        help='Stop parsing a sentence after this many seconds, keeping partial parses',
+        type=float,
+    )
+    argparser.add_argument(
+        '--max_cells', '-mc',
+        help='Stop parsing a sentence after adding this many candidates to the chart',
+        type=int,
+    )
+    argparser.add_argument(
+        '--max_derivations', '-md',
+        help='Stop parsing a sentence if a span has more derivations than this',
+        type=int,
+    )
+    argparser.add_argument(
+        '--no_cache', '-nc',
+        help='Parse again instead of using cached parses and logical forms',
+        action="store_true",
+    )
+    argparser.add_argument(
+        '--batch', '-b',
+        help=('Parse all labelled sentences of a .jsonl or TSV file '
+              'instead of --str'),
+        type=str,
+    )
+    argparser.add_argument(
+        '--batch_output', '-bo',
+        help='JSONL file receiving the results of --batch',
+        type=str,
+        default=str(CUR_DIR / 'CCGresult.jsonl'),
+    )
+    argparser.add_argument(
+        '--jobs', '-j',
+        help='Number of processes parsing the sentences of --batch',
+        type=int,
+        default=1,
+    )
+    argparser.add_argument(
+        '--timeout', '-t',
+        help='Give up on a sentence of --batch after this many seconds (0: no limit)',
+        type=float,
+        default=0,
+    )
     argparser.add_argument(
         '--display_debug', '-dd',
         help='Display debug message without filtering non-complete sentence parsing',
         action="store_true",
     )
-    args = argparser.parse_args()
+    args = argparser.parse_args(argv)
 
     if args.display_debug:
         display_debug_information(args)
+    elif args.batch:
+        rfc_lex_parse_batch(args)
     else:
         parsed, recv = rfc_lex_parse(args)
         if not None in (parsed, recv):
@@ -289,3 +656,7 @@ if __name__ == "__main__":
             ccg_result_file = CUR_DIR / 'CCGresult.txt'
             with open(ccg_result_file, "w") as f:
                 f.write(send_back_data)
+
+
+if __name__ == "__main__":
+    main()
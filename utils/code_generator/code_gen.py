@@ -30,8 +30,13 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
+import contextlib
+import csv
+import functools
+import heapq
 import json
 import pathlib
+import re
 import sys
 
 from termcolor import colored
@@ -42,6 +47,25 @@ import connect_metadata_system as mds
 import ops
 import settings
 
+LFC_DIR = UTILS_DIR / 'logic_form_checker'
+sys.path.insert(0, str(LFC_DIR))
+import logic_form_parser as lfp
+
+# columns of a TSV batch file
+BATCH_COLUMNS = ('sentence', 'sentence_id', 'lf', 'env')
+
+# instructions of an evaluation plan
+PUSH, CALL, DROP = range(3)
+# value of an env key that is not set, in memoization keys
+MISSING = object()
+
+# max. compiled conversion tables and env-specific term conversion tables
+CONVERSIONS_CACHE_SIZE = 64
+# id of a conversion table: the table and its compiled form
+COMPILED_CONVERSIONS = {}
+# tables with a shorter entry are replaced entry by entry
+MIN_MATCHED_LENGTH = 2
+
 
 def get_ops() -> dict:
     """ Get predicate operands. """
@@ -50,7 +74,7 @@ def get_ops() -> dict:
 
 def get_conversions(env: dict) -> dict:
     """ Get conversions table. Replace parameters according to
-    environment.
+    environment. Tables are cached by env, do not modify them.
 
     Parameter:
     env (dict): environment to aid logic form processing
@@ -60,15 +84,26 @@ def get_conversions(env: dict) -> dict:
     replaced according to values of env
 
     """
-    def __replace_env_elements(element: str, env: dict) -> str:
+    env_items = tuple(env.items())
+    try:
+        return __get_env_conversions(env_items)
+    except TypeError:
+        # unhashable env values
+        return __get_env_conversions.__wrapped__(env_items)
+
+
+@functools.lru_cache(maxsize=CONVERSIONS_CACHE_SIZE)
+def __get_env_conversions(env_items: tuple) -> dict:
+    """ Get the conversions table of the env (key, value) pairs. """
+    def __replace_env_elements(element: str) -> str:
         retval = element
-        for key, value in env.items():
+        for key, value in env_items:
             retval = retval.replace(f'{{ENV_{key}}}', value)
             if key == 'message':
                 retval = retval.replace(' ', '_')
         return retval
 
-    conversions = {key: __replace_env_elements(value, env)
+    conversions = {key: __replace_env_elements(value)
                    for key, value in settings.TERM_CONVERSIONS.items()}
     return conversions
 
@@ -92,42 +127,8 @@ def parse_logic_form(logic_form: str) -> list:
     tokenized_logic_form (list): tokenized logic form
 
     """
-    preproc_logic_form = (logic_form
-                          .replace('(', ' ')
-                          .replace("[dot]", ".")
-                          .replace('[', '')
-                          .replace(']', '')
-                          .replace('"', '')
-                          .replace('\'@', '(\'@')
-                          .replace('(', ' ( ')
-                          .replace(')', ' ) ')
-                          .replace(',', ' '))
-    tokens = preproc_logic_form.split()
-
-    def __tokenize(tokens: list) -> list:
-        """ Convert tokens to an expression.
-
-        Inspired by https://norvig.com/lispy.html
-
-        """
-        if not tokens:
-            raise SyntaxError("Invalid Logical Form")
-        token = tokens.pop(0)
-        if token == '(':
-            lf_tokens = []
-            while tokens[0] != ')':
-                lf_tokens.append(__tokenize(tokens))
-            tokens.pop(0)
-            return lf_tokens
-        if token == ')':
-            raise SyntaxError("Invalid Logical Form")
-        return token
-
-    tokenized_logic_form = []
-    while tokens:
-        tokenized_logic_form.append(__tokenize(tokens))
-
-    return tokenized_logic_form
+    nodes = lfp.parse(logic_form.replace("[dot]", "."))
+    return [lfp.to_lists(node) for node in nodes]
 
 
 def filter_logic_form(lf: list, denylist: list) -> bool:
@@ -170,12 +171,107 @@ def __process_content(content: str, conversions: dict) ->  str:
     ret (str): copy of content with replaced parts
 
     """
+    entries, matcher, overlaps, creates = __compile_conversions(conversions)
     ret = content
-    for old, new in conversions.items():
-        ret = ret.replace(old, new)
+    if matcher is None:
+        for old, new in entries:
+            ret = ret.replace(old, new)
+        return ret
+    # entries in order that may match: the ones found in one pass, the
+    # ones that can start at the same position or within a found one, and
+    # the ones that a replacement can create
+    pending = set()
+    for found in matcher.findall(content):
+        pending |= overlaps[found]
+    if not pending:
+        return content
+    pending = sorted(pending)
+    replaced = set()
+    while pending:
+        index = heapq.heappop(pending)
+        if index in replaced:
+            continue
+        replaced.add(index)
+        old, new = entries[index]
+        if old in ret:
+            ret = ret.replace(old, new)
+            for created in creates[index]:
+                heapq.heappush(pending, created)
     return ret
 
 
+def __can_overlap(first: str, second: str) -> bool:
+    """ Check if occurrences of two strings can overlap in a text. """
+    if first in second or second in first:
+        return True
+    return any(first.endswith(second[:size]) or second.endswith(first[:size])
+               for size in range(1, min(len(first), len(second))))
+
+
+def __trie_regex(words: list) -> str:
+    """ Build a regex matching any of words, with common prefixes merged
+    so that a match is tried once per prefix. """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def __node_regex(node: dict) -> str:
+        branches = [re.escape(char) + __node_regex(child)
+                    for char, child in node.items() if char]
+        if not branches:
+            return ''
+        regex = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+        if '' in node:
+            return f'(?:{regex})?'
+        return regex
+
+    return __node_regex(trie)
+
+
+def __compile_conversions(conversions: dict) -> tuple:
+    """ Compile a conversion table, once per table object. Tables must
+    not change after their first use.
+
+    Parameter:
+    conversions (dict): conversion table
+
+    Returns:
+    (old, new) entries (list), a regex matching any old (None if an old
+    is too short), the indices of entries that can start at the same position
+    as an old or within it (dict by old), and the indices of later entries
+    that replacing an entry can create (list by index)
+
+    """
+    try:
+        return COMPILED_CONVERSIONS[id(conversions)][1]
+    except KeyError:
+        pass
+    entries = list(conversions.items())
+    matcher = None
+    # single character entries match almost any text, finding them first
+    # costs more than replacing in order
+    if entries and all(len(old) >= MIN_MATCHED_LENGTH for old, _ in entries):
+        matcher = re.compile(__trie_regex([old for old, _ in entries]))
+    overlaps = {old: frozenset(index for index, (other, _) in enumerate(entries)
+                               if any(old[start:].startswith(other) or
+                                      other.startswith(old[start:])
+                                      for start in range(len(old))))
+                for old, _ in entries}
+    # deleting an entry can join the text around it to any later entry
+    creates = [[later for later in range(index + 1, len(entries))
+                if not new or __can_overlap(new, entries[later][0])]
+               for index, (_, new) in enumerate(entries)]
+    compiled = (entries, matcher, overlaps, creates)
+    # keep the table, so that its id is not reused while it is cached
+    COMPILED_CONVERSIONS[id(conversions)] = (conversions, compiled)
+    if len(COMPILED_CONVERSIONS) > CONVERSIONS_CACHE_SIZE:
+        del COMPILED_CONVERSIONS[next(iter(COMPILED_CONVERSIONS))]
+    return compiled
+
+
 def prepreprocess_logic_form(lfs: str, conversions: dict) -> str:
     """ Replace chunks of logic forms. """
     return __process_content(lfs, conversions)
@@ -200,24 +296,94 @@ def preprocess_logic_forms(lfs: list, conversions: dict) -> list:
             for logic_form in lfs]
 
 
-def eval_logic_forms(lfs: list, env=None) -> list:
+def compile_logic_form(lf) -> list:
+    """ Compile a single logic form to an evaluation plan.
+
+    Parameter:
+    lf (list or str): tokenized logic form
+
+    Returns:
+    list of instructions in postorder of the logic form: (PUSH, term)
+    for a term, (CALL, func, nargs) to apply an operator to the last
+    nargs results, (DROP,) to discard the last result
+
+    """
+    plan = []
+    stack = [lf]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, tuple):
+            plan.append(node)
+        elif not isinstance(node, list):
+            plan.append((PUSH, node))
+        else:
+            func, *params = node
+            stack.append((CALL, func, len(params)))
+            stack.extend(reversed(params))
+            if not isinstance(func, str):
+                stack.extend(((DROP,), func))
+    return plan
+
+
+def run_plan(plan: list, env: dict, cache: dict):
+    """ Run an evaluation plan.
+
+    Parameter:
+    plan (list): instructions from compile_logic_form()
+    env (dict): environment to aid logic form processing
+    cache (dict): memoized operator results, see ops.OP_ENV_KEYS
+
+    Returns:
+    result of the logic form
+
+    """
+    operators = get_ops()
+    results = []
+    for instruction in plan:
+        if instruction[0] == PUSH:
+            results.append(instruction[1])
+            continue
+        if instruction[0] == DROP:
+            results.pop()
+            continue
+        _, func, nargs = instruction
+        params = results[len(results) - nargs:]
+        del results[len(results) - nargs:]
+        operator = operators[func]
+        if func in ops.STATEFUL_OPS:
+            results.append(operator(params, env))
+            continue
+        key = (func, tuple(params),
+               tuple(env.get(env_key, MISSING) for env_key in ops.OP_ENV_KEYS.get(func, ())))
+        try:
+            results.append(cache[key])
+        except KeyError:
+            cache[key] = operator(params, env)
+            results.append(cache[key])
+    return results[-1]
+
+
+def eval_logic_forms(lfs: list, env=None, cache=None) -> list:
     """ Evaluate consecutive logic forms. """
     if env is None:
         env = {}
-    return [eval_logic_form(lf, env) for lf in lfs]
+    if cache is None:
+        cache = {}
+    return [eval_logic_form(lf, env, cache) for lf in lfs]
+
+
+def eval_logic_form(lf, env=None, cache=None):
+    """ Evaluate a single logic form.
 
+    Operator results are memoized in cache (dict), pass the same cache
+    to reuse them for the common subtrees of other logic forms.
 
-def eval_logic_form(lf, env=None):
-    """ Evaluate a single logic form. """
+    """
     if env is None:
         env = {}
-    if not isinstance(lf, list):
-        return lf
-    func, *params = lf
-    if not isinstance(func, str):
-        eval_logic_form(func, env)
-    params = [eval_logic_form(param, env) for param in params]
-    return get_ops()[func](params, env)
+    if cache is None:
+        cache = {}
+    return run_plan(compile_logic_form(lf), env, cache)
 
 
 def postprocess_code(code: str, conversions: dict) -> str:
@@ -235,12 +401,162 @@ def write_code_to_file(code: str, file_name: str, mode='a'):
         out_file.write(code)
 
 
-if __name__ == '__main__':
+def generate_code(logic_form: str, env: dict, cache=None) -> str:
+    """ Generate code for a logic form.
+
+    Parameter:
+    logic_form (str): logic form
+    env (dict): environment to aid logic form processing, the role is
+    added if missing
+    cache (dict): memoized operator results, see eval_logic_form()
+
+    Returns:
+    generated code (str)
+
+    """
+    if not 'role' in env:
+        env.update({'role': get_role(logic_form, settings.ROLE_KEYWORDS)})
+
+    prepreprocessed_lf = prepreprocess_logic_form(logic_form,
+                                                  settings.LF_CONVERSIONS)
+    tokenized_lfs = parse_logic_form(prepreprocessed_lf)
+    filtered_lfs = filter_logic_forms(tokenized_lfs,
+                                      settings.DENYLIST)
+    preprocessed_lfs = preprocess_logic_forms(filtered_lfs,
+                                              get_conversions(env))
+    eval_res = eval_logic_forms(preprocessed_lfs, env, cache)
+    return postprocess_code("{};\n".format(';\n'.join(eval_res)),
+                            settings.CODE_CONVERSIONS)
+
+
+def read_batch(path: str) -> list:
+    """ Read the records of a batch file.
+
+    A .jsonl file holds one object per line with the keys sentence,
+    sentence_id, lf and env. Any other file is read as TSV with the columns
+    sentence, sentence_id, lf and env, without quoting. env is a JSON
+    object, as for --env.
+
+    Returns:
+    list of dicts with sentence (str), sentence_id (int), lf (str) and
+    env (dict)
+
+    """
+    with open(path) as batch_file:
+        if path.endswith('.jsonl'):
+            records = [json.loads(line) for line in batch_file if line.strip()]
+        else:
+            records = [dict(zip(BATCH_COLUMNS, row))
+                       for row in csv.reader(batch_file, delimiter='\t',
+                                             quoting=csv.QUOTE_NONE) if row]
+    for record in records:
+        record['sentence_id'] = int(record['sentence_id'])
+        if isinstance(record.get('env', ''), str):
+            record['env'] = json.loads(record.get('env') or '{}')
+    return records
+
+
+def read_db_batch(message=None, protocol=None) -> list:
+    """ Read the records of all logic forms of a message type or a
+    protocol from the MetaData System, in the order they were added. """
+    rows = mds.SESSION.get(mds.SentenceDB).get_all_mapping()
+    records = []
+    for row in rows:
+        sent_rec = mds.SentenceRecord(*row)
+        if not sent_rec.lf or not sent_rec.env:
+            continue
+        env = json.loads(sent_rec.env)
+        if message is not None and sent_rec.msg_type != message:
+            continue
+        if protocol is not None and env.get('protocol') != protocol:
+            continue
+        records.append({'sentence': sent_rec.sentence,
+                        'sentence_id': sent_rec.sentence_id,
+                        'lf': sent_rec.lf, 'env': env})
+    return records
+
+
+def generate_batch(records: list, env=None, use_mds=False, quiet=False) -> str:
+    """ Generate code for logic forms in one process.
+
+    With use_mds, the env of each record is taken from the MetaData
+    System and the generated code and env are written back in a single
+    transaction. A record that fails is reported and skipped. Operator
+    results are memoized across the records, assuming that the message
+    fields in the MetaData System do not change during the batch.
+
+    Parameter:
+    records (list): dicts with sentence, sentence_id, lf and env
+    env (dict): environment overriding the env of every record
+
+    Returns:
+    generated code of all records (str), in the order of records
+
+    """
+    if env is None:
+        env = {}
+    sent_db = mds.SESSION.get(mds.SentenceDB) if use_mds else None
+    codes = []
+    cache = {}
+    with mds.SESSION.transaction() if use_mds else contextlib.nullcontext():
+        for record in records:
+            env_arg = {**record['env'], **env}
+            sent_rec = None
+            if use_mds:
+                try:
+                    sent_rec = mds.get_sentence_row(env_arg['message'],
+                                                    env_arg['field'],
+                                                    record['lf'],
+                                                    record['sentence'].strip(),
+                                                    record['sentence_id'],
+                                                    db=sent_db)
+                    env_arg = {**json.loads(sent_rec.env), **record['env'], **env}
+                except (json.JSONDecodeError, IndexError, LookupError) as error:
+                    print(colored('Error during querying MDS info for logic form: '
+                                  f'"{record["lf"]}"\t{error}',
+                                  'red'))
+            try:
+                res = generate_code(record['lf'], env_arg, cache)
+            except Exception as error:
+                print(colored(f'Error generating code for logic form: '
+                              f'"{record["lf"]}"\t{error!r}', 'red'))
+                continue
+            if not quiet:
+                print(f'    LF: {record["lf"]}\n'
+                      f'   ENV: {env_arg}\n'
+                      f'RESULT: {res}')
+            codes.append(res)
+            if sent_rec is not None:
+                mds.register_code_env(sent_rec, res, env_arg, db=sent_db)
+    return ''.join(codes)
+
+
+def main(argv=None):
+    """ Generate code for a logic form given on the command line, or for
+    a batch of logic forms. """
     parser = argparse.ArgumentParser()
-    parser.add_argument(
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
         'logicform',
         help='Logic form to process',
         type=str,
+        nargs='?',
+    )
+    group.add_argument(
+        '--batch', '-b',
+        help='Process the sentence, sentence_id, lf and env records of this '
+             '.jsonl or TSV file in one process',
+        type=str,
+    )
+    group.add_argument(
+        '--message', '-m',
+        help='Process all logic forms of this message type in the MetaData System',
+        type=str,
+    )
+    group.add_argument(
+        '--protocol', '-p',
+        help='Process all logic forms of this protocol in the MetaData System',
+        type=str,
     )
     parser.add_argument(
         '--sentence',
@@ -281,7 +597,18 @@ if __name__ == '__main__':
         choices=['w', 'a'],
         default='a',
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.logicform is None:
+        if args.batch:
+            records = read_batch(args.batch)
+        else:
+            records = read_db_batch(args.message, args.protocol)
+        res = generate_batch(records, json.loads(args.env or '{}'),
+                             args.use_metadata_system, args.quiet)
+        if args.outfile:
+            write_code_to_file(res, args.outfile, args.outfile_mode)
+        return
 
     env_arg = json.loads(args.env)
     sentence = ""
@@ -303,20 +630,7 @@ if __name__ == '__main__':
                           'red'))
     if args.env:
         env_arg.update(json.loads(args.env))
-    if not 'role' in env_arg:
-        env_arg.update({'role': get_role(args.logicform,
-                                         settings.ROLE_KEYWORDS)})
-
-    prepreprocessed_lf = prepreprocess_logic_form(args.logicform,
-                                                  settings.LF_CONVERSIONS)
-    tokenized_lfs = parse_logic_form(prepreprocessed_lf)
-    filtered_lfs = filter_logic_forms(tokenized_lfs,
-                                      settings.DENYLIST)
-    preprocessed_lfs = preprocess_logic_forms(filtered_lfs,
-                                              get_conversions(env_arg))
-    eval_res = eval_logic_forms(preprocessed_lfs, env_arg)
-    res = postprocess_code("{};\n".format(';\n'.join(eval_res)),
-                           settings.CODE_CONVERSIONS)
+    res = generate_code(args.logicform, env_arg)
 
     if not args.quiet:
         print(f'    LF: {args.logicform}\n'
@@ -337,3 +651,7 @@ if __name__ == '__main__':
 
     if args.outfile:
         write_code_to_file(res, args.outfile, args.outfile_mode)
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,7 @@
 
 import argparse
 import json
+import os
 import pathlib
 import sys
 from collections import defaultdict
@@ -38,6 +39,7 @@ from collections import defaultdict
 CUR_DIR = pathlib.Path(__file__).parent.absolute()
 MDS_DIR = CUR_DIR / '..' / 'metadata_system'
 sys.path.insert(0, str(MDS_DIR))
+from db_session import SESSION
 from metarecord import MetaRecord, MetaDB
 from sentence_record import SentenceRecord, SentenceDB
 
@@ -56,30 +58,24 @@ from similarity import similarity_select
 
 
 def get_sentence_row(msg_type: str, field: str, lf: str,
-                     sent: str, sent_id: int) -> SentenceRecord:
-    """ Query a sentence record from the MetaData System. """
-    db = SentenceDB()
-    rows = db.get_mapping_by_msgtype_lf_and_sent_with_id(msg_type, field,
-                                                         lf, sent, sent_id)
-    db.close_conn()
+                     sent: str, sent_id: int, db=None) -> SentenceRecord:
+    """ Query a sentence record from the MetaData System, or from db
+    (SentenceDB) if given. """
+    sent_db = SESSION.get(SentenceDB) if db is None else db
+    rows = sent_db.get_mapping_by_msgtype_lf_and_sent_with_id(msg_type, field,
+                                                              lf, sent, sent_id)
     return SentenceRecord(*rows[0])
 
 
 def get_all_lf(msg_type: str, proto='icmp'):
     """ Query all logical forms from the MetaData System. """
-    sent_db = SentenceDB()
-    sent_rows = sent_db.get_mapping_by_msg_type(msg_type)
-    sent_db.close_conn()
-    meta_db = MetaDB()
-    meta_rows = meta_db.get_meta_by_msg_type(msg_type)
-    meta_db.close_conn()
+    sent_rows = SESSION.get(SentenceDB).get_mapping_by_msg_type(msg_type)
+    meta_rows = SESSION.get(MetaDB).get_meta_by_msg_type(msg_type)
     fields = list(set(meta_row[3] for meta_row in meta_rows))
     add_list = [f'{proto} {field}' for field in fields]
     fields.extend(add_list)
     fields.append(msg_type)
-    term_db = tm.TermDB()
-    term_rows = term_db.get_all_term()
-    term_db.close_conn()
+    term_rows = SESSION.get(tm.TermDB).get_all_term()
     terms = [term_row[1] for term_row in term_rows]
     actions = ['help', 'aid', 'match', 'form', 'recompute', 'reverse', 'compute']
     numbers = ['zeros', 'one', 'two', 'three', 'eight']
@@ -87,8 +83,7 @@ def get_all_lf(msg_type: str, proto='icmp'):
     lf_graphs = clf.convert_all(lfs)
     str_list = []
     for lf_graph in lf_graphs:
-        graph_lf_graph = lf_graph['graph'].graph
-        for node in graph_lf_graph.nodes():
+        for node in lf_graph['graph'].tree.names:
             name_list = node.split('\'')
             name = next(n for n in name_list if n != '')
             if cp.__is_const_str(name) and name not in actions and \
@@ -106,9 +101,7 @@ def get_all_lf(msg_type: str, proto='icmp'):
 
 def get_messsage_row(sentence: str) -> MetaRecord:
     """ Query a meta record by sentence. """
-    db = MetaDB()
-    rows = db.get_meta_by_sentence(sentence)
-    db.close_conn()
+    rows = SESSION.get(MetaDB).get_meta_by_sentence(sentence)
     return MetaRecord(rows[0][1], rows[0][0], *rows[0][2:])
 
 
@@ -123,10 +116,8 @@ def join_rows(message_row: MetaRecord, sentence_row: SentenceRecord) -> dict:
 def get_env_for_logic_form(lf: str) -> dict:
     """ Query environment dict for a LF. """
     try:
-        db = SentenceDB()
-        rows = db.get_mapping_by_lf(lf)
+        rows = SESSION.get(SentenceDB).get_mapping_by_lf(lf)
         sent_row = SentenceRecord(*rows[0])
-        db.close_conn()
     except (IndexError, AttributeError):
         raise LookupError(f'No result in SentenceDB for logic form: "{lf}"')
 
@@ -155,41 +146,93 @@ def get_env_from_mds(msg_type: str, field: str, lf: str,
     return json.loads(sent_row.env)
 
 
+class MetadataCache:
+    """ Fields of the messages in the MetaData System.
+
+    Read with one query and kept until another connection commits to the
+    DB (PRAGMA data_version) or the DB file is replaced. The cache keeps a
+    connection of its own, commits through SESSION must change the
+    data_version it sees.
+
+    """
+
+    def __init__(self, name=None):
+        self.name = name if name is not None else MetaDB.DEFAULT_NAME
+        self.db = None
+        self.reset()
+
+    def reset(self):
+        """ Close the DB and drop the fields, refresh() reads them again. """
+        if self.db is not None:
+            self.db.close_conn()
+        self.db = None
+        self.file_id = None
+        self.data_version = None
+        self.proto_fields = {}
+        self.proto_field_names = {}
+        self.msg_fields = {}
+        self.proto_messages = {}
+
+    def refresh(self):
+        """ Read the fields again if the DB changed. """
+        try:
+            stat = os.stat(self.name)
+            file_id = (stat.st_dev, stat.st_ino)
+        except FileNotFoundError:
+            file_id = None
+        if self.db is None or file_id != self.file_id:
+            if self.db is not None:
+                self.db.close_conn()
+            self.db = MetaDB(self.name)
+            stat = os.stat(self.name)
+            self.file_id = (stat.st_dev, stat.st_ino)
+            self.data_version = None
+        data_version = self.db.get_data_version()
+        if data_version == self.data_version:
+            return
+        self.data_version = data_version
+        self.proto_fields = defaultdict(set)
+        self.msg_fields = defaultdict(list)
+        self.proto_messages = defaultdict(set)
+        for proto, msg_type, field, bit in self.db.get_all_fields():
+            self.proto_messages[proto].add(msg_type)
+            if proto != 'unknown':
+                self.proto_fields[proto].add((field, bit))
+                self.msg_fields[msg_type].append((field, bit))
+        self.proto_field_names = {proto: frozenset(field for field, _ in fields)
+                                  for proto, fields in self.proto_fields.items()}
+
+
+METADATA = MetadataCache()
+
+
 def get_proto_fields() -> dict:
     """ Get protocol, fields pairs.  """
-    db = MetaDB()
-    rows = db.get_all_meta()
-    db.close_conn()
+    METADATA.refresh()
     proto_fields = defaultdict(set)
-    for row in rows:
-        proto, field, bit = row[0], row[3], row[4]
-        if proto != 'unknown':
-            proto_fields[proto].add((field, bit))
+    for proto, fields in METADATA.proto_fields.items():
+        proto_fields[proto] = set(fields)
     #for proto in (p for p in proto_fields if p != 'unknown'):
     #    proto_fields[proto] -= proto_fields['unknown']
     return proto_fields
 
 
+def get_proto_field_names(protocol: str) -> frozenset:
+    """ Get the field names of a protocol. """
+    METADATA.refresh()
+    return METADATA.proto_field_names.get(protocol, frozenset())
+
+
 def get_msg_fields(message: str) -> list:
     """ Get field, size pairs of a given message.  """
-    db = MetaDB()
-    rows = db.get_all_meta()
-    db.close_conn()
-    message_fields = []
-    for row in rows:
-        proto, msg_type, field, bit = row[0], row[1], row[3], row[4]
-        if msg_type == message and proto != 'unknown':
-            message_fields.append((field, bit))
-    return message_fields
+    METADATA.refresh()
+    return list(METADATA.msg_fields.get(message, []))
 
 
 def get_proto_messages(protocol: str) -> list:
     """ Get messages of a protocol. """
-    db = MetaDB()
-    rows = db.get_all_meta()
-    db.close_conn()
-    messages = set(row[1] for row in rows if row[0] == protocol)
-    return messages
+    METADATA.refresh()
+    return set(METADATA.proto_messages.get(protocol, set()))
 
 
 def get_message_envs_codes_sentences(message: str) -> list:
@@ -203,26 +246,23 @@ def get_message_envs_codes_sentences(message: str) -> list:
     of a SentenceRecord
 
     """
-    sent_db = SentenceDB()
-    sentence_recs = [SentenceRecord(*row)
-                     for row in sent_db.get_all_mapping()]
-    sent_db.close_conn()
-    sent_records = [r for r in sentence_recs
-                    if r.code and message in r.env]
+    sent_db = SESSION.get(SentenceDB)
+    sent_records = [SentenceRecord(*row)
+                    for row in sent_db.get_mapping_with_code_by_env(message)]
     return [{'env': json.loads(r.env), 'code': r.code,
              'sentence': r.sentence, 'sentence_id': r.sentence_id}
             for r in sent_records]
 
 
-def register_code_env(sentence_record: SentenceRecord, code: str, env: dict):
+def register_code_env(sentence_record: SentenceRecord, code: str, env: dict,
+                      db=None):
     """ Add generated code and environment to corresponding sentence
-        record in mapping table.
+        record in mapping table, of db (SentenceDB) if given.
     """
     sentence_record.code = code
     sentence_record.env = json.dumps(env)
-    db = SentenceDB()
-    db.replace_value(sentence_record)
-    db.close_conn()
+    sent_db = SESSION.get(SentenceDB) if db is None else db
+    sent_db.replace_value(sentence_record)
 
 
 if __name__ == "__main__":
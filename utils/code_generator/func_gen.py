@@ -260,7 +260,8 @@ def format_code(code: str, clang_args="") -> str:
     return output
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """ Generate the function of a message role from the MetaData System. """
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
         '--message', '-m',
@@ -300,7 +301,7 @@ if __name__ == "__main__":
         help='Catering to specific static framework',
         action='store_true',
     )
-    args = argparser.parse_args()
+    args = argparser.parse_args(argv)
 
     if not args.role:
         raise Exception('Please, set role with [--role/-r ROLE]')
@@ -335,3 +336,7 @@ if __name__ == "__main__":
 
     if args.outfile:
         write_code_to_file(formatted_code, args.outfile, args.outfile_mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,7 +30,7 @@
 import ast
 
 from check_type import is_variable, is_const_num, is_function_call
-from connect_metadata_system import get_proto_fields
+from connect_metadata_system import get_proto_field_names
 
 # Suppress pylint unused arguments warning:
 # The __do_op* functions require to have 'env' arguments
@@ -144,8 +144,7 @@ def __do_op_is(params: list, env=None) -> str:
     if not any((is_variable(x) for x in (variable, value))):
         try:
             if '{ENV_message}' not in env["message"]:
-                proto_fields = get_proto_fields()
-                field_names = [p[0] for p in proto_fields[env["protocol"]]]
+                field_names = get_proto_field_names(env["protocol"])
                 if env["field"] in field_names:
                     msg = env["message"].replace(' ', '_')
                     field = env["field"].replace(' ', '_')
@@ -237,8 +236,7 @@ def __do_op_odd(params: list, env=None) -> str:
         return f'isodd({arg})'
     try:
         if '{ENV_message}' not in env["message"]:
-            proto_fields = get_proto_fields()
-            field_names = [p[0] for p in proto_fields[env["protocol"]]]
+            field_names = get_proto_field_names(env["protocol"])
             if env["field"] in field_names:
                 msg = env["message"].replace(' ', '_')
                 var = f'{msg}_hdr.{env["field"]}'
@@ -284,24 +282,6 @@ def __do_op_copy(params: list, env=None) -> str:
         callee = ','.join([variable, byte_value])
     return f'copy(&{caller},(char*){callee})'
 
-def __do_op_zero(params: list, env=None) -> str:
-    num = "'0'"
-    params.append(num)
-    print("params:", params)
-    return __do_op_is(params, env)
-
-def __do_op_when(params: list, env=None) -> str:
-    role = params[0]
-    action = params[1]
-    if '>=' in role:
-        return __do_op_condition(params, env)
-    return f'\n/*{role}*/\n {action}'
-
-def __do_op_compound(params: list, env=None) -> str:
-    return f'{__join_params(params, "_")}'
-
-def __do_op_ignore(params: list, env=None) -> str:
-    return 'dummy_action()'
 
 def __do_op_zero(params: list, env=None) -> str:
     num = "'0'"
@@ -394,6 +374,10 @@ def __do_op_with(params: list, env=None) -> str:
     former, latter = params[0], params[1]
     return f'{latter};\n {former}'
 
+# Results of an operator are memoized by its params and the values of
+# its OP_ENV_KEYS. Add the env keys an operator reads to OP_ENV_KEYS, and
+# operators that change env or have other side effects, e.g. printing, to
+# STATEFUL_OPS, which are never memoized.
 OPS = {
     "'@Action'": __do_op_action,
     "'@And'": __do_op_and,
@@ -437,3 +421,17 @@ OPS = {
     "'@Transmit'":__do_op_transmit,
     "'@With'": __do_op_with,
 }
+
+ENV_KEYS_IS = ('message', 'protocol', 'field')
+
+OP_ENV_KEYS = {
+    "'@Associate'": ENV_KEYS_IS,
+    "'@ChangeTo'": ENV_KEYS_IS,
+    "'@Is'": ENV_KEYS_IS,
+    "'@Odd'": ENV_KEYS_IS,
+    "'@Zeros'": ENV_KEYS_IS,
+}
+
+STATEFUL_OPS = frozenset({
+    "'@AdvBefore'",
+})
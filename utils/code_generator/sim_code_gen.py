@@ -55,7 +55,11 @@ def add_field_lower():
         fp.write("}\n")
 
 
-if __name__ == '__main__':
+def main(argv=None):
+    """ Generate state management code for a logic form. """
+    # dyn_term is rewritten by the driver between calls, pick up the
+    # latest terms when running inside a long-lived worker
+    importlib.reload(dyn_term)
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'logicform',
@@ -68,7 +72,7 @@ if __name__ == '__main__':
         type=str,
         default='state_code.txt',
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     prepreprocessed_lf = prepreprocess_logic_form(args.logicform, settings.ROLE_KEYWORDS)
     tokenized_lfs = parse_logic_form(prepreprocessed_lf)
     print(tokenized_lfs)
@@ -99,3 +103,7 @@ if __name__ == '__main__':
     with open(args.outfile, 'a') as f:
         f.write(res)
         f.write("\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -30,54 +30,97 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
+import concurrent.futures
+import html
 import itertools
+import os
 import pathlib
+import shutil
 import subprocess
 import tempfile
 
-import networkx
-
 import logic_form_graph as lfg
 
 
-def check_logic_forms_eq_pair(lfs: list):
+# max. graphs rendered by one dot process, and dot processes run at once
+DOT_BATCH = 200
+DOT_JOBS = min(4, os.cpu_count() or 1)
+
+
+def canonical_form(tree: lfg.LogicFormTree, codes: dict, labels=False) -> int:
+    """AHU encoding of a logic form tree (or forest).
+
+    Every subtree is encoded as an int: the code of (label, sorted codes of
+    the children) in codes. Two trees are isomorphic iff their encodings
+    are equal, if they were computed with the same codes.
+
+    Parameter:
+    tree (LogicFormTree): tree of a LogicFormGraph
+    codes (dict): codes of subtrees, shared by the trees to compare
+    labels (bool): whether the predicates of the nodes must match too
+
+    Returns:
+    encoding (int)
+
+    """
+    subtree_codes = [0] * len(tree)
+    for node in tree.postorder():
+        label = tree.predicate_ids[node] if labels else None
+        children = tuple(sorted(subtree_codes[child] for child in tree.children(node)))
+        subtree_codes[node] = codes.setdefault((label, children), len(codes))
+    roots = tuple(sorted(subtree_codes[root] for root in tree.roots()))
+    return codes.setdefault(('forest', roots), len(codes))
+
+
+def group_logic_forms(lfs: list, labels=False) -> list:
+    """Group equivalent logic forms by their canonical form.
+
+    Parameter:
+    lfs (list): dicts of id (int) and a graph (LogicalFormGraph)
+    labels (bool): whether the predicates of the nodes must match too
+
+    Returns:
+    groups (list): lists with ids of equivalent logic forms, in input order
+
+    """
+    codes = {}
+    groups = {}
+    for logic_form in lfs:
+        encoding = canonical_form(logic_form['graph'].tree, codes, labels)
+        groups.setdefault(encoding, []).append(logic_form['id'])
+    return list(groups.values())
+
+
+def check_logic_forms_eq_pair(lfs: list, labels=False):
     """Check equivalency of logic forms pairwise.
 
     Parameter:
     lfs (list): dicts of id (int) and a graph (LogicalFormGraph)
+    labels (bool): whether the predicates of the nodes must match too
 
     Returns:
     isomorph_pares (list): tuples with ids of equivalent logic forms
 
     """
+    order = {logic_form['id']: index for index, logic_form in enumerate(lfs)}
     isomorph_pares = []
-    for logic_form1, logic_form2 in itertools.combinations(lfs, 2):
-        if networkx.is_isomorphic(logic_form1['graph'].graph,
-                                  logic_form2['graph'].graph):
-            isomorph_pares.append((logic_form1['id'], logic_form2['id']))
-    return isomorph_pares
+    for group in group_logic_forms(lfs, labels):
+        isomorph_pares += itertools.combinations(group, 2)
+    return sorted(isomorph_pares, key=lambda pair: (order[pair[0]], order[pair[1]]))
 
 
-def check_logic_forms_eq(lfs: list):
+def check_logic_forms_eq(lfs: list, labels=False):
     """Check equivalency of logic forms.
 
     Parameter:
     lfs (list): dicts of id (int) and a graph (LogicalFormGraph)
+    labels (bool): whether the predicates of the nodes must match too
 
     Returns:
     equivalent_ids (list): sets with ids of equivalent logic forms
 
     """
-    eq_pairs = map(set, check_logic_forms_eq_pair(lfs))
-    equivalent_ids = []
-    for ids in eq_pairs:
-        for id_set in equivalent_ids:
-            if not ids.isdisjoint(id_set):
-                id_set.update(ids)
-                break
-        else:
-            equivalent_ids.append(ids)
-    return equivalent_ids
+    return [set(group) for group in group_logic_forms(lfs, labels) if len(group) > 1]
 
 
 def print_logic_form_list(logic_forms: list):
@@ -87,32 +130,113 @@ def print_logic_form_list(logic_forms: list):
         print(f' {logic_form["id"]}: {logic_form["graph"].sentence}')
 
 
-def print_equal_logic_forms(logic_forms: list):
+def print_equal_logic_forms(logic_forms: list, labels=False):
     """ Print ids of equivalent logic forms. """
     print('* Results')
-    eq_ids = check_logic_forms_eq(logic_forms)
+    eq_ids = check_logic_forms_eq(logic_forms, labels)
     sorted_ids = sorted([tuple(sorted(id_set)) for id_set in eq_ids])
     print(f'Equal logical forms: {sorted_ids}')
 
 
-def print_all(logic_forms: list):
+def print_all(logic_forms: list, labels=False):
     """ Print detailed logic form analysis. """
     print_logic_form_list(logic_forms)
-    print_equal_logic_forms(logic_forms)
+    print_equal_logic_forms(logic_forms, labels)
     export_all(logic_forms)
 
 
-def export_all(logic_forms: list, basename='lfg',
-               out_dir='/tmp', out_format='png'):
-    """ Export logic form graphs to png files. """
-    with tempfile.NamedTemporaryFile() as dotfile:
-        for logic_form in logic_forms:
-            logic_form['graph'].write_dot(dotfile.name)
-            out_basename = f'{basename}-{logic_form["id"]}.{out_format}'
-            out_file = pathlib.Path(out_dir, out_basename)
-            cmd = f'dot -T{out_format} {dotfile.name} -o {out_file}'.split()
+def render_graphs(dot_graphs: dict, out_dir, out_format='png', jobs=DOT_JOBS) -> list:
+    """ Render DOT graphs with few dot processes.
+
+    Every dot process renders up to DOT_BATCH graphs, up to jobs of them
+    run at once.
+
+    Parameter:
+    dot_graphs (dict): file name without extension (str): DOT text (str)
+    out_dir (str): directory of the rendered files
+    out_format (str): output format of dot, e.g. png, pdf, svg
+
+    Returns:
+    paths of the rendered files, in the order of dot_graphs
+
+    """
+    if not dot_graphs:
+        return []
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    extension = out_format.split(':')[0]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = []
+        for index, dot_text in enumerate(dot_graphs.values()):
+            path = pathlib.Path(tmp_dir, f'{index}.dot')
+            path.write_text(dot_text)
+            inputs.append(path)
+        size = min(DOT_BATCH, -(-len(inputs) // max(1, jobs)))
+        chunks = [inputs[i:i + size] for i in range(0, len(inputs), size)]
+
+        def __render(chunk: list):
+            # -O writes <input>.<format> next to each input file
+            cmd = ['dot', f'-T{out_format}', '-O'] + [str(path) for path in chunk]
             subprocess.run(cmd, check=True)
 
+        with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+            list(executor.map(__render, chunks))
+
+        out_files = []
+        for path, name in zip(inputs, dot_graphs):
+            rendered = next(rendered for rendered in path.parent.glob(f'{path.name}.*'))
+            out_file = out_dir / f'{name}.{extension}'
+            shutil.move(str(rendered), out_file)
+            out_files.append(out_file)
+    return out_files
+
+
+def write_gallery(sections: list, filename: str, jobs=DOT_JOBS):
+    """ Write logic form graphs to an HTML page of SVG images.
+
+    Parameter:
+    sections (list): tuples of a title (str) and the logic form graphs
+    (list of dicts of id (int) and a graph (LogicFormGraph)) shown under it
+    filename (str): path of the HTML file
+
+    """
+    dot_graphs = {}
+    for section_id, (_, logic_forms) in enumerate(sections):
+        for logic_form in logic_forms:
+            name = f'lfg-{section_id}-{logic_form["id"]}'
+            dot_graphs[name] = logic_form['graph'].to_dot(name)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        svg_files = iter(render_graphs(dot_graphs, tmp_dir, 'svg', jobs))
+        body = []
+        for title, logic_forms in sections:
+            body.append(f'<h2>{html.escape(title)}</h2>')
+            for logic_form in logic_forms:
+                svg = next(svg_files).read_text()
+                # inline the <svg> element without XML declaration and doctype
+                svg = svg[svg.find('<svg'):]
+                caption = html.escape(f'{logic_form["id"]}: {logic_form["graph"].logic_form}')
+                body.append(f'<figure><figcaption>{caption}</figcaption>{svg}</figure>')
+    with open(filename, 'w') as html_file:
+        html_file.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                        '<title>Logic form graphs</title><style>'
+                        'figure{display:inline-block;margin:1em;vertical-align:top}'
+                        'figcaption{font-family:monospace}'
+                        '</style></head><body>\n')
+        html_file.write('\n'.join(body))
+        html_file.write('\n</body></html>\n')
+
+
+def export_all(logic_forms: list, basename='lfg',
+               out_dir='/tmp', out_format='png', jobs=DOT_JOBS):
+    """ Export logic form graphs to files <basename>-<id>.<out_format>,
+    or to the gallery <basename>.html if out_format is html. """
+    if out_format == 'html':
+        write_gallery([(basename, logic_forms)],
+                      pathlib.Path(out_dir, f'{basename}.html'), jobs)
+        return
+    render_graphs({f'{basename}-{logic_form["id"]}': logic_form['graph'].to_dot()
+                   for logic_form in logic_forms}, out_dir, out_format, jobs)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -123,12 +247,23 @@ if __name__ == '__main__':
     )
     parser.add_argument(
         '--export', '-e',
-        help='Export LogicFormGraphs to files at /tmp/lgf-{}',
+        help='Export LogicFormGraphs to files at /tmp/lfg-{}',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--format', '-f',
+        help='Format of --export: a dot output format, or html for one gallery page',
+        type=str,
+        default='png',
+    )
+    parser.add_argument(
+        '--labels', '-l',
+        help='Equivalent logic forms must also have the same predicates',
         action='store_true',
     )
     args = parser.parse_args()
 
     lf_graphs = lfg.create_logic_form_graphs_from_logic_forms(args.logicforms)
-    print_all(lf_graphs)
+    print_all(lf_graphs, args.labels)
     if args.export:
-        export_all(lf_graphs)
+        export_all(lf_graphs, out_format=args.format)
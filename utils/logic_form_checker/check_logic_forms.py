@@ -30,23 +30,39 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
-
-import networkx
+import functools
+import json
+import multiprocessing
+import pathlib
+import sys
 
 import check_equivalency as ce
 import check_predicates as cp
 import logic_form_graph as lfg
 
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+MDS_DIR = CUR_DIR / '..' / 'metadata_system'
+sys.path.insert(0, str(MDS_DIR))
+import sentence_record
+
 
 CHECKS = ('rules', 'order', 'sequence', 'duplicates')
 
+# checks of a node and its children only: a logical form fails them if a
+# complete subterm of it does
+SPAN_CHECKS = ('rules', 'order', 'sequence')
 
-def check_all(logic_forms: list, checks=None, verbose=False) -> list:
+
+def check_all(logic_forms: list, checks=None, verbose=False, rejected=None,
+              summary=None) -> list:
     """ Do all Logic Form Graph checking.
 
     Parameter:
     logic forms (list): logical forms
     verbose (bool): enable printing details
+    rejected (dict): if given, filled with the id of each rejected logical
+    form and the check that rejected it
+    summary (dict): if given, filled with the counts of the LF check summary
 
     Returns:
     lf_graphs (list): dicts of id (int) and a graph (LogicalFormGraph)
@@ -58,19 +74,30 @@ def check_all(logic_forms: list, checks=None, verbose=False) -> list:
         print_all(lf_graphs)
 
     # check tree
-    if not all(networkx.is_tree(g['graph'].graph) for g in lf_graphs):
+    if not all(g['graph'].tree.is_tree() for g in lf_graphs):
         print("WARNING: not all Logic Form Graphs are trees!")
 
     # do checks
     if checks is None:
         checks = CHECKS
-    for check in checks:
-        lf_graphs = cp.check_pred_all(lf_graphs, mode=check)
-        num_lfs[check] = len(lf_graphs)
+    results = cp.check_pred_all_fused(lf_graphs, checks)
+    for index, check in enumerate(checks):
+        # raise the error the first logical form reaching this check raised
+        errors = [error for failed, error in results if failed == index and error]
+        if errors:
+            raise errors[0]
+        num_lfs[check] = sum(1 for failed, _ in results if failed > index)
         if verbose:
             print(f'# lfs after predicate {check}: {num_lfs[check]}')
-
-    # check equivalency
+    if rejected is not None:
+        rejected.update((lf['id'], checks[failed])
+                        for lf, (failed, _) in zip(lf_graphs, results)
+                        if failed < len(checks))
+    lf_graphs = [lf for lf, (failed, _) in zip(lf_graphs, results)
+                 if failed == len(checks)]
+
+    # check equivalency of the structure only, like networkx.is_isomorphic
+    # did before, so the numbers of unique lfs stay comparable between runs
     equivalent_ids = ce.check_logic_forms_eq(lf_graphs)
     elem_num = sum(len(id_set) for id_set in equivalent_ids)
     uniqlf_num = len(lf_graphs) - elem_num + len(equivalent_ids)
@@ -81,10 +108,52 @@ def check_all(logic_forms: list, checks=None, verbose=False) -> list:
                              for id_set in equivalent_ids])
         print(f'Equivalent logical forms: {sorted_ids}')
         print(f'LF check summary: {num_lfs}')
+    if summary is not None:
+        summary.update(num_lfs)
 
     return lf_graphs
 
 
+class SpanFilter:
+    """ Reject partial parses with a complete predicate term that fails a
+    check, see Parser(span_filter=...). Every logical form built from such
+    a parse contains the term, unless a lambda ignoring its argument (e.g.
+    '\\x.'@Action'('update',y)') drops it.
+
+    """
+
+    def __init__(self, checks=None):
+        checks = CHECKS if checks is None else checks
+        self.checks = [check for check in checks if check in SPAN_CHECKS]
+        self.results = {}
+
+    def __repr__(self):
+        return f'SpanFilter({self.checks})'
+
+    def __call__(self, terms: list) -> bool:
+        return all(self.check_term(term) for term in terms)
+
+    def check_term(self, term: str) -> bool:
+        """ Check a complete predicate term, e.g. '@Is'('a','0').
+
+        Returns:
+        false if the term fails a check, true if it passes or a check
+        cannot decide (e.g. an unknown predicate)
+
+        """
+        try:
+            return self.results[term]
+        except KeyError:
+            pass
+        try:
+            lf_graph = {'id': 0, 'graph': lfg.LogicFormGraph(term)}
+            failed, error = cp.check_pred_fused(lf_graph, self.checks)
+            self.results[term] = failed == len(self.checks) or error is not None
+        except SyntaxError:
+            self.results[term] = True
+        return self.results[term]
+
+
 def convert_all(logic_forms: list) -> list:
     """ Convert a logic forms to logic form graphs.
 
@@ -119,21 +188,239 @@ def export_all(lf_graphs: list, **kwargs):
     ce.export_all(lf_graphs, **kwargs)
 
 
-if __name__ == '__main__':
+def check_record(record: dict, checks=None) -> dict:
+    """ Check the logical forms of a sentence of a batch.
+
+    Parameter:
+    record (dict): logical forms (list) as lfs, other fields are copied
+    to the result
+    checks (list): checks to execute, all if None
+
+    Returns:
+    the record with the kept logical forms (list), the rejected ones
+    (list of dicts of lf and check), the LF check summary (dict), the
+    error of a failed check (str or None), the checks and the rule table
+    entries the results depend on (fingerprint, see recheck_batch)
+
+    """
+    checks = list(CHECKS if checks is None else checks)
+    result = dict(record, kept=[], rejected=[], summary={}, error=None,
+                  checks=checks, fingerprint=[])
+    rejected = {}
+    try:
+        entries = set()
+        for lf_graph in lfg.create_logic_form_graphs_from_logic_forms(record['lfs']):
+            entries |= cp.table_lookups(lf_graph, checks)
+        result['fingerprint'] = sorted(entries)
+    except SyntaxError:
+        pass
+    try:
+        lf_graphs = check_all(record['lfs'], checks, rejected=rejected,
+                              summary=result['summary'])
+    except Exception as e:
+        result['error'] = f'{e.__class__.__name__}: {e}'
+        return result
+    result['kept'] = [lf_graph['graph'].logic_form for lf_graph in lf_graphs]
+    result['rejected'] = [{'lf': record['lfs'][lf_id], 'check': check}
+                          for lf_id, check in sorted(rejected.items())]
+    return result
+
+
+def read_batch(path: str) -> list:
+    """ Read the sentences of a .jsonl file, one JSON object per line with
+    the logical forms as lfs (list) or lf (str). """
+    batch = []
+    with open(path) as batch_file:
+        for line in batch_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'lfs' not in record:
+                record['lfs'] = [record.pop('lf')]
+            batch.append(record)
+    return batch
+
+
+def read_sentence_db(path: str) -> list:
+    """ Read the logical forms of a metadata DB, grouped by sentence. """
+    sentence_db = sentence_record.SentenceDB(path, create=False)
+    records = {}
+    for sentence, sentence_id, msg_type, field, label, lf in sentence_db.get_all_lfs():
+        key = (sentence, sentence_id, msg_type, field)
+        if key not in records:
+            records[key] = {'sentence': sentence, 'sentence_id': sentence_id,
+                            'msg_type': msg_type, 'field': field,
+                            'label': label, 'lfs': []}
+        records[key]['lfs'].append(lf)
+    sentence_db.close_conn()
+    return list(records.values())
+
+
+def check_batch(batch: list, checks=None, jobs=1):
+    """ Check the sentences of a batch in this process or on a process pool.
+
+    Parameter:
+    batch (list): records as check_record takes them
+    checks (list): checks to execute, all if None
+    jobs (int): number of processes
+
+    Yields:
+    the result of check_record for each record, in input order
+
+    """
+    check = functools.partial(check_record, checks=checks)
+    if jobs <= 1:
+        yield from map(check, batch)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(check, batch,
+                             chunksize=max(1, len(batch) // (jobs * 4)))
+
+
+# fields check_record adds to a record
+RESULT_FIELDS = ('kept', 'rejected', 'summary', 'error', 'checks', 'fingerprint')
+
+
+def is_stale(result: dict, checks=None, lookups=None) -> bool:
+    """ Check if the rule tables changed for a result of check_record.
+
+    Parameter:
+    result (dict): result of check_record
+    checks (list): checks to execute, all if None
+    lookups (dict): results of rule table lookups, shared across calls
+
+    Returns:
+    true if the result was checked with other checks or any rule table
+    entry of its fingerprint looks up different now
+
+    """
+    lookups = {} if lookups is None else lookups
+    if result.get('checks') != list(CHECKS if checks is None else checks):
+        return True
+    for mode, predicate, key, value in result.get('fingerprint', ()):
+        entry = (mode, predicate, tuple(key) if isinstance(key, list) else key)
+        if entry not in lookups:
+            lookups[entry] = cp.lookup(*entry)
+        if lookups[entry] != value:
+            return True
+    return False
+
+
+def recheck_batch(results: list, checks=None, jobs=1):
+    """ Check again the sentences of earlier results of check_record
+    whose rule table entries changed, e.g. after editing predicate_rules.
+
+    Parameter:
+    results (list): results of check_record
+    checks (list): checks to execute, all if None
+    jobs (int): number of processes
+
+    Yields:
+    the result of each sentence, in input order, and whether it was
+    checked again (bool)
+
+    """
+    lookups = {}
+    stale = [is_stale(result, checks, lookups) for result in results]
+    records = [{key: value for key, value in result.items()
+                if key not in RESULT_FIELDS}
+               for result, is_changed in zip(results, stale) if is_changed]
+    new_results = check_batch(records, checks, jobs)
+    for result, is_changed in zip(results, stale):
+        yield (next(new_results), True) if is_changed else (result, False)
+    new_results.close()
+
+
+def check_all_batch(args: argparse.Namespace):
+    """ Check the sentences of --batch, --db or --recheck and write the
+    results to --batch_output, one JSON object per line. """
+    if args.recheck:
+        results = recheck_batch(read_batch(args.recheck), args.checks, args.jobs)
+    else:
+        batch = read_sentence_db(args.db) if args.db else read_batch(args.batch)
+        results = ((result, True) for result in check_batch(batch, args.checks, args.jobs))
+    kept = rejected = errors = checked = total = 0
+    with open(args.batch_output, 'w') as out_file:
+        for result, is_checked in results:
+            total += 1
+            checked += is_checked
+            kept += len(result['kept'])
+            rejected += len(result['rejected'])
+            errors += result['error'] is not None
+            out_file.write(json.dumps(result) + '\n')
+    print(f'Checked {checked} of {total} sentences: {kept} logical forms kept, '
+          f'{rejected} rejected, {errors} sentences failed')
+
+
+def main(argv=None):
+    """ Check logic forms given on the command line or in a batch. """
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'logicforms',
         help='Logic forms to process',
-        nargs='+', default=[],
+        nargs='*', default=[],
     )
     parser.add_argument(
         '--quiet', '-q',
         help='Surpress verbose mode',
         action='store_true',
     )
-    args = parser.parse_args()
-
-    logic_form_graphs = check_all(args.logicforms, verbose=not args.quiet)
+    parser.add_argument(
+        '--checks', '-C',
+        help='Checks to execute',
+        choices=CHECKS,
+        nargs='+',
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        '--batch', '-b',
+        help='Check the logical forms of a .jsonl file, key lfs per sentence',
+        type=str,
+    )
+    group.add_argument(
+        '--db', '-D',
+        help='Check all logical forms of a metadata DB, grouped by sentence',
+        type=str, nargs='?', const=str(MDS_DIR / 'sent_to_lf.db'),
+    )
+    group.add_argument(
+        '--recheck', '-r',
+        help=('Update the results of an earlier --batch or --db run, checking '
+              'only sentences whose rule table entries changed'),
+        type=str,
+    )
+    parser.add_argument(
+        '--batch_output', '-bo',
+        help='JSONL file receiving the results of --batch, --db or --recheck',
+        type=str,
+        default=str(CUR_DIR / 'LFcheck.jsonl'),
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        help='Number of processes checking the sentences of --batch, --db or --recheck',
+        type=int,
+        default=1,
+    )
+    args = parser.parse_args(argv)
+
+    if args.db and not pathlib.Path(args.db).is_file():
+        parser.error(f'no metadata DB at {args.db}')
+    if args.batch or args.db or args.recheck:
+        check_all_batch(args)
+        return
+    if not args.logicforms:
+        parser.error('logic forms, --batch, --db or --recheck are required')
+
+    rejected = {}
+    logic_form_graphs = check_all(args.logicforms, checks=args.checks,
+                                  verbose=not args.quiet, rejected=rejected)
+    if not args.quiet:
+        print('Rejected logical forms:')
+        for lf_id, check in sorted(rejected.items()):
+            print(f'{lf_id}: {check}')
 
     print('Final logical forms:')
     print_all(logic_form_graphs)
+
+
+if __name__ == '__main__':
+    main()
@@ -124,7 +124,7 @@ predicate_rules = {
         ('const_str', 'const_str'),
     ],
     '@Length':[
-        ('const_str'),
+        ('const_str',),
     ],
     '@Add':[
         ('const_str', 'const_str'),
@@ -340,36 +340,204 @@ def __is_const_str(data: str) -> bool:
     return  (test_str or test_num) and not '@' in data
 
 
-def _check_rules_node(graph, node: str) -> bool:
-    """ Check predicate rules on a predicate graph node.
+# argument types of predicate rules
+RULE_ARG_TYPES = {
+    'variable': lfg.ArgType.VARIABLE,
+    'const_num': lfg.ArgType.CONST_NUM,
+    'const_str': lfg.ArgType.CONST_STR,
+}
+
+# predicate argument in predicate_sequence_denylist, as interned id
+NO_PREDICATE = -1
+
+
+def __intern_denied_predicate(predicate, table: str, key: str) -> int:
+    """ Intern a predicate of a denylist entry, '' for no predicate. """
+    if predicate == '':
+        return NO_PREDICATE
+    if not isinstance(predicate, str) or '@' not in predicate:
+        raise ValueError(f'Invalid {table} entry for {key}: {predicate!r} '
+                         'is not a predicate')
+    return lfg.intern_predicate(predicate)
+
+
+def compile_rules(rules: dict) -> dict:
+    """ Compile predicate_rules to bitmasks of ArgType.
 
     Parameters:
-    graph: graph attribute of LogicFormGraph object
-    node (str): name of the node to check
+    rules (dict): predicate: list of tuples of predicate types
 
     Returns:
-    true if node conforms a predicate rule
+    dict of predicate id: list of tuples with a mask of allowed argument
+    types for each argument. Predicates are allowed for any argument.
+
+    Raises:
+    ValueError for malformed rules, e.g. ('const_str') instead of
+    ('const_str',)
 
     """
-    node_predicate = graph.nodes[node]['predicate']
-    for rules in predicate_rules[node_predicate]:
-        check_results = []
-        for rule, child in zip(rules, graph.successors(node)):
-            child_predicate = graph.nodes[child]['predicate']
-            if __is_predicate(child_predicate):
-                check_results.append(True)
-                continue
+    compiled = {}
+    for predicate, predicate_rules in rules.items():
+        masks = []
+        for rule in predicate_rules:
+            if not isinstance(rule, tuple):
+                raise ValueError(f'Invalid predicate rule for {predicate}: '
+                                 f'{rule!r} is not a tuple')
             try:
-                check_func = globals()[f'__is_{rule}']
-                check_results.append(check_func(child_predicate))
-            except KeyError:
-                text = f'Invalid predicate rule for {child_predicate}'
-                raise ValueError(text)
-        if check_results and all(check_results):
-            return True
-    if not predicate_rules[node_predicate]:
+                masks.append(tuple(int(RULE_ARG_TYPES[arg] | lfg.ArgType.PREDICATE)
+                                   for arg in rule))
+            except (KeyError, TypeError):
+                raise ValueError(f'Invalid predicate rule for {predicate}: '
+                                 f'{rule!r}')
+        compiled[lfg.intern_predicate(predicate)] = masks
+    return compiled
+
+
+def compile_order_denylist(denylist: dict) -> dict:
+    """ Compile predicate_order_denylist to bitmasks of predicate ids.
+
+    Returns:
+    dict of predicate id: int with bit i set if predicate id i must
+    not be the parent of the predicate
+
+    """
+    compiled = {}
+    for predicate, parents in denylist.items():
+        if '@' not in predicate:
+            raise ValueError(f'Invalid predicate order entry: {predicate!r} '
+                             'is not a predicate')
+        if isinstance(parents, str):
+            raise ValueError(f'Invalid predicate order entry for {predicate}: '
+                             f'{parents!r} is not a list')
+        mask = 0
+        for parent in parents:
+            if parent == '':
+                raise ValueError(f'Invalid predicate order entry for {predicate}: '
+                                 "'' is not a predicate")
+            mask |= 1 << __intern_denied_predicate(parent, 'predicate order', predicate)
+        compiled[lfg.intern_predicate(predicate)] = mask
+    return compiled
+
+
+def compile_sequence_denylist(denylist: dict) -> dict:
+    """ Compile predicate_sequence_denylist to sets of id tuples.
+
+    Returns:
+    dict of predicate id: set of tuples of the predicate ids of denied
+    arguments, NO_PREDICATE for arguments that are no predicate
+
+    """
+    compiled = {}
+    for predicate, sequences in denylist.items():
+        denied = set()
+        for sequence in sequences:
+            if not isinstance(sequence, tuple):
+                raise ValueError(f'Invalid predicate sequence entry for {predicate}: '
+                                 f'{sequence!r} is not a tuple')
+            denied.add(tuple(__intern_denied_predicate(arg, 'predicate sequence',
+                                                       predicate)
+                             for arg in sequence))
+        compiled[lfg.intern_predicate(predicate)] = frozenset(denied)
+    return compiled
+
+
+COMPILED_RULES = compile_rules(predicate_rules)
+COMPILED_ORDER_DENYLIST = compile_order_denylist(predicate_order_denylist)
+COMPILED_SEQUENCE_DENYLIST = compile_sequence_denylist(predicate_sequence_denylist)
+
+# (predicate id, argument types): result of the predicate rules
+RULES_RESULTS = {}
+
+
+def _predicate_nodes(tree) -> list:
+    """ Get the nodes of a LogicFormTree that are predicates. """
+    return [node for node in range(len(tree))
+            if tree.arg_types[node] == lfg.ArgType.PREDICATE]
+
+
+def __match_rules(predicate_id: int, arg_types: tuple) -> bool:
+    """ Check argument types against the compiled rules of a predicate. """
+    masks = COMPILED_RULES[predicate_id]
+    if not masks:
         return True
-    return False
+    # like zip(), a rule only checks as many arguments as both have
+    return any(rule and arg_types and
+               all(mask & arg_type for mask, arg_type in zip(rule, arg_types))
+               for rule in masks)
+
+
+def _rules_result(predicate_id: int, arg_types: tuple) -> bool:
+    """ Check the argument types of a predicate against predicate_rules.
+    Raises KeyError for a predicate without rules. """
+    key = (predicate_id, arg_types)
+    try:
+        return RULES_RESULTS[key]
+    except KeyError:
+        if predicate_id not in COMPILED_RULES:
+            raise KeyError(lfg.PREDICATE_NAMES[predicate_id])
+        RULES_RESULTS[key] = __match_rules(predicate_id, arg_types)
+        return RULES_RESULTS[key]
+
+
+def _order_denied(predicate_id: int, parent_id: int) -> bool:
+    """ Check if predicate_order_denylist denies a parent of a predicate. """
+    return bool(COMPILED_ORDER_DENYLIST.get(predicate_id, 0) >> parent_id & 1)
+
+
+def _sequence_denied(predicate_id: int, child_preds: tuple) -> bool:
+    """ Check if predicate_sequence_denylist denies the arguments of a
+    predicate. Raises KeyError for a predicate without entry. """
+    try:
+        return child_preds in COMPILED_SEQUENCE_DENYLIST[predicate_id]
+    except KeyError:
+        raise KeyError(lfg.PREDICATE_NAMES[predicate_id])
+
+
+def _child_types(tree, node: int) -> tuple:
+    return tuple(tree.arg_types[child] for child in tree.children(node))
+
+
+def _child_predicates(tree, node: int) -> tuple:
+    return tuple(tree.predicate_ids[child]
+                 if tree.arg_types[child] == lfg.ArgType.PREDICATE
+                 else NO_PREDICATE
+                 for child in tree.children(node))
+
+
+def _check_rules_node(tree, node: int) -> bool:
+    """ Check predicate rules on a predicate tree node.
+
+    Parameters:
+    tree: tree attribute of LogicFormGraph object
+    node (int): index of the node to check
+
+    Returns:
+    true if node conforms a predicate rule
+
+    """
+    return _rules_result(tree.predicate_ids[node], _child_types(tree, node))
+
+
+def _check_order_node(tree, node: int) -> bool:
+    """ Check the predicate order denylist on a tree node. """
+    parent = tree.parent[node]
+    return parent < 0 or not _order_denied(tree.predicate_ids[node],
+                                           tree.predicate_ids[parent])
+
+
+def _check_sequence_node(tree, node: int) -> bool:
+    """ Check the predicate sequence denylist on a predicate tree node. """
+    return not _sequence_denied(tree.predicate_ids[node],
+                                _child_predicates(tree, node))
+
+
+def _check_duplicate_args_node(tree, node: int) -> bool:
+    """ Check for duplicate arguments of a predicate tree node. """
+    child_predicates = [tree.predicate_ids[child]
+                        for child in tree.children(node)
+                        if tree.arg_types[child] != lfg.ArgType.PREDICATE]
+    return not (len(child_predicates) > 1 and
+                all(x == child_predicates[0] for x in child_predicates))
 
 
 def check_pred_rules(lf_graph: dict) -> bool:
@@ -382,10 +550,8 @@ def check_pred_rules(lf_graph: dict) -> bool:
     true if logical form graph conforms predicate rules
 
     """
-    graph = lf_graph['graph'].graph
-    predicate_nodes = [g for g in graph.nodes()
-                       if '@' in graph.nodes[g]['predicate']]
-    return all(_check_rules_node(graph, node) for node in predicate_nodes)
+    tree = lf_graph['graph'].tree
+    return all(_check_rules_node(tree, node) for node in _predicate_nodes(tree))
 
 
 def check_pred_order(lf_graph: dict) -> bool:
@@ -398,17 +564,8 @@ def check_pred_order(lf_graph: dict) -> bool:
     true if logical form graph conforms predicate order
 
     """
-    graph = lf_graph['graph'].graph
-    for node, node_data in graph.nodes(data=True):
-        predicate = node_data['predicate']
-        try:
-            if any(g for g in graph.predecessors(node)
-                   if graph.nodes[g]['predicate']
-                   in predicate_order_denylist[predicate]):
-                return False
-        except KeyError:
-            pass
-    return True
+    tree = lf_graph['graph'].tree
+    return all(_check_order_node(tree, node) for node in range(len(tree)))
 
 
 def check_pred_sequence(lf_graph: dict) -> bool:
@@ -422,18 +579,8 @@ def check_pred_sequence(lf_graph: dict) -> bool:
     true if logical form graph conforms predicate sequence
 
     """
-    graph = lf_graph['graph'].graph
-    predicate_nodes = [g for g in graph.nodes()
-                       if '@' in graph.nodes[g]['predicate']]
-    for node in predicate_nodes:
-        child_preds = [graph.nodes[child]['predicate']
-                       for child in graph.successors(node)]
-        child_preds = tuple(map(lambda x: '' if '@' not in x else x,
-                                child_preds))
-        predicate = graph.nodes[node]['predicate']
-        if child_preds in predicate_sequence_denylist[predicate]:
-            return False
-    return True
+    tree = lf_graph['graph'].tree
+    return all(_check_sequence_node(tree, node) for node in _predicate_nodes(tree))
 
 
 def __check_duplicate_args(lf_graph: dict) -> bool:
@@ -446,17 +593,8 @@ def __check_duplicate_args(lf_graph: dict) -> bool:
     true if logical form graph has no predicate w/ duplicate arguments
 
     """
-    graph = lf_graph['graph'].graph
-    predicate_nodes = [g for g in graph.nodes()
-                       if '@' in graph.nodes[g]['predicate']]
-    for node in predicate_nodes:
-        child_predicates = [graph.nodes[child]['predicate']
-                            for child in graph.successors(node)
-                            if '@' not in graph.nodes[child]['predicate']]
-        if len(child_predicates) > 1 and \
-           all(x == child_predicates[0] for x in child_predicates):
-            return False
-    return True
+    tree = lf_graph['graph'].tree
+    return all(_check_duplicate_args_node(tree, node) for node in _predicate_nodes(tree))
 
 
 def __check_duplicate_preds(lf_graph: dict) -> bool:
@@ -531,6 +669,133 @@ def check_pred_all(lf_graphs: list, mode: str) -> list:
     return [lf for lf in lf_graphs if check_func(lf) is True]
 
 
+# per node part of each check mode, and whether it only applies to predicates
+NODE_CHECKS = {
+    'rules': (_check_rules_node, True),
+    'order': (_check_order_node, False),
+    'sequence': (_check_sequence_node, True),
+    'duplicates': (_check_duplicate_args_node, True),
+}
+
+
+def check_pred_fused(lf_graph: dict, modes: list) -> tuple:
+    """ Run several check modes in one traversal of a logical form graph.
+
+    Each node is checked by the modes in order, up to the first mode that
+    failed so far; checks after it can no longer change the result.
+
+    Parameters:
+    lf_graph: dict of id (int) and graph (LogicalFormGraph)
+    modes (list): names of check modes, in the order check_pred_all
+    would apply them
+
+    Returns:
+    index of the first mode the logical form graph fails, len(modes) if
+    it passes all, and the exception raised by that mode (or None)
+
+    """
+    tree = lf_graph['graph'].tree
+    node_checks = [NODE_CHECKS[mode] for mode in modes]
+    failed, error = len(modes), None
+    if 'duplicates' in modes and not __check_duplicate_preds(lf_graph):
+        failed = modes.index('duplicates')
+    for node in range(len(tree)):
+        is_predicate = tree.arg_types[node] == lfg.ArgType.PREDICATE
+        for index in range(failed):
+            check_func, predicates_only = node_checks[index]
+            if predicates_only and not is_predicate:
+                continue
+            try:
+                if check_func(tree, node):
+                    continue
+                failed, error = index, None
+            except Exception as e:
+                failed, error = index, e
+            break
+        if failed == 0:
+            break
+    return failed, error
+
+
+def check_pred_all_fused(lf_graphs: list, modes: list) -> list:
+    """ Run several check modes on a list of logical forms, one traversal
+    per logical form instead of one per mode and logical form.
+
+    Parameter:
+    lf_graphs (list): logical forms
+    modes (list): names of check modes, e.g. rules, order
+
+    Returns:
+    for each logical form, the index of the first mode it fails (len(modes)
+    if it passes all) and the exception raised by that mode (or None)
+
+    """
+    for mode in modes:
+        if mode not in NODE_CHECKS:
+            raise ValueError(f'Invalid predicate checker mode: {mode}')
+    return [check_pred_fused(lf, list(modes)) for lf in lf_graphs]
+
+
+def lookup(mode: str, predicate: str, key):
+    """ Look up a rule table entry by name.
+
+    Parameters:
+    mode (str): rules, order or sequence
+    predicate (str): predicate of the node, e.g. '@Is'
+    key: argument types (ArgType values) for rules, the parent predicate
+    for order, the argument predicates ('' for no predicate) for sequence
+
+    Returns:
+    whether the rules allow or the denylist denies the entry (bool), or
+    'KeyError' if the table has no entry for the predicate
+
+    """
+    predicate_id = lfg.intern_predicate(predicate)
+    try:
+        if mode == 'rules':
+            return _rules_result(predicate_id, tuple(key))
+        if mode == 'order':
+            return _order_denied(predicate_id, lfg.intern_predicate(key))
+        if mode == 'sequence':
+            return _sequence_denied(predicate_id, tuple(
+                NO_PREDICATE if arg == '' else lfg.intern_predicate(arg)
+                for arg in key))
+    except KeyError:
+        return 'KeyError'
+    raise ValueError(f'Invalid predicate checker mode: {mode}')
+
+
+def table_lookups(lf_graph: dict, modes: list) -> set:
+    """ Get the rule table entries the checks of a logical form graph
+    depend on. While all of them look up the same, the checks give the
+    same result; the duplicates check uses no table.
+
+    Parameters:
+    lf_graph: dict of id (int) and graph (LogicalFormGraph)
+    modes (list): names of check modes
+
+    Returns:
+    set of tuples of mode, predicate, key and result as lookup() takes
+    and returns them
+
+    """
+    tree = lf_graph['graph'].tree
+    entries = set()
+    for node in _predicate_nodes(tree):
+        predicate = tree.predicate(node)
+        parent = tree.parent[node]
+        if 'rules' in modes:
+            entries.add(('rules', predicate, _child_types(tree, node)))
+        if 'order' in modes and parent >= 0:
+            entries.add(('order', predicate, tree.predicate(parent)))
+        if 'sequence' in modes:
+            entries.add(('sequence', predicate, tuple(
+                '' if arg == NO_PREDICATE else lfg.PREDICATE_NAMES[arg]
+                for arg in _child_predicates(tree, node))))
+    return {(mode, predicate, key, lookup(mode, predicate, key))
+            for mode, predicate, key in entries}
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
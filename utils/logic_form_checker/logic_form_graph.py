@@ -27,7 +27,9 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import array
 import collections
+import enum
 
 import networkx
 try:
@@ -35,11 +37,151 @@ try:
 except ImportError:
     print('Matlotlib is not installed, '
           'drawing graphs will not work')
-try:
-    import pydot
-except ImportError:
-    print('Pydot is not installed, '
-          'writing graphs to dot will not work')
+
+import logic_form_parser as lfp
+
+
+class ArgType(enum.IntFlag):
+    """ Type of a logical form node as an argument of its parent.
+
+    Flags, so that a set of allowed types is a bitmask.
+
+    """
+    OTHER = 0
+    PREDICATE = 1
+    VARIABLE = 2
+    CONST_NUM = 4
+    CONST_STR = 8
+
+
+def classify_argument(predicate: str) -> ArgType:
+    """ Get the argument type of a node predicate.
+
+    Note: variables start with a capital letter, constant strings with a
+    lowercase letter or a number (see '16_bit_one's_complement')
+
+    """
+    if '@' in predicate:
+        return ArgType.PREDICATE
+    if not predicate:
+        return ArgType.OTHER
+    if predicate[0].isupper():
+        return ArgType.VARIABLE
+    if predicate.isnumeric():
+        return ArgType.CONST_NUM
+    if predicate[0].islower() or predicate[0].isnumeric():
+        return ArgType.CONST_STR
+    return ArgType.OTHER
+
+
+# predicates of all LogicFormTree nodes, interned to ints, and their
+# argument types
+PREDICATES = {}
+PREDICATE_NAMES = []
+PREDICATE_TYPES = []
+
+
+def intern_predicate(predicate: str) -> int:
+    """ Get the id of a predicate, adding it if it is new. """
+    try:
+        return PREDICATES[predicate]
+    except KeyError:
+        PREDICATES[predicate] = len(PREDICATE_NAMES)
+        PREDICATE_NAMES.append(predicate)
+        PREDICATE_TYPES.append(int(classify_argument(predicate)))
+        return PREDICATES[predicate]
+
+
+class LogicFormTree:
+    """ Array-backed tree (or forest) of a logical form.
+
+    Nodes are indices 0..n-1 in the order networkx used to list them.
+    names[i] is the node name, e.g. "'@Is'3" (token and token index),
+    predicate_ids[i] the interned predicate, arg_types[i] its ArgType,
+    parent[i] the parent index or -1 for a root. The children of i are
+    child_index[child_offsets[i]:child_offsets[i+1]], in argument order.
+
+    """
+
+    def __init__(self, names: list, predicates: list, children: list):
+        self.names = names
+        self.predicate_ids = array.array('i', map(intern_predicate, predicates))
+        self.arg_types = array.array('b', [PREDICATE_TYPES[i] for i in self.predicate_ids])
+        self.parent = array.array('i', [-1] * len(names))
+        self.child_offsets = array.array('i', [0])
+        self.child_index = array.array('i')
+        for node, node_children in enumerate(children):
+            for child in node_children:
+                self.parent[child] = node
+            self.child_index.extend(node_children)
+            self.child_offsets.append(len(self.child_index))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        # interned ids are only valid in this process
+        state = self.__dict__.copy()
+        state['predicate_ids'] = [PREDICATE_NAMES[i] for i in self.predicate_ids]
+        return state
+
+    def __setstate__(self, state):
+        state['predicate_ids'] = array.array('i', map(intern_predicate,
+                                                      state['predicate_ids']))
+        state['arg_types'] = array.array('b', [PREDICATE_TYPES[i]
+                                               for i in state['predicate_ids']])
+        self.__dict__.update(state)
+
+    def predicate(self, node: int) -> str:
+        return PREDICATE_NAMES[self.predicate_ids[node]]
+
+    def children(self, node: int):
+        return self.child_index[self.child_offsets[node]:self.child_offsets[node + 1]]
+
+    def roots(self) -> list:
+        return [node for node in range(len(self)) if self.parent[node] < 0]
+
+    def edges(self) -> list:
+        """ Get (parent, child) index pairs in the order of networkx. """
+        return [(node, child) for node in range(len(self))
+                for child in self.children(node)]
+
+    def is_tree(self) -> bool:
+        return len(self.roots()) == 1
+
+    def preorder(self) -> list:
+        """ Get node indices following a preorder traversal. """
+        order = []
+        for root in self.roots():
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(reversed(self.children(node)))
+        return order
+
+    def postorder(self) -> list:
+        """ Get node indices following a postorder traversal. """
+        order = []
+        for root in self.roots():
+            stack = [(root, False)]
+            while stack:
+                node, visited = stack.pop()
+                if visited:
+                    order.append(node)
+                else:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(self.children(node)))
+        return order
+
+    def to_networkx(self) -> networkx.DiGraph:
+        """ Convert to a networkx graph with node attribute predicate. """
+        graph = networkx.DiGraph()
+        for node, name in enumerate(self.names):
+            graph.add_node(name, predicate=self.predicate(node))
+        graph.add_edges_from((self.names[node], self.names[child])
+                             for node, child in self.edges())
+        return graph
 
 
 class LogicFormGraph:
@@ -47,40 +189,63 @@ class LogicFormGraph:
 
     def __init__(self, logic_form: str):
         self.logic_form = logic_form
-        self.graph = logic_form_to_graph(logic_form)
+        self.tree = logic_form_to_tree(logic_form)
+
+    @property
+    def graph(self) -> networkx.DiGraph:
+        """ networkx graph of the logical form, built on each access. """
+        return self.tree.to_networkx()
 
     def __repr__(self):
+        nodes = [(name, {'predicate': self.tree.predicate(node)})
+                 for node, name in enumerate(self.tree.names)]
+        edges = [(self.tree.names[node], self.tree.names[child])
+                 for node, child in self.tree.edges()]
         return (f'logic_form: {self.logic_form}\n'
                 f'graph:\n'
-                f' nodes: {self.graph.nodes(data=True)}\n'
-                f' edges: {self.graph.edges()}')
+                f' nodes: {nodes}\n'
+                f' edges: {edges}')
 
     def is_binary_tree(self) -> bool:
         """ Check if graph is a binary tree. """
-        if networkx.is_tree(self.graph) and \
-           all(x[1] < 3 for x in self.graph.out_degree()):
-            return True
-        return False
+        return self.tree.is_tree() and \
+            all(len(self.tree.children(node)) < 3 for node in range(len(self.tree)))
 
     def list_preorder_nodes(self) -> list:
         """ Get a list of nodes following a preorder traversal. """
-        return list(networkx.dfs_preorder_nodes(self.graph))
+        return [self.tree.names[node] for node in self.tree.preorder()]
 
     def list_postorder_nodes(self) -> list:
         """ Get a list of nodes following a postorder traversal. """
-        return list(networkx.dfs_postorder_nodes(self.graph))
+        return [self.tree.names[node] for node in self.tree.postorder()]
 
     def draw(self, filename: str):
         """ Draw graph using Matplotlib. """
-        pos = networkx.drawing.nx_agraph.graphviz_layout(self.graph)
-        networkx.draw(self.graph)
-        networkx.draw_networkx_labels(self.graph, pos)
+        graph = self.graph
+        pos = networkx.drawing.nx_agraph.graphviz_layout(graph)
+        networkx.draw(graph)
+        networkx.draw_networkx_labels(graph, pos)
         plt.savefig(filename, dpi=200)
 
     def write_gexf(self, filename: str):
         """ Export graph as GEXF file. """
         networkx.write_gexf(self.graph, filename)
 
+    def to_dot(self, name='lfg') -> str:
+        """ Render the graph as DOT text, nodes named like in graph. """
+        def __quote(text: str) -> str:
+            return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+        lines = [f'digraph {__quote(name)} {{']
+        for node, node_name in enumerate(self.tree.names):
+            predicate = __quote(self.tree.predicate(node))
+            lines.append(f'{__quote(node_name)} [predicate={predicate}];')
+        for node, child in self.tree.edges():
+            lines.append(f'{__quote(self.tree.names[node])} -> '
+                         f'{__quote(self.tree.names[child])};')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
     def write_dot(self, filename: str):
         """ Export graph as DOT file.
 
@@ -88,7 +253,8 @@ class LogicFormGraph:
         $ dot -Tpdf <filename> -o <pdf_file>
 
         """
-        networkx.drawing.nx_pydot.write_dot(self.graph, filename)
+        with open(filename, 'w') as dot_file:
+            dot_file.write(self.to_dot())
 
 
 def logic_form_to_graph(logic_form: str):
@@ -101,53 +267,53 @@ def logic_form_to_graph(logic_form: str):
     graph (networkx.DiGraph)
 
     """
-    # preprocess logic_form
-    preproc_logic_form = (logic_form
-                          .replace('[', '')
-                          .replace(']', '')
-                          .replace('"', '')
-                          .replace('\'@', '(\'@')
-                          .replace('(', ' ( ')
-                          .replace(')', ' ) ')
-                          .replace(',', ' '))
-    tokens = preproc_logic_form.split()
-
-    # extract topology
+    return logic_form_to_tree(logic_form).to_networkx()
+
+
+def logic_form_to_tree(logic_form: str):
+    """ Parse logic_form to a LogicFormTree.
+
+    Parameter:
+    logic_form (str): a logical form of a logic_form
+
+    Returns:
+    tree (LogicFormTree)
+
+    """
+    # extract topology, nodes are named by token and token index
     topo = collections.defaultdict(list)
-    parents = ['.']  # add artificial root
-    for i, token in enumerate(tokens):
-        token_id = f'{token}{i}'
-        try:
-            parent = parents[-1]
-            if '@' in token:
-                if tokens[i-1] == '(':
-                    topo[parent].append(token_id)
-                    parents.append(token_id)
-            elif token == ')':
-                parents.pop()
-            elif token not in "()":
-                topo[parent].append(token_id)
-        except IndexError:
-            raise SyntaxError("Invalid Logical Form")
-    del topo['.']  # remove artificial root
+
+    def __add_node(node, parent: str):
+        if isinstance(node, lfp.Atom):
+            if '@' not in node.text:
+                topo[parent].append(f'{node.text}{node.index}')
+            return
+        token_id = f'{node.name}{node.index}'
+        topo[parent].append(token_id)
+        for arg in node.args:
+            __add_node(arg, token_id)
+
+    for root in lfp.parse(logic_form):
+        __add_node(root, '.')  # add artificial root
+    topo.pop('.', None)  # remove artificial root
 
     def __convert_tokenid_to_token(tokenid: str) -> str:
         return tokenid.rstrip('0123456789').replace("'", "")
 
-    # construct graph
-    graph = networkx.DiGraph()
+    # construct tree, numbering nodes in the order they are first seen
+    index = {}
     for inter_node, leaves in topo.items():
-        token = __convert_tokenid_to_token(inter_node)
-        graph.add_node(inter_node, predicate=token)
-        for leaf in leaves:
-            token = __convert_tokenid_to_token(leaf)
-            graph.add_node(leaf, predicate=token)
-            graph.add_edge(inter_node, leaf)
-
-    if networkx.is_empty(graph):
+        for node in [inter_node] + leaves:
+            index.setdefault(node, len(index))
+    if not index:
         raise SyntaxError("Invalid Logical Form")
+    names = list(index)
+    children = [[] for _ in names]
+    for inter_node, leaves in topo.items():
+        children[index[inter_node]] = [index[leaf] for leaf in leaves]
 
-    return graph
+    return LogicFormTree(names, [__convert_tokenid_to_token(name) for name in names],
+                         children)
 
 
 def create_logic_form_graphs_from_logic_forms(logic_forms: list):
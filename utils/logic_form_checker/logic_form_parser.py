@@ -0,0 +1,118 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Lexer and parser of logical forms, shared by the logic form checker
+and the code generator.
+
+A logical form like '@Is'('@Of'('length','udp_header'),Length) is split
+to tokens, then read in one pass to a tree of Predicate and Atom nodes.
+'[', ']' and '"' are removed from the logical form.
+
+"""
+
+import collections
+import functools
+
+
+# index is the position of the node in the tokens of the logical form
+Atom = collections.namedtuple('Atom', 'text index')
+Predicate = collections.namedtuple('Predicate', 'name args index')
+
+REMOVED_CHARS = str.maketrans('', '', '[]"')
+
+CACHE_SIZE = 2**14
+
+
+def scan(logic_form: str) -> list:
+    """ Split a logical form to tokens.
+
+    Parameter:
+    logic_form (str): a logical form
+
+    Returns:
+    list of tokens (str): '(' and ')', quoted predicates like "'@Is'"
+    that always follow a '(', and arguments like "'checksum'" or "Source"
+
+    """
+    return (logic_form
+            .translate(REMOVED_CHARS)
+            .replace('\'@', '(\'@')
+            .replace('(', ' ( ')
+            .replace(')', ' ) ')
+            .replace(',', ' ')
+            .split())
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse(logic_form: str) -> tuple:
+    """ Parse a logical form. Results are cached by the logical form.
+
+    A predicate takes the arguments up to the next unmatched ')'.
+
+    Parameter:
+    logic_form (str): a logical form, or several separated by ',' or ' '
+
+    Returns:
+    tuple of Predicate and Atom nodes at the top level
+
+    Raises:
+    SyntaxError for unbalanced parentheses
+
+    """
+    roots = []
+    args = roots
+    stack = []  # open predicates: name, index, args of the enclosing node
+    for index, token in enumerate(scan(logic_form)):
+        if token == '(':
+            continue
+        if token == ')':
+            if not stack:
+                raise SyntaxError(f'Invalid Logical Form: unmatched ) at token {index}')
+            name, pred_index, parent_args = stack.pop()
+            parent_args.append(Predicate(name, tuple(args), pred_index))
+            args = parent_args
+        elif token.startswith("'@"):
+            stack.append((token, index, args))
+            args = []
+        else:
+            args.append(Atom(token, index))
+    if stack:
+        raise SyntaxError(f'Invalid Logical Form: missing ) of {stack[-1][0]} '
+                          f'at token {stack[-1][1]}')
+    return tuple(roots)
+
+
+def to_lists(node):
+    """ Convert a node to nested lists of strings, e.g.
+    ["'@Is'", "'checksum'", "'0'"] for '@Is'('checksum','0').
+
+    """
+    if isinstance(node, Atom):
+        return node.text
+    return [node.name] + [to_lists(arg) for arg in node.args]
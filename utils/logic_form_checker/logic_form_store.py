@@ -0,0 +1,124 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Hash-consed store of logical forms.
+
+Every distinct subtree of the stored logical forms is kept once, as a
+node of a label and the ids of its argument nodes. Logical forms of
+different sentences that share a subtree, e.g. '@Of'('checksum','icmp'),
+point to the same node, so that results computed for a node, like its
+lf_node row in SentenceDB.update_lf_nodes(), are reused across sentences.
+
+"""
+
+import collections
+
+import logic_form_parser as lfp
+
+
+# label: predicate or argument token, e.g. "'@Is'" or "'checksum'"
+# args: ids of the argument nodes, empty for an argument token
+Node = collections.namedtuple('Node', 'label args')
+
+
+class LogicFormStore:
+    """ Interned nodes of logical forms, ids are indices into nodes. """
+
+    def __init__(self):
+        self.nodes = []
+        self.node_ids = {}
+        self.roots = {}  # logical form: tuple of root ids
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def intern(self, label: str, args=()) -> int:
+        """ Get the id of a node, adding it if it is new. """
+        node = Node(label, tuple(args))
+        try:
+            return self.node_ids[node]
+        except KeyError:
+            self.node_ids[node] = len(self.nodes)
+            self.nodes.append(node)
+            return self.node_ids[node]
+
+    def add(self, logic_form: str) -> tuple:
+        """ Add a logical form.
+
+        Parameter:
+        logic_form (str): a logical form, or several separated by ',' or ' '
+
+        Returns:
+        ids of the top level nodes of the logical form (tuple)
+
+        Raises:
+        SyntaxError for unbalanced parentheses
+
+        """
+        try:
+            return self.roots[logic_form]
+        except KeyError:
+            pass
+
+        def __add_node(node) -> int:
+            if isinstance(node, lfp.Atom):
+                return self.intern(node.text)
+            return self.intern(node.name, [__add_node(arg) for arg in node.args])
+
+        roots = tuple(__add_node(root) for root in lfp.parse(logic_form))
+        self.roots[logic_form] = roots
+        return roots
+
+    def fold(self, node_id: int, func, cache: dict):
+        """ Compute func(label, results of the args) bottom-up.
+
+        Parameter:
+        node_id (int): id of the top node
+        func (callable): called once per node missing in cache
+        cache (dict): results by node id, shared between calls to reuse
+        the results of common subtrees
+
+        Returns:
+        result of func for node_id
+
+        """
+        stack = [node_id]
+        while stack:
+            current = stack[-1]
+            if current in cache:
+                stack.pop()
+                continue
+            label, args = self.nodes[current]
+            missing = [arg for arg in args if arg not in cache]
+            if missing:
+                stack.extend(missing)
+                continue
+            cache[current] = func(label, [cache[arg] for arg in args])
+            stack.pop()
+        return cache[node_id]
@@ -0,0 +1,141 @@
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import os
+
+
+class TransactionMixin:
+    """ Transactions of a DB class that keeps its connection in conn.
+
+    Writes of the class go through writing(), which commits each write
+    on its own unless it is made within transaction().
+
+    """
+
+    in_transaction = False
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Commit all writes within the block at once, or none on error. """
+        self.in_transaction = True
+        try:
+            with self.conn:
+                yield self
+        except BaseException:
+            self.rolled_back()
+            raise
+        finally:
+            self.in_transaction = False
+
+    def writing(self):
+        """ Commit a single write, unless it is part of a transaction. """
+        if self.in_transaction:
+            return contextlib.nullcontext()
+        return self.conn
+
+    def rolled_back(self):
+        """ Called after the writes of a transaction were rolled back. """
+
+
+class DBSession:
+    """ Open metadata system DBs shared by all callers of a process.
+
+    get() opens a DB once per class and file and returns the same object
+    afterwards, so helpers called per sentence reuse its connection and
+    the prepared statements sqlite3 caches per connection. Writes to the
+    DBs within transaction() are committed together.
+
+    """
+
+    def __init__(self):
+        # open DBs by (DB class, absolute file name)
+        self.dbs = {}
+        # transactions of the DBs within transaction(), None outside
+        self.batch = None
+        # a forked child must not use the connections of its parent
+        os.register_at_fork(after_in_child=self.dbs.clear)
+
+    def __key(self, db_class, name):
+        return (db_class, os.path.abspath(name or db_class.DEFAULT_NAME))
+
+    def get(self, db_class, name=None):
+        """ Get the open DB of a file.
+
+        Parameter:
+        db_class (type): MetaDB, SentenceDB or TermDB
+        name (str): DB file, the default DB of db_class if None
+
+        Returns:
+        db_class object, shared with all other callers
+
+        """
+        key = self.__key(db_class, name)
+        db = self.dbs.get(key)
+        if db is None:
+            db = db_class(key[1])
+            self.dbs[key] = db
+            if self.batch is not None:
+                self.batch.enter_context(db.transaction())
+        return db
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Commit all writes to the DBs of the session within the block
+        at once, or none on error. A nested block joins the outer one. """
+        if self.batch is not None:
+            yield self
+            return
+        with contextlib.ExitStack() as batch:
+            for db in self.dbs.values():
+                batch.enter_context(db.transaction())
+            self.batch = batch
+            try:
+                yield self
+            finally:
+                self.batch = None
+
+    def reset_db(self, db_class, name=None):
+        """ Remove a DB file, the next get() creates it again. """
+        if self.batch is not None:
+            raise RuntimeError('Cannot reset a DB within a transaction')
+        db = self.get(db_class, name)
+        del self.dbs[self.__key(db_class, name)]
+        db.close_conn()
+        db.reset_db()
+
+    def reset(self):
+        """ Close all DBs of the session, the next get() opens them again. """
+        if self.batch is not None:
+            raise RuntimeError('Cannot reset DBs within a transaction')
+        for db in self.dbs.values():
+            db.close_conn()
+        self.dbs.clear()
+
+SESSION = DBSession()
@@ -31,6 +31,8 @@ import os
 import pathlib
 import sqlite3
 
+from db_session import TransactionMixin
+
 
 class MetaRecord:
     """Record the information as metadata"""
@@ -55,10 +57,12 @@ class MetaRecord:
                 f' sentence_id: {self.sentence_id}\n')
 
 
-class MetaDB:
+class MetaDB(TransactionMixin):
+    DEFAULT_NAME = str(pathlib.Path(__file__).parent.absolute() / 'message.db')
+
     def __init__(self, name=None, create=True):
         if name is None:
-            name = str(pathlib.Path(__file__).parent.absolute() / 'message.db')
+            name = self.DEFAULT_NAME
         self.name = name
         self.conn = sqlite3.connect(name)
         self.cursor = self.conn.cursor()
@@ -85,7 +89,7 @@ class MetaDB:
         self.conn.commit()
 
     def delete_value(self, data):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from meta WHERE msg_type=:msg_type AND msg_desc=:msg_desc "
                                 "AND field=:field AND bit=:bit AND sentence=:sentence AND "
                                 "sentence_id=:sentence_id",
@@ -97,7 +101,7 @@ class MetaDB:
                                  'sentence_id': data.sentence_id})
 
     def delete_by_proto_msgtype_field_id(self, proto, msg_type, field, sent_id):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from meta WHERE "
                                 "protocol=:protocol AND msg_type=:msg_type AND "
                                 "field=:field AND sentence_id=:sentence_id",
@@ -105,28 +109,28 @@ class MetaDB:
                                  'field':field, 'sentence_id': sent_id})
 
     def delete_by_msg_type(self, msg_type):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from meta WHERE msg_type=:msg_type",
                                 {'msg_type':msg_type})
 
     def delete_by_field(self, field):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from meta WHERE field=:field",
                                 {'field':field})
 
     def delete_by_sentence(self, sentence):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from meta WHERE sentence=:sentence",
                                 {'sentence':sentence})
 
     def delete_by_sentence_and_id(self, sentence, sentence_id):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from meta WHERE "
                                 "sentence=:sentence AND sentence_id=:sentence_id",
                                 {'sentence':sentence, 'sentence_id': sentence_id})
 
     def update_sentence(self, data, new_sentence):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE meta SET sentence=:sentence WHERE "
                                 "msg_type=:msg_type AND msg_desc=:msg_desc AND "
                                 "field=:field AND sentence_id=:sentence_id",
@@ -135,7 +139,7 @@ class MetaDB:
                                  'sentence': new_sentence, 'sentence_id': data.sentence_id})
 
     def update_sentence_and_id(self, data, sentence, sentence_id):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE meta "
                                 "SET sentence=:sentence, sentence_id=:sentence_id WHERE "
                                 "msg_type =:msg_type AND msg_desc AND "
@@ -145,13 +149,13 @@ class MetaDB:
                                  'sentence': sentence, 'sentence_id': sentence_id})
 
     def update_desc(self, data, desc):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE meta SET msg_desc=:msg_desc "
                                 "WHERE msg_type=:msg_type AND field=:field",
                                 {'msg_type': data.msg_type, 'msg_desc': desc, 'field': data.field})
 
     def __add_value(self, data, operation='REPLACE'):
-        with self.conn:
+        with self.writing():
             cols = "(:protocol,:msg_type,:msg_desc,:field,:bit,:sentence,:sentence_id)"
             self.cursor.execute(f"{operation} INTO meta VALUES {cols}",
                                 {'protocol':data.protocol,
@@ -202,6 +206,17 @@ class MetaDB:
                             {'sentence':sentence, 'sentence_id':sentence_id})
         return self.cursor.fetchone()
 
+    def get_data_version(self):
+        """ Get a number that changes whenever another connection commits
+        to the DB. """
+        self.cursor.execute("PRAGMA data_version")
+        return self.cursor.fetchone()[0]
+
+    def get_all_fields(self):
+        """ Get protocol, msg_type, field and bit of all rows. """
+        self.cursor.execute("SELECT protocol, msg_type, field, bit FROM meta ORDER BY rowid")
+        return self.cursor.fetchall()
+
     def get_all_meta(self, with_header=False):
         self.cursor.execute("SELECT * FROM meta")
         header = tuple(d[0] for d in self.cursor.description)
@@ -33,6 +33,7 @@ import argparse
 import pathlib
 import sys
 
+from db_session import SESSION
 from metarecord import MetaRecord, MetaDB
 from sentence_record import SentenceRecord, SentenceDB
 
@@ -173,13 +174,13 @@ def get_argparse():
 
 
 def register_table1(proto, msg, field, bit, name=None):
-    meta_db = MetaDB(name)
+    meta_db = SESSION.get(MetaDB, name)
     meta_1 = MetaRecord(protocol=proto, msg_name=msg, field_name=field, bit_cnt=bit)
     meta_db.replace_value(meta_1)
 
 
 def add_sent_table1(msg, field, bit, sent, sent_id, name=None):
-    meta_db = MetaDB(name)
+    meta_db = SESSION.get(MetaDB, name)
     meta_1 = MetaRecord(msg_name=msg, field_name=field, bit_cnt=bit,
                         sentence=sent, sent_id=sent_id)
     meta_db.replace_value(meta_1)
@@ -189,7 +190,7 @@ def add_sentence_to_meta(table1, protocol, msg_type, field_name,
                          bit_cnt, sentence, sentence_id):
     """ Add sentence and sentence id to an existing message type and field. """
     get_sent_id = -2
-    meta_db = MetaDB(table1)
+    meta_db = SESSION.get(MetaDB, table1)
     msg_meta = meta_db.get_meta_by_proto_msgtype_field(protocol, msg_type, field_name)
     try:
         bit_cnt = msg_meta[0][4]
@@ -211,20 +212,20 @@ def add_sentence_to_meta(table1, protocol, msg_type, field_name,
 
 
 def add_sentence_to_mapping(table2, msg, field, sentence, sentence_id):
-    sentence_db = SentenceDB(table2)
+    sentence_db = SESSION.get(SentenceDB, table2)
     sentence_db.replace_value(SentenceRecord(sentence, sentence_id,
                                              msg_type=msg, field=field))
 
 
 def add_label_to_mapping(table2, msg, field, sentence, sentence_id, sentence_label):
-    sentence_db = SentenceDB(table2)
+    sentence_db = SESSION.get(SentenceDB, table2)
     sentence_db.replace_value(SentenceRecord(sentence, sentence_id,
                                              msg_type=msg, field=field,
                                              label=sentence_label))
 
 
 def update_lf(table2, msg, field, sentence, sentence_id, lf_in, env_in):
-    sentence_db = SentenceDB(table2)
+    sentence_db = SESSION.get(SentenceDB, table2)
     sent_rec = SentenceRecord(sentence=sentence, sent_id=sentence_id,
                               msg_type=msg, field=field,
                               lf=lf_in, env=env_in)
@@ -232,13 +233,13 @@ def update_lf(table2, msg, field, sentence, sentence_id, lf_in, env_in):
 
 
 def clean_bad_entry(table2, msg, sentence, sentence_id):
-    sentence_db = SentenceDB(table2)
+    sentence_db = SESSION.get(SentenceDB, table2)
     sentence_db.delete_bad(sentence, sentence_id, msg)
     sentence_db.delete_empty_string_col()
 
 
 def update_meta_sent(proto, msg_type, field, sent, sent_id, name):
-    meta_db = MetaDB(name)
+    meta_db = SESSION.get(MetaDB, name)
     entries = meta_db.get_meta_by_proto_msgtype_field(proto, msg_type, field)
     ids = [row[6] for row in entries]
     desc = entries[0][2]
@@ -253,7 +254,7 @@ def update_meta_sent(proto, msg_type, field, sent, sent_id, name):
 
 
 def update_desc(msg_type, field, desc, name='message.db'):
-    meta_db = MetaDB(name)
+    meta_db = SESSION.get(MetaDB, name)
     entries = meta_db.get_meta_by_msg_type(msg_type)
     all_fields = [row[3] for row in entries]
     match_status, matched_field = similarity_map(all_fields, field)
@@ -305,36 +306,33 @@ def __dump_table(db, out_format='csv') -> str:
 
 
 def dump_table1(name=None, out_format="csv"):
-    meta_db = MetaDB(name)
+    meta_db = SESSION.get(MetaDB, name)
     table_dump = __dump_table(meta_db, out_format=out_format)
-    meta_db.close_conn()
     print(table_dump)
 
 
 def dump_table2(name=None, out_format="csv"):
-    sent_db = SentenceDB(name)
+    sent_db = SESSION.get(SentenceDB, name)
     table_dump = __dump_table(sent_db, out_format=out_format)
-    sent_db.close_conn()
     print(table_dump)
 
 
 def reset_tables(table1=None, table2=None):
-    meta_db = MetaDB(table1)
-    sent_db = SentenceDB(table2)
-    for db in (meta_db, sent_db):
-        db.reset_db()
+    SESSION.reset_db(MetaDB, table1)
+    SESSION.reset_db(SentenceDB, table2)
 
 
 def get_sentence_from_lf(lf, name=None):
-    sent_db = SentenceDB(name)
+    sent_db = SESSION.get(SentenceDB, name)
     sent_data = sent_db.get_mapping_by_lf(lf)
     sent = sent_data[0][0]
     return sent
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """ Run metadata system operations selected by CLI args. """
     argparser = get_argparse()
-    args = argparser.parse_args()
+    args = argparser.parse_args(argv)
     table1_name = args.set_table1_name
     table2_name = args.set_table2_name
     proto = args.proto_reg
@@ -398,3 +396,7 @@ if __name__ == "__main__":
         except:
             print("Error: cannot find the original sentence by this LF")
             sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
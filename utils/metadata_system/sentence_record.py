@@ -30,10 +30,18 @@
 import os
 import pathlib
 import sqlite3
+import sys
 import tempfile
 
 import networkx
 
+from db_session import TransactionMixin
+
+
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+LFC_DIR = CUR_DIR / '..' / 'logic_form_checker'
+
+
 class SentenceRecord:
 
     def __init__(self, sentence, sent_id, msg_type='', field='',
@@ -66,15 +74,24 @@ class SentenceRecord:
                 f' code from logical form: {self.code}\n')
 
 
-class SentenceDB:
+class SentenceDB(TransactionMixin):
+    DEFAULT_NAME = str(pathlib.Path(__file__).parent.absolute() / 'sent_to_lf.db')
+
     def __init__(self, name=None, create=True):
         if name is None:
-            name = str(pathlib.Path(__file__).parent.absolute() / 'sent_to_lf.db')
+            name = self.DEFAULT_NAME
         self.name = name
         self.conn = sqlite3.connect(name)
         self.cursor = self.conn.cursor()
+        # logical forms stored by update_lf_nodes(), with the DB ids of
+        # lf_node rows by (label, args) and by the node ids of lf_store
+        self.lf_store = None
+        self.lf_node_ids = None
+        self.lf_store_ids = {}
         if create and self.table_empty():
             self.create_table()
+        if create:
+            self.create_lf_node_tables()
 
     def table_empty(self):
         return os.stat(self.name).st_size == 0
@@ -85,6 +102,11 @@ class SentenceDB:
     def close_conn(self):
         self.conn.close()
 
+    def rolled_back(self):
+        # ids of rolled back lf_node rows are invalid
+        self.lf_node_ids = None
+        self.lf_store_ids = {}
+
     def create_table(self):
         self.cursor.execute("""CREATE TABLE mapping(
                             sentence text,
@@ -100,8 +122,22 @@ class SentenceDB:
                             )""")
         self.conn.commit()
 
+    def create_lf_node_tables(self):
+        """ Create the tables of shared logical form nodes, see update_lf_nodes(). """
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS lf_node(
+                            id integer PRIMARY KEY,
+                            label text NOT NULL,
+                            args text NOT NULL,
+                            UNIQUE (label, args)
+                            )""")
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS lf_root(
+                            lf text PRIMARY KEY,
+                            roots text NOT NULL
+                            )""")
+        self.conn.commit()
+
     def delete_value(self, data):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from mapping "
                                 "WHERE field=:field AND "
                                 "sentence=:sentence AND sentence_id=:sentence_id",
@@ -110,7 +146,7 @@ class SentenceDB:
                                  'sentence_id': data.sentence_id})
 
     def delete_bad(self, sentence, sentence_id, msg_type):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("DELETE from mapping "
                                 "WHERE msg_type=:msg_type AND field=:field AND "
                                 "sentence=:sentence AND sentence_id=:sentence_id",
@@ -118,16 +154,16 @@ class SentenceDB:
                                  'msg_type': msg_type})
 
     def delete_empty_string_col(self):
-        with self.conn:
+        with self.writing():
             self.conn.execute("DELETE from mapping WHERE (lf IS NULL OR trim(lf)='')")
 
     def update_label(self, data, label):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE mapping SET label=:label WHERE sentence=:sentence",
                                 {'sentence': data.sentence, 'label': label})
 
     def update_lf(self, data, lf):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE mapping SET lf=:lf WHERE "
                                 "field=:field AND "
                                 "sentence=:sentence AND sentence_id=:sentence_id""",
@@ -140,12 +176,54 @@ class SentenceDB:
             networkx.write_gpickle(origin_lf_graph, tmp)
             tmp.seek(0)
             content = tmp.read()
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE mapping SET lf_graph=:lf_graph WHERE lf=:lf",
                                 {'lf': data.lf, 'lf_graph': content})
 
+    def update_lf_nodes(self, lf):
+        """ Store a logical form as nodes shared with all stored logical forms.
+
+        Parameter:
+        lf (str): logical form
+
+        Returns:
+        lf_node ids of the top level nodes of the logical form (tuple)
+
+        """
+        if self.lf_store is None:
+            if str(LFC_DIR) not in sys.path:
+                sys.path.insert(0, str(LFC_DIR))
+            import logic_form_store
+            self.lf_store = logic_form_store.LogicFormStore()
+        if self.lf_node_ids is None:
+            self.cursor.execute("SELECT label, args, id FROM lf_node")
+            self.lf_node_ids = {(label, args): node_id
+                                for label, args, node_id in self.cursor.fetchall()}
+
+        def __insert_node(label, args):
+            key = (label, ','.join(map(str, args)))
+            if key not in self.lf_node_ids:
+                # the row may have been added by another connection since
+                # lf_node_ids was read
+                self.cursor.execute("INSERT OR IGNORE INTO lf_node(label, args) "
+                                    "VALUES (?, ?)", key)
+                if self.cursor.rowcount == 1:
+                    self.lf_node_ids[key] = self.cursor.lastrowid
+                else:
+                    self.cursor.execute("SELECT id FROM lf_node "
+                                        "WHERE label=? AND args=?", key)
+                    self.lf_node_ids[key] = self.cursor.fetchone()[0]
+            return self.lf_node_ids[key]
+
+        with self.writing():
+            roots = tuple(self.lf_store.fold(root, __insert_node, self.lf_store_ids)
+                          for root in self.lf_store.add(lf))
+            self.cursor.execute("REPLACE INTO lf_root VALUES (:lf, :roots)",
+                                {'lf': lf, 'roots': ','.join(map(str, roots))})
+        return roots
+
     def update_code(self, field, sentence, sentence_id, lf, code):
-        with self.conn:
+        with self.writing():
             self.cursor.execute("UPDATE mapping SET code=:code WHERE "
                                 "sentence=:sentence AND sentence_id=:sentence_id AND "
                                 "field=:field AND lf=:lf",
@@ -153,7 +231,7 @@ class SentenceDB:
                                  'field': field, 'lf': lf, 'code': code})
 
     def __add_value(self, data, operation="REPLACE"):
-        with self.conn:
+        with self.writing():
             cols = "(:sentence,:sentence_id,:msg_type,:field,:label,:lf,:lf_graph,:env,:code)"
             self.cursor.execute(f"{operation} INTO mapping VALUES {cols}",
                                 {'sentence': data.sentence,
@@ -174,10 +252,16 @@ class SentenceDB:
         self.__add_value(data, 'REPLACE')
 
     def get_graph_by_sentence_and_id(self, sentence, sent_id):
-        self.cursor.execute("SELECT lf_graph FROM mapping WHERE "
+        self.cursor.execute("SELECT lf, lf_graph FROM mapping WHERE "
                             "sentence=:sentence AND sentence_id=:sentence_id",
                             {'sentence':sentence, 'sentence_id': sent_id})
         graph_pickle = self.cursor.fetchall()
+        if not graph_pickle[-1][-1]:
+            # stored as shared nodes, see update_lf_nodes()
+            if str(LFC_DIR) not in sys.path:
+                sys.path.insert(0, str(LFC_DIR))
+            import logic_form_graph
+            return logic_form_graph.logic_form_to_graph(graph_pickle[-1][0])
         with tempfile.TemporaryFile() as tmp:
             tmp.write(graph_pickle[-1][-1])
             tmp.seek(0)
@@ -228,5 +312,20 @@ class SentenceDB:
             data.insert(0, header)
         return data
 
+    def get_mapping_with_code_by_env(self, text):
+        """ Get all rows with code whose env contains text. """
+        self.cursor.execute("SELECT * FROM mapping WHERE "
+                            "code IS NOT NULL AND code!='' AND instr(env, :text) > 0 "
+                            "ORDER BY rowid", {'text': text})
+        return self.cursor.fetchall()
+
+    def get_all_lfs(self):
+        """ Get sentence, sentence_id, msg_type, field, label and lf of all
+        rows with a logical form, without the logical form graphs. """
+        self.cursor.execute("SELECT sentence, sentence_id, msg_type, field, label, lf "
+                            "FROM mapping WHERE lf IS NOT NULL AND trim(lf)!='' "
+                            "ORDER BY rowid")
+        return self.cursor.fetchall()
+
     def get_all(self, with_header=True):
         return self.get_all_mapping(with_header)
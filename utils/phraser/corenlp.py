@@ -43,6 +43,7 @@ CUR_DIR = pathlib.Path(__file__).parent.absolute()
 MDS_DIR = CUR_DIR / '..' / 'metadata_system'
 sys.path.insert(0, str(MDS_DIR))
 import sentence_record
+from db_session import SESSION
 
 
 def get_argparse():
@@ -100,7 +101,7 @@ def trim_tail(sentence):
 
 
 def term_dict_label(target_string):
-    term_db = TermDB()
+    term_db = SESSION.get(TermDB)
     target_split = target_string.split()
     str_lower = target_string.lower()
     str_split = str_lower.split()
@@ -170,9 +171,10 @@ def quote_words(sentence):
     return new_sent
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """ Label noun phrases of a sentence and record the label. """
     argparser = get_argparse()
-    args = argparser.parse_args()
+    args = argparser.parse_args(argv)
     sent = args.sentence
     sent_orig = args.sentence
     sent_id = args.sentence_id
@@ -247,7 +249,7 @@ if __name__ == "__main__":
     new_sent = coref_resol(new_sent)
     print("NP labelled sentence with coreference resolution: \n\t", new_sent)
 
-    sent_db = sentence_record.SentenceDB()
+    sent_db = SESSION.get(sentence_record.SentenceDB)
     sentence = sent_orig.lstrip(" ")
     label = (new_sent
              .lstrip(" ")
@@ -260,3 +262,7 @@ if __name__ == "__main__":
 
     with open(output_file, 'w') as ap_outfile:
         ap_outfile.write(new_sent)
+
+
+if __name__ == "__main__":
+    main()
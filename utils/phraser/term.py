@@ -30,18 +30,27 @@
 import os
 import pathlib
 import sqlite3
+import sys
 
+CUR_DIR = pathlib.Path(__file__).parent.absolute()
+MDS_DIR = CUR_DIR / '..' / 'metadata_system'
+sys.path.insert(0, str(MDS_DIR))
+from db_session import TransactionMixin
+
+
+class TermDB(TransactionMixin):
+    DEFAULT_NAME = str(CUR_DIR / 'term.db')
 
-class TermDB:
     def __init__(self, name=None, create=True):
         if name is None:
-            name = str(pathlib.Path(__file__).parent.absolute() / 'term.db')
+            name = self.DEFAULT_NAME
         self.name = name
         self.conn = sqlite3.connect(name)
         self.cursor = self.conn.cursor()
         if create and self.table_empty():
             self.create_table()
-            self.import_dic()
+            with self.transaction():
+                self.import_dic()
 
     def table_empty(self):
         return os.stat(self.name).st_size == 0
@@ -84,7 +93,7 @@ class TermDB:
         print("Done with importing term dic")
 
     def insert_value(self, first_word, noun_phrase):
-        with self.conn:
+        with self.writing():
             self.cursor.execute(
                 "INSERT INTO term VALUES (:first_word,:noun_phrase)",
                 {'first_word': first_word, 'noun_phrase': noun_phrase})
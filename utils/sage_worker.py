@@ -0,0 +1,248 @@
+#! /usr/bin/env python3
+
+# Copyright (c) 2021, The University of Southern California.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Long-lived worker running the Python tools of SAGE.
+
+The worker imports the tools once and serves requests over a Unix
+domain socket (--socket) or stdin/stdout (--stdio). A request runs the
+main() of a tool with CLI args, exactly like a new python3 process.
+
+Framing, all lengths in bytes of UTF-8 text:
+ request:  '<type> <argc>\\n' followed by argc times '<len>\\n<arg>'
+ response: '<status> <len>\\n<output>'
+
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import pathlib
+import socket
+import sys
+import traceback
+
+
+UTILS_DIR = pathlib.Path(__file__).parent.absolute()
+SAGE_DIR = UTILS_DIR / '..'
+
+# request type: (module, module directory, working directory)
+TOOLS = {
+    'phrase': ('corenlp', UTILS_DIR / 'phraser', UTILS_DIR / 'phraser'),
+    'parse': ('parse_rfc', UTILS_DIR / 'ccg_tool', SAGE_DIR),
+    'check': ('check_logic_forms', UTILS_DIR / 'logic_form_checker', SAGE_DIR),
+    'codegen': ('code_gen', UTILS_DIR / 'code_generator', SAGE_DIR),
+    'funcgen': ('func_gen', UTILS_DIR / 'code_generator', SAGE_DIR),
+    'simcodegen': ('sim_code_gen', UTILS_DIR / 'code_generator', SAGE_DIR),
+    'metadata': ('run_sqlite', UTILS_DIR / 'metadata_system',
+                 UTILS_DIR / 'metadata_system'),
+}
+
+# sim_code_gen needs dyn_term.py which is generated during a run
+PRELOAD_TOOLS = [tool for tool in TOOLS if tool != 'simcodegen']
+
+# module: function resetting the state the module keeps between calls of
+# main() and that depends on files or on earlier requests
+RESET_HOOKS = {
+    'db_session': lambda module: module.SESSION.reset(),
+    'connect_metadata_system': lambda module: module.METADATA.reset(),
+    'parse_rfc': lambda module: module.checker_key.cache_clear(),
+    'parse_cache': lambda module: module.grammar_key.cache_clear(),
+    'Parser': lambda module: module.reset_variable_names(),
+}
+
+
+def load_tool(tool: str):
+    """ Import the module of a tool. """
+    module_name, module_dir, _ = TOOLS[tool]
+    if str(module_dir) not in sys.path:
+        sys.path.insert(0, str(module_dir))
+    return importlib.import_module(module_name)
+
+
+def reset_state():
+    """ Reset the state of the loaded modules, so that a request sees the
+    files and DBs like a new python3 process. Caches that only depend on
+    the arguments of their function are kept. """
+    for module_name, reset in RESET_HOOKS.items():
+        module = sys.modules.get(module_name)
+        if module is not None:
+            reset(module)
+
+
+def run_tool(tool: str, argv: list) -> tuple:
+    """ Run main() of a tool.
+
+    Parameters:
+    tool (str): request type, a key of TOOLS
+    argv (list): CLI args passed to the tool
+
+    Returns:
+    exit status (int) and captured stdout and stderr (str) of the tool
+
+    """
+    _, _, work_dir = TOOLS[tool]
+    output = io.StringIO()
+    status = 0
+    prev_dir = os.getcwd()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            os.chdir(work_dir)
+            reset_state()
+            load_tool(tool).main(argv)
+        except SystemExit as error:
+            if isinstance(error.code, str):
+                print(error.code)
+                status = 1
+            else:
+                status = error.code or 0
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os.chdir(prev_dir)
+    return status, output.getvalue()
+
+
+def read_request(rfile):
+    """ Read a request. Returns None at end of stream. """
+    header = rfile.readline()
+    if not header:
+        return None
+    tool, argc = header.decode().split()
+    argv = []
+    for _ in range(int(argc)):
+        length = int(rfile.readline())
+        argv.append(rfile.read(length).decode())
+    return tool, argv
+
+
+def write_response(wfile, status: int, output: str):
+    """ Write a response. """
+    data = output.encode()
+    wfile.write(f'{status} {len(data)}\n'.encode() + data)
+    wfile.flush()
+
+
+def serve(rfile, wfile) -> bool:
+    """ Serve requests of a stream.
+
+    Returns:
+    False if the worker was asked to shut down
+
+    """
+    while True:
+        request = read_request(rfile)
+        if request is None:
+            return True
+        tool, argv = request
+        if tool == 'shutdown':
+            write_response(wfile, 0, '')
+            return False
+        if tool == 'ping':
+            write_response(wfile, 0, 'pong')
+        elif tool not in TOOLS:
+            write_response(wfile, 2, f'Unknown request type: {tool}\n')
+        else:
+            write_response(wfile, *run_tool(tool, argv))
+
+
+def serve_socket(path: str):
+    """ Serve clients of a Unix domain socket, one at a time. """
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path)
+        server.listen(1)
+        try:
+            running = True
+            while running:
+                conn, _ = server.accept()
+                with conn, conn.makefile('rb') as rfile, \
+                     conn.makefile('wb') as wfile:
+                    running = serve(rfile, wfile)
+        finally:
+            os.unlink(path)
+
+
+def serve_stdio():
+    """ Serve requests from stdin, respond on stdout. """
+    # keep stdout for responses only, stray output of tools and their
+    # subprocesses goes to stderr
+    wfile = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    with wfile:
+        serve(sys.stdin.buffer, wfile)
+
+
+def preload_tools():
+    """ Import the tools before serving the first request. """
+    for tool in PRELOAD_TOOLS:
+        try:
+            load_tool(tool)
+        except Exception as error:
+            print(f'Failed to preload {tool}: {error}', file=sys.stderr)
+
+
+def main(argv=None):
+    """ Start the worker. """
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        '--socket', '-s',
+        help='Serve requests on this Unix domain socket',
+        type=str,
+    )
+    group.add_argument(
+        '--stdio',
+        help='Serve requests on stdin/stdout',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--no_preload',
+        help='Import tools on their first request',
+        action='store_true',
+    )
+    args = parser.parse_args(argv)
+
+    if not args.no_preload:
+        # stdout may carry the responses
+        with contextlib.redirect_stdout(sys.stderr):
+            preload_tools()
+    if args.stdio:
+        serve_stdio()
+    else:
+        serve_socket(args.socket)
+
+
+if __name__ == '__main__':
+    main()